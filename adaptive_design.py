@@ -0,0 +1,307 @@
+import os
+import csv
+import json
+import math
+import argparse
+
+import numpy as np
+
+from emulator import GaussianProcess, expected_improvement
+from param_io import iter_records, write_param_table
+from sampling import (
+    DELTA_KEYS,
+    design_to_records,
+    get_rng,
+    latin_hypercube,
+    perturb_design,
+    scale_to_ranges,
+)
+
+
+def read_scores(score_file, metric=None):
+    """
+    Read the score of every ensemble member from a CSV table.
+
+    Args:
+        score_file (str): CSV file with an "ensemble_id" column and one or more metric
+            columns.
+        metric (str, optional): Name of the metric column. Defaults to the first
+            column after "ensemble_id".
+
+    Returns:
+        dict: Ensemble IDs mapped to their score. Members with a missing or non-numeric
+            score (e.g. failed runs) are left out.
+
+    Raises:
+        ValueError: If the file is empty or has no ensemble_id, metric or `metric`
+            column.
+    """
+    with open(score_file, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None:
+            raise ValueError(f"{score_file} is empty")
+        if "ensemble_id" not in reader.fieldnames:
+            raise ValueError(f"{score_file} has no ensemble_id column")
+        if metric is None:
+            metric = next(
+                (name for name in reader.fieldnames if name != "ensemble_id"), None
+            )
+            if metric is None:
+                raise ValueError(f"{score_file} has no metric column")
+        elif metric not in reader.fieldnames:
+            raise ValueError(f"{score_file} has no column {metric}")
+        scores = {}
+        for row in reader:
+            try:
+                score = float(row[metric])
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(score):
+                scores[row["ensemble_id"]] = score
+    return scores
+
+
+def bl_values(record, default_params, keys):
+    """
+    BL values of the perturbed parameters of a parameter set, in the same units as the
+    min/max ranges of `perturbed_BL_params` (deltas for TLOW/TUPP).
+    """
+    return [
+        record[key][0] - default_params[key][0] if key in DELTA_KEYS else record[key][0]
+        for key in keys
+    ]
+
+
+def training_data(param_files, scores, default_params, new_params):
+    """
+    Join the parameter sets of previous ensembles with the scores of their members.
+
+    Args:
+        param_files (list): Logs of generated parameters of `create_ensemble_jobs.py`
+            (parameter sets with their "ensemble_id").
+        scores (dict): Ensemble IDs mapped to their score (see `read_scores`).
+        default_params (dict): Default parameter values for each PFT.
+        new_params (dict): Perturbed parameters with their [min, max] BL values.
+
+    Returns:
+        tuple: (ensemble IDs, N x P array of BL values in the unit hypercube, N scores)
+    """
+    keys = list(new_params)
+    bounds = np.array([new_params[key][:2] for key in keys], dtype=float)
+    ids, values, seen = [], [], set()
+    for param_file in param_files:
+        for record in iter_records(param_file):
+            expid = record.get("ensemble_id")
+            if expid in scores and expid not in seen:
+                seen.add(expid)
+                ids.append(expid)
+                values.append(bl_values(record, default_params, keys))
+    if not ids:
+        raise ValueError("None of the scored members are in the parameter files")
+    X = np.array(values, dtype=float)
+    span = np.where(bounds[:, 1] > bounds[:, 0], bounds[:, 1] - bounds[:, 0], 1.0)
+    return ids, (X - bounds[:, 0]) / span, np.array([scores[i] for i in ids])
+
+
+def propose_batch(
+    X, y, N, maximise=True, n_candidates=4096, xi=0.0, seed=None, emulator=None
+):
+    """
+    Propose the next N points by expected improvement of a Gaussian process emulator.
+
+    The candidates are a Latin hypercube in the unit hypercube. Points are
+    picked one at a time and the emulator is updated with its own prediction at every
+    picked point ("kriging believer"), so that the batch does not cluster around a
+    single optimum.
+
+    Args:
+        X (numpy.ndarray): N x P array of training inputs in the unit hypercube.
+        y (numpy.ndarray): Training scores.
+        N (int): Number of points to propose.
+        maximise (bool, optional): Whether higher scores are better. Defaults to True.
+        n_candidates (int, optional): Number of candidate points. Defaults to 4096.
+        xi (float, optional): Minimum improvement (see `expected_improvement`).
+        seed (int, optional): Seed for reproducible proposals.
+        emulator (GaussianProcess, optional): Emulator with the hyperparameters to use,
+            fitted to the training data if not given.
+
+    Returns:
+        tuple: (N x P array of proposed points, list of dicts with the predicted
+            "mean", "std" and "expected_improvement" of each point)
+    """
+    if emulator is None:
+        emulator = GaussianProcess(seed=0 if seed is None else seed).fit(X, y)
+    candidates = latin_hypercube(n_candidates, X.shape[1], get_rng(seed))
+    best = y.max() if maximise else y.min()
+    X_batch, y_batch = X, y
+    chosen, predictions = [], []
+    gp = emulator
+    for _ in range(N):
+        mean, std = gp.predict(candidates)
+        ei = expected_improvement(mean, std, best, xi, maximise)
+        ei[chosen] = -np.inf
+        i = int(np.argmax(ei))
+        chosen.append(i)
+        predictions.append(
+            {
+                "mean": float(mean[i]),
+                "std": float(std[i]),
+                "expected_improvement": float(ei[i]),
+            }
+        )
+        # pretend the prediction is the result of the new point and refit with the
+        # same hyperparameters
+        X_batch = np.vstack([X_batch, candidates[i]])
+        y_batch = np.append(y_batch, mean[i])
+        gp = GaussianProcess().fit(
+            X_batch, y_batch, emulator.length_scales, emulator.noise
+        )
+    return candidates[chosen], predictions
+
+
+def propose_next_wave(
+    default_params,
+    new_params,
+    param_files,
+    scores,
+    N,
+    maximise=True,
+    xi=0.0,
+    seed=None,
+    decimals=5,
+    unrounded=(),
+):
+    """
+    Propose the parameter sets of the next ensemble wave from the scores of the
+    previous waves.
+
+    Only parameters with a non-zero [min, max] range are emulated, all proposals are
+    within these ranges.
+
+    Returns:
+        tuple: (design, report) with `design` mapping parameter names to
+            N x (number of PFTs) arrays of new values (see `perturb_design`) and
+            `report` a dict with the emulator fit and the predictions of every
+            proposed member.
+    """
+    varied = [key for key in new_params if new_params[key][0] != new_params[key][1]]
+    ids, X, y = training_data(
+        param_files, scores, default_params, {key: new_params[key] for key in varied}
+    )
+    emulator = GaussianProcess(seed=0 if seed is None else seed).fit(X, y)
+    unit_points, predictions = propose_batch(
+        X, y, N, maximise, xi=xi, seed=seed, emulator=emulator
+    )
+
+    unit_samples = np.zeros((N, len(new_params)))
+    columns = [list(new_params).index(key) for key in varied]
+    unit_samples[:, columns] = unit_points
+    bl_samples = scale_to_ranges(unit_samples, new_params)
+    design = perturb_design(default_params, new_params, bl_samples, decimals, unrounded)
+
+    best = int(np.argmax(y) if maximise else np.argmin(y))
+    report = {
+        "training_members": len(ids),
+        "best_member": ids[best],
+        "best_score": float(y[best]),
+        "length_scales": dict(zip(varied, emulator.length_scales.tolist())),
+        "noise": emulator.noise,
+        "proposals": predictions,
+    }
+    return design, report
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the sequential design, also used by
+    `python -m ensemble propose`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Propose the next ensemble wave from the scores of previous waves.",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=True,
+        help='JSON file with the "default_params" and the min/max "perturbed_BL_params"',
+    )
+    parser.add_argument(
+        "--params_logs",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Logs of generated parameters of the previous waves (with ensemble IDs)",
+    )
+    parser.add_argument(
+        "--scores",
+        type=str,
+        required=True,
+        help="CSV table with an ensemble_id column and the score of every member",
+    )
+    parser.add_argument(
+        "--metric",
+        type=str,
+        default=None,
+        help="Score column (default: first column after ensemble_id)",
+    )
+    parser.add_argument(
+        "--minimise",
+        action="store_true",
+        help="Lower scores are better (e.g. an error metric)",
+    )
+    parser.add_argument(
+        "--output_file",
+        type=str,
+        required=True,
+        help="Parameter table to write (.json, .jsonl or .ptab)",
+    )
+    parser.add_argument(
+        "--N", type=int, default=20, help="Number of parameter sets (default: 20)"
+    )
+    parser.add_argument(
+        "--xi",
+        type=float,
+        default=0.0,
+        help="Minimum improvement of the expected improvement (default: 0)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Seed for reproducible proposals"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    try:
+        scores = read_scores(args.scores, args.metric)
+        design, report = propose_next_wave(
+            config["default_params"],
+            config["perturbed_BL_params"],
+            args.params_logs,
+            scores,
+            args.N,
+            maximise=not args.minimise,
+            xi=args.xi,
+            seed=args.seed,
+            unrounded=["KAPS"],
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    write_param_table(
+        args.output_file, design_to_records(design), config["default_params"]
+    )
+
+    report_file = f"{os.path.splitext(args.output_file)[0]}_proposal.json"
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=4)
+    print(
+        f"Emulator trained on {report['training_members']} members, best so far "
+        f"{report['best_member']} ({report['best_score']:.4g})"
+    )
+    print(
+        f"Parameter sets saved to '{args.output_file}', report saved to '{report_file}'"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,645 @@
+import os
+import re
+import json
+import shutil
+import argparse
+import collections
+
+from job_template import JobTemplate
+from namelist import Namelist, parse_group_lines
+from restart_index import RestartIndex
+from status import SqueueAdapter, NoScheduler, slurm_job_name
+from submission import clustersubmit_command, run_command, submit_job
+import validation
+
+# first model year of the runs without upstream dependency
+FIRST_YEAR = 1850
+
+BenchmarkStep = collections.namedtuple(
+    "BenchmarkStep",
+    ["name", "description", "template", "depends_on", "restart_offset", "run_years"],
+)
+BenchmarkStep.__doc__ = """
+Single step of the benchmarking suite.
+
+Args:
+    name (str): Step name, appended to the ensemble ID to form the job ID (e.g. "1a").
+    description (str): Experiment description.
+    template (str): Vanilla UMUI job of the step, None if not configured yet.
+    depends_on (str): Step whose restart dumps start this step, None for steps that
+        start from FIRST_YEAR.
+    restart_offset (int): Number of years after the start of the upstream step at which
+        its restart dumps are used.
+    run_years (int): Number of years the step runs.
+"""
+
+# all benchmarking steps and their dependencies
+STEPS = [
+    # step 1: no dependencies -> can be started right away
+    BenchmarkStep("1a", "CONC - spin-up eqbm TRIFFID", "xqaza", None, 0, 40),
+    BenchmarkStep("1b", "CONC - LGM Peltier", "xqazb", None, 0, 200),
+    BenchmarkStep("1c", "CONC - Scotese_097", "xqazc", None, 0, 200),
+    # step 2: continuation of step 1a
+    BenchmarkStep("2a", "CONC - spin-up dyn TRIFFID", "xqazd", "1a", 40, 200),
+    # step 3: continuation of step 2a
+    BenchmarkStep("3a", "CONC - lig127k", None, "2a", 200, 100),
+    BenchmarkStep("3b", "CONC - 1% CO2 scenario COU", None, "2a", 200, 150),
+    BenchmarkStep("3c", "CONC - 1% CO2 scenario BGC", None, "2a", 200, 150),
+    BenchmarkStep("3d", "CONC - 1% CO2 scenario RAD", None, "2a", 200, 150),
+    BenchmarkStep("3e", "CONC - abrupt-4xCO2", None, "2a", 200, 150),
+    BenchmarkStep("3f", "CONC - historical", None, "2a", 200, 150),
+    BenchmarkStep("3g", "EMMI - spin-up with zero emissions", None, "2a", 200, 1200),
+    # step 4: continuation of step 3g at year 200
+    BenchmarkStep("4a", "EMMI - historical with emissions", None, "3g", 200, 150),
+    BenchmarkStep("4b", "EMMI - flat10", None, "3g", 200, 300),
+    # step 5: continuation of step 4b at year 100
+    BenchmarkStep("5a", "EMMI - flat10-zec (zero emissions)", None, "4b", 100, 200),
+    BenchmarkStep("5b", "EMMI - flat10-cdr (negative emissions)", None, "4b", 100, 200),
+]
+
+# namelist groups mapped to the number of values and valid range of their parameters
+# (see `validation.ParamSpec`)
+NAMELIST_SCHEMAS = {"LAND_CC": validation.LAND_CC_SCHEMA}
+
+# states of a step of an experiment
+COMPLETE = "complete"
+QUEUED = "queued"
+STOPPED = "stopped"
+WAITING = "waiting"
+NO_TEMPLATE = "no_template"
+READY = "ready"
+
+StepStatus = collections.namedtuple(
+    "StepStatus", ["label", "step", "job_id", "state", "detail"]
+)
+
+
+class BenchmarkSuite:
+    """
+    Dependency graph of the benchmarking steps.
+
+    Args:
+        steps (list, optional): `BenchmarkStep`s of the suite. Defaults to `STEPS`.
+    """
+
+    def __init__(self, steps=STEPS):
+        self.steps = {step.name: step for step in steps}
+        for step in steps:
+            if step.depends_on is not None and step.depends_on not in self.steps:
+                raise ValueError(
+                    f"Step {step.name} depends on unknown step {step.depends_on}"
+                )
+        # start years of all steps, which also orders the steps topologically
+        self._start_years = {}
+        self.order = []
+        for name in self.steps:
+            self._resolve(name, [])
+
+    def _resolve(self, name, chain):
+        if name in self._start_years:
+            return self._start_years[name]
+        if name in chain:
+            raise ValueError(f"Cyclic dependency: {' -> '.join(chain + [name])}")
+        step = self.steps[name]
+        if step.depends_on is None:
+            year = FIRST_YEAR
+        else:
+            year = self._resolve(step.depends_on, chain + [name]) + step.restart_offset
+        self._start_years[name] = year
+        self.order.append(name)
+        return year
+
+    def start_year(self, name):
+        """Model year at which a step starts (i.e. the restart year of its upstream)."""
+        return self._start_years[name]
+
+    def end_year(self, name):
+        """Model year at which a step is complete."""
+        return self._start_years[name] + self.steps[name].run_years
+
+
+def benchmark_job_id(exp_name, label, step):
+    """ID of the job of a step of an experiment, e.g. "xqbbA1a"."""
+    return f"{exp_name}{label}{step}"
+
+
+def evaluate(suite, exp_name, labels, restarts, job_states, jobs_dir, steps=None):
+    """
+    Evaluate the state of all steps of all experiments in one pass.
+
+    Args:
+        suite (BenchmarkSuite): Steps and their dependencies.
+        exp_name (str): Name of the benchmarking experiment, e.g. "xqbb".
+        labels (list): Experiment labels (e.g. the keys of the parameter file).
+        restarts: Index of the restart dumps with a `restarts_exist(id, year)` method
+            (see `RestartIndex`).
+        job_states (dict): SLURM job names mapped to their state (see `SqueueAdapter`).
+        jobs_dir (str): Directory of the UMUI jobs.
+        steps (list, optional): Only evaluate these steps. Defaults to all steps.
+
+    Returns:
+        list: `StepStatus` of every experiment and step, steps in dependency order.
+    """
+    statuses = []
+    for label in labels:
+        for name in suite.order:
+            if steps is not None and name not in steps:
+                continue
+            step = suite.steps[name]
+            job_id = benchmark_job_id(exp_name, label, name)
+            end_year = suite.end_year(name)
+            if restarts.restarts_exist(job_id, end_year):
+                state, detail = COMPLETE, f"restarts at year {end_year}"
+            elif slurm_job_name(job_id) in job_states:
+                state = QUEUED
+                detail = f"SLURM state {job_states[slurm_job_name(job_id)]}"
+            elif os.path.isdir(os.path.join(jobs_dir, job_id)):
+                state = STOPPED
+                detail = f"job exists but is not queued, no restarts at year {end_year}"
+            elif step.depends_on is not None and not restarts.restarts_exist(
+                benchmark_job_id(exp_name, label, step.depends_on),
+                suite.start_year(name),
+            ):
+                state = WAITING
+                detail = f"needs {step.depends_on} at year {suite.start_year(name)}"
+            elif step.template is None:
+                state, detail = NO_TEMPLATE, "no template configured"
+            elif not os.path.isdir(os.path.join(jobs_dir, step.template)):
+                state = NO_TEMPLATE
+                detail = f"template {step.template} not found in {jobs_dir}"
+            else:
+                state, detail = READY, f"from {step.template}"
+            statuses.append(StepStatus(label, name, job_id, state, detail))
+    return statuses
+
+
+class ClusterSubmitter:
+    """
+    Submit jobs with `clustersubmit`, retrying failed submissions with exponential
+    backoff (see `submission.submit_job`).
+
+    Args:
+        queue (str, optional): SLURM partition. Defaults to "cpu".
+        walltime (str, optional): Wall time. Defaults to "14-00:00:00".
+        runner (callable, optional): Function that runs the command (list of
+            arguments) and raises RuntimeError on failure. Defaults to
+            `submission.run_command`.
+        retries (int, optional): Retries of a failed submission. Defaults to 3.
+        scheduler (optional): Adapter with a `job_states()` method to check if a job
+            is already queued before retrying its submission.
+    """
+
+    def __init__(
+        self,
+        queue="cpu",
+        walltime="14-00:00:00",
+        runner=None,
+        retries=3,
+        scheduler=None,
+    ):
+        self.command = clustersubmit_command(queue, walltime)
+        self.runner = runner or run_command
+        self.retries = retries
+        self.scheduler = scheduler
+
+    def submit(self, job_id):
+        success, attempts, error = submit_job(
+            job_id, self.command, self.runner, self.retries, scheduler=self.scheduler
+        )
+        if not success:
+            raise RuntimeError(
+                f"Submitting {job_id} failed after {attempts} attempts: {error}"
+            )
+
+
+class FakeSubmitter:
+    """
+    Submitter that only records the submitted jobs, for testing and dry runs.
+
+    It can also be used as scheduler adapter: submitted jobs are reported as pending.
+    """
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, job_id):
+        self.submitted.append(job_id)
+
+    def job_states(self):
+        return {slurm_job_name(job_id): "PD" for job_id in self.submitted}
+
+
+def _parse_fortran_number(value):
+    # Fortran reals may use a D exponent, e.g. 5.0D-9
+    return float(value.replace("d", "e").replace("D", "e"))
+
+
+def validate_block(label, block, schemas=NAMELIST_SCHEMAS):
+    """
+    Validate a labelled parameter block of the benchmarking parameter file.
+
+    Args:
+        label (str): Experiment label, part of the job IDs.
+        block (dict): Block with the "description", "namelist" and "params" (lines of
+            the namelist group).
+        schemas (dict, optional): Namelist groups mapped to their parameters and
+            `validation.ParamSpec`s. Defaults to `NAMELIST_SCHEMAS`.
+
+    Returns:
+        dict: The block with the normalised group lines ("params"), the "group" name
+            and the parsed "values" of each parameter.
+
+    Raises:
+        ValueError: Listing all problems of the block.
+    """
+    errors = []
+    if not re.fullmatch(r"[A-Za-z0-9]+", label):
+        errors.append("label must only contain letters and digits")
+    namelist = block.get("namelist", "CNTLATM")
+    try:
+        group, raw_values = parse_group_lines(block.get("params", []))
+    except ValueError as e:
+        raise ValueError(f"Invalid parameter block {label}: {e}")
+
+    values = {}
+    schema = schemas.get(group)
+    if schema is None:
+        errors.append(f"unknown namelist group &{group}")
+        schema = {}
+    for key in schema:
+        if key not in raw_values:
+            errors.append(f"{key} is missing")
+    for key, key_values in raw_values.items():
+        if schema and key not in schema:
+            errors.append(f"unknown parameter {key}")
+            continue
+        if schema and len(key_values) != schema[key].width:
+            errors.append(
+                f"{key} has {len(key_values)} values, expected {schema[key].width}"
+            )
+            continue
+        try:
+            values[key] = [_parse_fortran_number(value) for value in key_values]
+        except ValueError:
+            errors.append(f"{key} has non-numeric values {key_values}")
+    # same value ranges and orderings as the parameter tables of the ensembles
+    violations, _ = validation.validate_records([values], schema)
+    errors.extend(violations.get(0, []))
+    if errors:
+        raise ValueError(f"Invalid parameter block {label}: {'; '.join(errors)}")
+
+    # same layout as the namelists written by the UMUI
+    lines = [f"&{group}"]
+    lines += [f" {line.strip()}" for line in block["params"][1:-1] if line.strip()]
+    lines.append("&END")
+    return {
+        "description": block.get("description", ""),
+        "namelist": namelist,
+        "group": group,
+        "params": lines,
+        "values": values,
+    }
+
+
+def load_benchmark_params(param_file, schemas=NAMELIST_SCHEMAS):
+    """
+    Load and validate the labelled parameter blocks of the benchmarking experiments.
+
+    The file is read once and every block is checked against the namelist schema (see
+    `validate_block`), so errors are reported before any job is created.
+
+    Returns:
+        dict: Experiment labels mapped to their validated blocks.
+
+    Raises:
+        ValueError: Listing the problems of all invalid blocks.
+    """
+    with open(param_file, "r") as f:
+        blocks = json.load(f)
+    benchmark_params, errors = {}, []
+    for label, block in blocks.items():
+        try:
+            benchmark_params[label] = validate_block(label, block, schemas)
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise ValueError("\n".join(errors))
+    return benchmark_params
+
+
+def create_benchmark_job(template, job_path, params):
+    """
+    Create the job of a benchmarking step from its template and replace the
+    namelist group with the parameters of the experiment.
+
+    Args:
+        template (JobTemplate): Compiled template job of the step.
+        job_path (str): Directory of the new job.
+        params (dict): Validated parameter block of the experiment (see
+            `load_benchmark_params`).
+    """
+    template.materialise(job_path)
+    namelist_file = os.path.join(job_path, params["namelist"])
+    namelist = Namelist.read(namelist_file)
+    if not namelist.replace_group(params["group"], params["params"]):
+        raise ValueError(f"No &{params['group']} group in {namelist_file}")
+    namelist.write()
+
+
+def create_benchmark_jobs(
+    suite,
+    exp_name,
+    benchmark_params,
+    jobs_dir,
+    jobs=None,
+    overwrite=False,
+    templates=None,
+):
+    """
+    Create the jobs of many benchmarking steps in one process, compiling every template
+    job only once.
+
+    Args:
+        suite (BenchmarkSuite): Steps and their templates.
+        exp_name (str): Name of the benchmarking experiment, e.g. "xqbb".
+        benchmark_params (dict): Validated parameter blocks (see `load_benchmark_params`).
+        jobs_dir (str): Directory of the UMUI jobs (and template jobs).
+        jobs (list, optional): (label, step) pairs to create. Defaults to all steps with
+            a template of all experiments.
+        overwrite (bool, optional): Replace existing jobs, otherwise they are skipped.
+        templates (dict, optional): Cache of the compiled template jobs by name, to
+            share them between calls. Defaults to a new cache.
+
+    Returns:
+        list: IDs of the created jobs.
+
+    Raises:
+        FileNotFoundError: If a template job or its namelist does not exist.
+        ValueError: If the namelist of a template has no group to replace.
+    """
+    if jobs is None:
+        jobs = [
+            (label, name)
+            for label in benchmark_params
+            for name in suite.order
+            if suite.steps[name].template is not None
+        ]
+    templates = {} if templates is None else templates
+    created = []
+    for label, name in jobs:
+        template_name = suite.steps[name].template
+        job_id = benchmark_job_id(exp_name, label, name)
+        job_path = os.path.join(jobs_dir, job_id)
+        if os.path.exists(job_path):
+            if not overwrite:
+                print(f"Job {job_id} already exists, skipping")
+                continue
+            shutil.rmtree(job_path)
+        if template_name not in templates:
+            templates[template_name] = JobTemplate(
+                os.path.join(jobs_dir, template_name)
+            )
+        print(f"Creating job {job_id} for step {name} from {template_name}")
+        try:
+            create_benchmark_job(
+                templates[template_name], job_path, benchmark_params[label]
+            )
+        except Exception:
+            # an incomplete job would look like a stopped run to `evaluate`
+            shutil.rmtree(job_path, ignore_errors=True)
+            raise
+        created.append(job_id)
+    return created
+
+
+def run_pass(
+    suite,
+    exp_name,
+    benchmark_params,
+    restarts,
+    scheduler,
+    submitter,
+    jobs_dir,
+    steps=None,
+    dry_run=False,
+):
+    """
+    Evaluate all steps of all experiments once and create and submit every job that is
+    ready to run.
+
+    Every job is created and submitted before the next one, and a failure only affects
+    its own job. The directory of a job whose submission failed is removed again, so
+    the step is ready (and retried) on the next pass instead of looking like a stopped
+    run.
+
+    Args:
+        suite (BenchmarkSuite): Steps and their dependencies.
+        exp_name (str): Name of the benchmarking experiment, e.g. "xqbb".
+        benchmark_params (dict): Labelled parameter blocks (see `load_benchmark_params`).
+        restarts: Index of the restart dumps (see `RestartIndex`), must be up to date.
+        scheduler: Adapter with a `job_states()` method (see `SqueueAdapter`).
+        submitter: Object with a `submit(job_id)` method (see `ClusterSubmitter`).
+        jobs_dir (str): Directory of the UMUI jobs.
+        steps (list, optional): Only run these steps. Defaults to all steps.
+        dry_run (bool, optional): Only evaluate, don't create or submit any job.
+
+    Returns:
+        tuple: (`StepStatus` of every experiment and step before the submissions, list
+            of error messages of the jobs that could not be created or submitted)
+    """
+    statuses = evaluate(
+        suite,
+        exp_name,
+        list(benchmark_params),
+        restarts,
+        scheduler.job_states(),
+        jobs_dir,
+        steps,
+    )
+    failures = []
+    if dry_run:
+        return statuses, failures
+
+    templates = {}
+    for status in statuses:
+        if status.state != READY:
+            continue
+        try:
+            created = create_benchmark_jobs(
+                suite,
+                exp_name,
+                benchmark_params,
+                jobs_dir,
+                [(status.label, status.step)],
+                templates=templates,
+            )
+        except (OSError, ValueError) as e:
+            failures.append(f"Creating {status.job_id} failed: {e}")
+            continue
+        for job_id in created:
+            print(f"Submitting job {job_id}")
+            try:
+                submitter.submit(job_id)
+            except RuntimeError as e:
+                shutil.rmtree(os.path.join(jobs_dir, job_id), ignore_errors=True)
+                failures.append(str(e))
+    return statuses, failures
+
+
+def format_statuses(statuses):
+    """Format the state of all steps as a table with a summary line."""
+    lines = []
+    for status in statuses:
+        lines.append(
+            f"{status.job_id:12s} {status.state.replace('_', ' '):12s} {status.detail}"
+        )
+    counts = collections.Counter(status.state for status in statuses)
+    lines.append(
+        ", ".join(f"{n} {state.replace('_', ' ')}" for state, n in counts.items())
+    )
+    return "\n".join(lines)
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the benchmarking scheduler, also used by
+    `python -m ensemble benchmark`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Create and submit all benchmarking jobs that are ready to run.",
+    )
+    parser.add_argument(
+        "--param_file",
+        type=str,
+        default="input_params/TOP20_LAND_CC_params_for_benchmarking.json",
+        help="JSON file with the labelled namelist blocks of each parameter set",
+    )
+    parser.add_argument(
+        "--exp_name", type=str, required=True, help="Benchmarking experiment name"
+    )
+    parser.add_argument(
+        "--steps",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Steps to run (default: all steps)",
+    )
+    parser.add_argument(
+        "--jobs_dir",
+        type=str,
+        default=os.path.expanduser("~/umui_jobs"),
+        help="Directory of the UMUI jobs (default: ~/umui_jobs)",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.path.expanduser("~/dump2hold"),
+        help="Directory with the model output of each job (default: ~/dump2hold)",
+    )
+    parser.add_argument(
+        "--index_file",
+        type=str,
+        default=None,
+        help="Restart index file (default: ./logs/<exp_name>_restart_index.json)",
+    )
+    parser.add_argument(
+        "--queue", type=str, default="cpu", help="SLURM partition (default: cpu)"
+    )
+    parser.add_argument(
+        "--walltime",
+        type=str,
+        default="14-00:00:00",
+        help="Wall time of the jobs (default: 14-00:00:00)",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only show the state of all steps, don't create or submit any job",
+    )
+    parser.add_argument(
+        "--create_only",
+        action="store_true",
+        help="Create the jobs of all steps with a template without checking restarts "
+        "or submitting them",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Replace existing jobs with --create_only (default: skip them)",
+    )
+    parser.add_argument(
+        "--no_scheduler",
+        action="store_true",
+        help="Do not query SLURM, e.g. on machines without squeue",
+    )
+    args = parser.parse_args(argv)
+
+    suite = BenchmarkSuite()
+    if args.steps is not None:
+        unknown = set(args.steps) - set(suite.steps)
+        if unknown:
+            parser.error(f"Unknown steps: {', '.join(sorted(unknown))}")
+    try:
+        benchmark_params = load_benchmark_params(args.param_file)
+    except ValueError as e:
+        parser.error(f"{args.param_file}:\n{e}")
+
+    if args.create_only:
+        jobs = [
+            (label, name)
+            for label in benchmark_params
+            for name in suite.order
+            if suite.steps[name].template is not None
+            and (args.steps is None or name in args.steps)
+        ]
+        try:
+            created = create_benchmark_jobs(
+                suite,
+                args.exp_name,
+                benchmark_params,
+                args.jobs_dir,
+                jobs,
+                args.overwrite,
+            )
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(f"{len(created)} benchmarking jobs created in {args.jobs_dir}")
+        return
+
+    # update the restart index once for all jobs of the suite
+    index_file = args.index_file or f"./logs/{args.exp_name}_restart_index.json"
+    os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+    restarts = RestartIndex(index_file, args.data_dir)
+    restarts.update(
+        [
+            benchmark_job_id(args.exp_name, label, step)
+            for label in benchmark_params
+            for step in suite.steps
+        ]
+    )
+
+    scheduler = NoScheduler() if args.no_scheduler else SqueueAdapter()
+    try:
+        statuses, failures = run_pass(
+            suite,
+            args.exp_name,
+            benchmark_params,
+            restarts,
+            scheduler,
+            ClusterSubmitter(args.queue, args.walltime, scheduler=scheduler),
+            args.jobs_dir,
+            args.steps,
+            args.dry_run,
+        )
+    except RuntimeError as e:
+        parser.error(str(e))
+    print(format_statuses(statuses))
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        parser.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,148 @@
+"""
+Import-time benchmark of the `python -m ensemble` subcommands.
+
+Every subcommand is started with `python -X importtime -m ensemble <command> --help`,
+which imports everything the subcommand needs without running it. Subcommands that
+import modules lazily while they run (`generate` and `validate`) are instead run on a
+small parameter table in a temporary HOME. The script fails (exit code 1) if a
+subcommand imports one of its forbidden modules (e.g. NumPy for `generate`) or if its
+import time exceeds the budget.
+
+Usage (from the repository root):
+    python benchmarks/bench_import_time.py [--repeat 5] [--budget_scale 1.0]
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARAM_TABLE = os.path.join(REPO_DIR, "param_tables", "XQarc_csoil.json")
+
+# modules that must never be imported by a subcommand
+FORBIDDEN_MODULES = {
+    "sample": ["matplotlib"],
+    "propose": ["matplotlib", "scipy"],
+    "screen": ["matplotlib", "scipy"],
+    "validate": ["numpy", "matplotlib", "scipy"],
+    "generate": ["numpy", "matplotlib", "scipy"],
+    "diff": ["numpy", "matplotlib", "scipy"],
+    "plot": ["scipy"],
+    "status": ["numpy", "matplotlib", "scipy"],
+    "restarts": ["numpy", "matplotlib", "scipy"],
+    "harvest": ["matplotlib", "scipy"],
+    "submit": ["numpy", "matplotlib", "scipy"],
+    "provision": ["numpy", "matplotlib", "scipy"],
+    "prune": ["numpy", "matplotlib", "scipy"],
+    "benchmark": ["numpy", "matplotlib", "scipy"],
+}
+
+# arguments of the subcommands that are measured with a real run instead of --help
+RUN_ARGS = {
+    "validate": ["--parameter_file", PARAM_TABLE],
+    "generate": [
+        "--vanilla_job",
+        os.path.join(REPO_DIR, "vanilla_jobs", "xqapa"),
+        "--parameter_file",
+        PARAM_TABLE,
+        "--ensemble_exp",
+        "xqbi",
+    ],
+}
+
+# budget of the total import time of each subcommand in milliseconds, generous enough
+# for slow (network) file systems but small enough to catch e.g. a Matplotlib import
+IMPORT_BUDGET_MS = {
+    "sample": 400,
+    "propose": 400,
+    "screen": 400,
+    "validate": 100,
+    "generate": 150,
+    "diff": 100,
+    "plot": 1500,
+    "status": 100,
+    "restarts": 100,
+    "harvest": 400,
+    "submit": 100,
+    "provision": 100,
+    "prune": 100,
+    "benchmark": 100,
+}
+
+
+def measure_imports(command):
+    """
+    Import all modules of a subcommand in a fresh interpreter.
+
+    Args:
+        command (str): Subcommand of `python -m ensemble`.
+
+    Returns:
+        tuple: (total import time in ms, set of the imported top-level packages)
+    """
+    with tempfile.TemporaryDirectory(prefix="bench_import_time_") as home:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "ensemble", command]
+            + RUN_ARGS.get(command, ["--help"]),
+            cwd=REPO_DIR,
+            env=dict(os.environ, HOME=home),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+    total_us = 0
+    packages = set()
+    # lines look like "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # header line
+            continue
+        total_us += int(self_us)
+        packages.add(name.strip().split(".")[0])
+    return total_us / 1000, packages
+
+
+def main(repeat=5, budget_scale=1.0):
+    failures = []
+    for command in FORBIDDEN_MODULES:
+        # the fastest run is the least affected by other processes
+        runs = [measure_imports(command) for _ in range(repeat)]
+        time_ms = min(time for time, _ in runs)
+        packages = set().union(*(packages for _, packages in runs))
+        budget_ms = IMPORT_BUDGET_MS[command] * budget_scale
+        print(f"{command:10s} {time_ms:8.1f} ms (budget {budget_ms:.0f} ms)")
+
+        forbidden = sorted(packages.intersection(FORBIDDEN_MODULES[command]))
+        if forbidden:
+            failures.append(f"'{command}' imports {', '.join(forbidden)}")
+        if time_ms > budget_ms:
+            failures.append(
+                f"'{command}' import time {time_ms:.1f} ms exceeds {budget_ms:.0f} ms"
+            )
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the import time of the ensemble subcommands."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per subcommand (default: 5)"
+    )
+    parser.add_argument(
+        "--budget_scale",
+        type=float,
+        default=1.0,
+        help="Scale all time budgets, e.g. for slow machines (default: 1.0)",
+    )
+    args = parser.parse_args()
+    sys.exit(main(args.repeat, args.budget_scale))
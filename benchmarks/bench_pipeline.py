@@ -0,0 +1,396 @@
+"""
+Benchmark of the ensemble generation pipeline for different ensemble sizes.
+
+Every stage runs the real code in a fresh interpreter with a temporary HOME, a copy
+of `vanilla_jobs/xqapa` and parameter sets taken from the existing tables in
+`param_tables/`:
+
+    sample            space-filling design of the BL values (`sampling.py`)
+    create_json_file  writing the parameter table
+    duplicate_job     copying the vanilla job for every member
+    namelist          patching the &LAND_CC parameters of every member
+    generate          the whole `create_ensemble_jobs.main`
+    generate_workers  the same with `--workers 4` (process pool staging)
+    plot              the parameter distributions (`plotting.py`)
+
+For each stage the wall time (without the interpreter start and imports), the number
+of processes started (forks and subprocesses) and the peak RSS of the interpreter are
+recorded. The results can be saved as a baseline and later runs compared against it,
+the script fails (exit code 1) if a stage is slower, uses more memory or starts more
+processes than allowed by the tolerances.
+
+Usage (from the repository root):
+    python benchmarks/bench_pipeline.py --sizes 10 260 --save_baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --sizes 10 260 --baseline benchmarks/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import itertools
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VANILLA_JOB = os.path.join(REPO_DIR, "vanilla_jobs", "xqapa")
+PARAM_TABLES = os.path.join(REPO_DIR, "param_tables")
+ENSEMBLE_EXP = "xqbe"
+
+STAGES = [
+    "sample",
+    "create_json_file",
+    "duplicate_job",
+    "namelist",
+    "generate",
+    "generate_workers",
+    "plot",
+]
+DEFAULT_SIZES = [10, 260, 1000, 10000]
+# worker processes of the "generate_workers" stage
+GENERATE_WORKERS = 4
+
+# wall time differences below this are timer and file system noise
+MIN_SLACK_S = 0.05
+
+# BL ranges of the sampling stage (same parameters as `create_param_table_random.py`)
+PERTURBED_BL_PARAMS = {
+    "ALPHA": [0.04, 0.12],
+    "G_AREA": [0.002, 0.008],
+    "LAI_MIN": [1.0, 4.0],
+    "NL0": [0.02, 0.07],
+    "R_GROW": [0.15, 0.3],
+    "TLOW": [-5.0, 5.0],
+    "V_CRIT_ALPHA": [0.0, 1.0],
+    "Q10": [1.5, 2.5],
+    "KAPS": [2.5e-9, 7.5e-9],
+}
+
+
+def _count_processes():
+    # count all processes started by this interpreter, i.e. forks (multiprocessing)
+    # and subprocesses (which might use vfork/posix_spawn instead of os.fork)
+    counter = {"processes": 0}
+
+    def count():
+        counter["processes"] += 1
+
+    os.register_at_fork(after_in_parent=count)
+    execute_child = subprocess.Popen._execute_child
+
+    def counting_execute_child(self, *args, **kwargs):
+        count()
+        return execute_child(self, *args, **kwargs)
+
+    subprocess.Popen._execute_child = counting_execute_child
+    return counter
+
+
+def _member_ids(N):
+    from helpers import generate_ensemble_jobid, max_ensemble_size
+
+    if N <= max_ensemble_size(ENSEMBLE_EXP):
+        return [generate_ensemble_jobid(ENSEMBLE_EXP, i) for i in range(N)]
+    # same names as create_ensemble_jobs.py --singleJob
+    return [f"{ENSEMBLE_EXP}_{i:03d}" for i in range(N)]
+
+
+def _existing_records(N):
+    # N parameter sets from the existing tables (repeated if there are fewer), and the
+    # default set of the first table
+    from param_io import iter_records
+
+    tables = sorted(
+        os.path.join(PARAM_TABLES, name)
+        for name in os.listdir(PARAM_TABLES)
+        if name.endswith(".json")
+    )
+    records, default_params = [], None
+    for table in tables:
+        for i, record in enumerate(iter_records(table)):
+            if i == 0:
+                default_params = default_params or record
+            else:
+                records.append(record)
+            if len(records) >= N:
+                break
+        if len(records) >= N:
+            break
+    return list(itertools.islice(itertools.cycle(records), N)), default_params
+
+
+def run_stage(stage, N, work_dir):
+    """
+    Run a single stage in the current interpreter (with HOME set to `work_dir`).
+
+    Returns:
+        dict: Wall time in seconds, number of started processes and peak RSS in MB.
+    """
+    counter = _count_processes()
+    param_file = os.path.join(work_dir, f"{ENSEMBLE_EXP}_{N}.json")
+    jobs_dir = os.path.join(work_dir, "umui_jobs")
+    vanilla_job = os.path.join(work_dir, "vanilla_jobs", "xqapa")
+
+    # prepare everything a stage needs before starting the clock
+    if stage == "sample":
+        from sampling import generate_perturbed_params, design_to_records
+
+        _, default_params = _existing_records(1)
+
+        def run():
+            design, _ = generate_perturbed_params(
+                default_params, PERTURBED_BL_PARAMS, N, "lhs", seed=0
+            )
+            design_to_records(design)
+
+    elif stage == "create_json_file":
+        from helpers import create_json_file
+
+        records, default_params = _existing_records(N)
+
+        def run():
+            create_json_file(param_file, records, default_params)
+
+    elif stage == "duplicate_job":
+        from helpers import duplicate_job
+        from job_template import JobTemplate
+
+        ids = _member_ids(N)
+        shutil.rmtree(jobs_dir, ignore_errors=True)
+
+        def run():
+            template = JobTemplate(vanilla_job)
+            for expid in ids:
+                duplicate_job(vanilla_job, expid, template=template)
+
+    elif stage == "namelist":
+        from namelist import Namelist
+        from param_io import iter_records
+
+        records = list(iter_records(param_file))[1:]
+        members = list(zip(_member_ids(N), records))
+
+        def run():
+            for expid, record in members:
+                namelist = Namelist.read(os.path.join(jobs_dir, expid, "CNTLATM"))
+                for key, value in record.items():
+                    if key in namelist:
+                        namelist.set(key, value)
+                namelist.write()
+
+    elif stage in ("generate", "generate_workers"):
+        import contextlib
+
+        from create_ensemble_jobs import main
+        from helpers import max_ensemble_size
+
+        shutil.rmtree(jobs_dir, ignore_errors=True)
+        single_job = N > max_ensemble_size(ENSEMBLE_EXP)
+        workers = GENERATE_WORKERS if stage == "generate_workers" else 1
+
+        def run():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                main(
+                    vanilla_job,
+                    param_file,
+                    ENSEMBLE_EXP,
+                    singleJob=single_job,
+                    workers=workers,
+                )
+
+    elif stage == "plot":
+        from param_io import iter_records
+        from plotting import plot_param_distributions
+
+        records = list(iter_records(param_file))[1:]
+
+        def run():
+            plot_param_distributions(
+                records,
+                PERTURBED_BL_PARAMS,
+                os.path.join(work_dir, f"{ENSEMBLE_EXP}_{N}.pdf"),
+                ENSEMBLE_EXP,
+            )
+
+    else:
+        raise ValueError(f"Unknown stage {stage}")
+
+    counter["processes"] = 0
+    start = time.perf_counter()
+    run()
+    wall_s = time.perf_counter() - start
+    # ru_maxrss is in kB on Linux, include worker processes of the stage
+    peak_rss_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return {
+        "wall_s": wall_s,
+        "processes": counter["processes"],
+        "peak_rss_mb": peak_rss_kb / 1024,
+    }
+
+
+def measure_stage(stage, N, work_dir):
+    """
+    Run a stage in a fresh interpreter, so that its peak RSS is not affected by the
+    previous stages.
+
+    Returns:
+        dict: Wall time in seconds, number of started processes and peak RSS in MB.
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--stage",
+            stage,
+            "--N",
+            str(N),
+            "--work_dir",
+            work_dir,
+        ],
+        cwd=work_dir,
+        env=dict(os.environ, HOME=work_dir),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage {stage} failed for N={N}:\n{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def compare(results, baseline, tolerance=1.5):
+    """
+    Compare benchmark results with a baseline.
+
+    Args:
+        results (dict): Results of `main`, keyed by "stage@N".
+        baseline (dict): Results of an earlier run. Stages and sizes without a
+            baseline are reported as failures, so that they are never skipped
+            unnoticed.
+        tolerance (float, optional): Allowed ratio of the wall time and peak RSS to the
+            baseline, wall times may always exceed the baseline by `MIN_SLACK_S`. The
+            number of started processes must not increase at all. Defaults to 1.5.
+
+    Returns:
+        list: Descriptions of all regressions and results without a baseline.
+    """
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            failures.append(f"{name}: no baseline, record one with --save_baseline")
+            continue
+        base = baseline[name]
+        if result["wall_s"] > max(
+            base["wall_s"] * tolerance, base["wall_s"] + MIN_SLACK_S
+        ):
+            failures.append(
+                f"{name}: wall time {result['wall_s']:.3f} s exceeds {tolerance} x "
+                f"baseline {base['wall_s']:.3f} s"
+            )
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * tolerance:
+            failures.append(
+                f"{name}: peak RSS {result['peak_rss_mb']:.1f} MB exceeds "
+                f"{tolerance} x baseline {base['peak_rss_mb']:.1f} MB"
+            )
+        if result["processes"] > base["processes"]:
+            failures.append(
+                f"{name}: started {result['processes']} processes, baseline "
+                f"{base['processes']}"
+            )
+    return failures
+
+
+def main(
+    sizes=DEFAULT_SIZES, stages=STAGES, baseline_file=None, tolerance=1.5, repeat=3
+):
+    results = {}
+    print(f"{'stage':18s} {'N':>6s} {'wall':>10s} {'processes':>10s} {'peak RSS':>10s}")
+    for N in sizes:
+        # the stages of one size build on each other (parameter table, job copies)
+        with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+            shutil.copytree(
+                VANILLA_JOB,
+                os.path.join(work_dir, "vanilla_jobs", "xqapa"),
+                symlinks=True,
+            )
+            for stage in stages:
+                # the fastest run is the least affected by other processes
+                runs = [measure_stage(stage, N, work_dir) for _ in range(repeat)]
+                result = min(runs, key=lambda run: run["wall_s"])
+                results[f"{stage}@{N}"] = result
+                print(
+                    f"{stage:18s} {N:6d} {result['wall_s']:8.3f} s "
+                    f"{result['processes']:10d} {result['peak_rss_mb']:7.1f} MB"
+                )
+
+    failures = []
+    if baseline_file is not None:
+        with open(baseline_file, "r") as f:
+            failures = compare(results, json.load(f), tolerance)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return results, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ensemble generation pipeline."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help=f"Ensemble sizes (default: {' '.join(map(str, DEFAULT_SIZES))})",
+    )
+    parser.add_argument(
+        "--stages",
+        type=str,
+        nargs="+",
+        choices=STAGES,
+        default=STAGES,
+        help="Stages to run (default: all, later stages need the earlier ones)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per stage and size (default: 3)"
+    )
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="Compare with this baseline file"
+    )
+    parser.add_argument(
+        "--save_baseline",
+        type=str,
+        default=None,
+        help="Save the results as a new baseline file",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="Allowed ratio of wall time and peak RSS to the baseline (default: 1.5)",
+    )
+    # internal: run a single stage in this interpreter (see `measure_stage`)
+    parser.add_argument("--stage", type=str, choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--N", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--work_dir", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage is not None:
+        sys.path.insert(0, REPO_DIR)
+        print(json.dumps(run_stage(args.stage, args.N, args.work_dir)))
+        sys.exit(0)
+
+    results, failures = main(
+        args.sizes, args.stages, args.baseline, args.tolerance, args.repeat
+    )
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline saved to '{args.save_baseline}'")
+    sys.exit(1 if failures else 0)
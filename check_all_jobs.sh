@@ -6,16 +6,16 @@
 # logfile="./logs/xqaq_generated_ids_20240908.log"
 # logfile="./logs/xqar_generated_ids_20240908.log"
 logfile="./logs/xqau_generated_ids_20240909.log"
+data_dir="/user/home/wb19586/dump2hold"
 
-# Loop through each line in the log file
-while IFS= read -r experiment_id
+# Show the status of all jobs (one squeue call and one scan of all datam directories)
+status_table=$(python -m ensemble status --ids_file "$logfile" --data_dir "$data_dir") || exit 1
+echo "$status_table"
+
+# Submit all jobs that are not queued and have not written any files yet, taken from the
+# same table (rows are "<ID> not started <files>", the header and summary line never match)
+for experiment_id in $(echo "$status_table" | awk '$2 == "not" && $3 == "started" {print $1}')
 do
-  data_dir="/user/home/wb19586/dump2hold/"$experiment_id"/datam"
-  # Check if any files exist in data_dir
-  if [ -n "$(ls -A "$data_dir")" ]; then
-    echo "Files exist in $data_dir"
-  else
-    echo "clustersubmit $experiment_id"
-    clustersubmit -s y -c n -a y -r bc4 -q veryshort -w 6:00:00 "$experiment_id"
-  fi
-done < "$logfile"
\ No newline at end of file
+  echo "clustersubmit $experiment_id"
+  clustersubmit -s y -c n -a y -r bc4 -q veryshort -w 6:00:00 "$experiment_id"
+done
@@ -1,16 +1,15 @@
-# create job directories for each ensemble job on larger, private BRIDGE disk 
-# create symlinks in dump2hold for normal model I/O
+# delete the pp streams a-d and f and all but the dumps of the last 10 years (i.e. the
+# 20 newest atmosphere/ocean dumps) of each ensemble job on the private BRIDGE disk
 user_name=$(whoami)
-while IFS= read -r job_id; do
-    cd "/mnt/storage/private/bridge/um_output/$user_name/$job_id/datam"
-    ls *p[abcdf]00*
-    rm -f *p[abcdf]00*
-    ls -t *da00* | tail -n +21
-    ls -t *da00* | tail -n +21 | while read -r file; do rm -f "$file"; done
-# done < logs/xqab_generated_ids_20240808.log
-# done < logs/xqac_generated_ids_20240815.log
-# done < logs/xqap_generated_ids_20240907.log
-# done < logs/xqaq_generated_ids_20240908.log
-# done < logs/xqar_generated_ids_20240908.log
-done < logs/xqau_generated_ids_20240909.log
+# logfile="logs/xqab_generated_ids_20240808.log"
+# logfile="logs/xqac_generated_ids_20240815.log"
+# logfile="logs/xqap_generated_ids_20240907.log"
+# logfile="logs/xqaq_generated_ids_20240908.log"
+# logfile="logs/xqar_generated_ids_20240908.log"
+logfile="logs/xqau_generated_ids_20240909.log"
 
+# other retention rules can be given with --rule, e.g. to also keep a restart every 50
+# years: --rule "?p[abcdf]:keep_last=0" --rule "?da:keep_last=10,keep_every=50"
+# (remove --execute to only show what would be deleted)
+python -m ensemble prune --ids_file "$logfile" \
+    --data_dir "/mnt/storage/private/bridge/um_output/$user_name" --execute
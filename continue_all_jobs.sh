@@ -8,10 +8,18 @@
 # logfile="./logs/xqaq_generated_ids_20240908.log"
 # logfile="./logs/xqar_generated_ids_20240908.log"
 logfile="./logs/xqau_generated_ids_20240909.log"
+data_dir="/user/home/wb19586/dump2hold"
 
-# Loop through each line in the log file
-while IFS= read -r experiment_id
+# Continue all jobs that have written output but are no longer pending or running, or
+# every job of the log file (as in previous versions) with --all
+if [ "$1" == "--all" ]; then
+  experiment_ids=$(cat "$logfile")
+else
+  experiment_ids=$(python -m ensemble status --ids_file "$logfile" --data_dir "$data_dir" --select finished failed) || exit 1
+fi
+
+for experiment_id in $experiment_ids
 do
   # Run the command with the current experiment ID
   clustersubmit -s y -c y -a y -r bc4 -q veryshort -w 6:00:00 "$experiment_id"
-done < "$logfile"
+done
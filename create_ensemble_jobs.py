@@ -1,123 +1,438 @@
 import os
+import io
 import json
-import subprocess
+import time
+import logging
 import argparse
+import collections
+import contextlib
+import concurrent.futures
 
 from helpers import setup_logging, duplicate_job, generate_ensemble_jobid
+from job_template import JobTemplate
+from manifest import ManifestWriter, member_hash
+from namelist import Namelist, format_value
+from param_io import iter_records, JsonArrayWriter
+from validation import validate_table
+from fingerprint import FingerprintCache, format_difference, verify_ensemble
+from provisioning import ProvisioningError, estimate_member_bytes, provision_storage
+from telemetry import Telemetry, format_summary, profiled
 
 
 # Setup logging directory
-def setup_logging_directories(home_dir, ensemble_exp):
+def setup_logging_directories(
+    home_dir, ensemble_exp, keep_previous=False, level=logging.INFO
+):
     log_dir = os.path.join(home_dir, "hadcm3b-ensemble-generator", "logs")
     logger, generated_ids_log_file, generated_params_log_file = setup_logging(
-        ensemble_exp, log_dir
+        ensemble_exp, log_dir, keep_previous, level
     )
     return logger, generated_ids_log_file, generated_params_log_file
 
 
-def main(vanilla_job, parameter_file, ensemble_exp, singleJob=False):
+def create_member(template, vanilla_job, expid, record, jobs_dir, verbose=False):
+    """
+    Create a single ensemble member from the compiled vanilla job and update its
+    namelist with the new parameters.
+
+    This function does not change the working directory or write to the shared log
+    files, so it can safely run in parallel for many members. All messages are
+    returned instead and emitted by the caller in ensemble order.
+
+    Args:
+        template (JobTemplate): Compiled vanilla job.
+        vanilla_job (str): Path to the vanilla job.
+        expid (str): ID of the new ensemble member.
+        record (dict): New parameters for this ensemble member.
+        jobs_dir (str): Directory in which the new job is created.
+        verbose (bool, optional): Also return a debug message for every parameter set
+            in the namelist. Passed explicitly, as worker processes started with
+            "spawn" don't inherit the logging configuration.
+
+    Returns:
+        tuple: (success, output, messages, spans) with `success` being False if the job
+            could not be duplicated, `output` the console output of `duplicate_job`,
+            `messages` a list of (log level, message) tuples and `spans` a list of
+            (stage, start time, duration) tuples of the "duplicate" and "patch" stages.
+    """
+    messages = []
+    spans = []
+
+    # Create a copy of the vanilla job
+    start, tic = time.time(), time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        duplicated = duplicate_job(
+            vanilla_job, expid, force_overwrite=True, template=template
+        )
+    spans.append(("duplicate", start, time.perf_counter() - tic))
+    if not duplicated:
+        messages.append(
+            (logging.ERROR, f"Failed to duplicate job: {vanilla_job} to {expid}")
+        )
+        return False, output.getvalue(), messages, spans
+
+    original_file = os.path.join(jobs_dir, expid, "CNTLATM")
+
+    # Parse the namelist file once and apply all parameters in memory
+    start, tic = time.time(), time.perf_counter()
+    try:
+        namelist = Namelist.read(original_file)
+    except FileNotFoundError:
+        messages.append((logging.ERROR, f"File not found: {original_file}"))
+        return True, output.getvalue(), messages, spans
+
+    # Loop over all keys (i.e., all parameters to change)
+    for key, value in record.items():
+        if key == "ensemble_id":
+            continue
+        # Check if the key exists in the namelist
+        if key not in namelist:
+            messages.append(
+                (logging.WARNING, f"{expid}: Key {key} not found in {original_file}")
+            )
+            continue
+
+        # Update the parameters in the job namelist
+        if verbose:
+            messages.append(
+                (logging.DEBUG, f"{expid}: Setting {key} to {format_value(value)}")
+            )
+        namelist.set(key, value)
+
+    # Write the updated namelist back to disk in a single pass
+    namelist.write()
+    spans.append(("patch", start, time.perf_counter() - tic))
+
+    return True, output.getvalue(), messages, spans
+
+
+# compiled vanilla job of the current worker process (see `_init_worker`)
+_worker_template = None
+
+
+def _init_worker(template):
+    global _worker_template
+    _worker_template = template
+
+
+def _create_member_in_worker(vanilla_job, expid, record, jobs_dir, verbose):
+    return create_member(
+        _worker_template, vanilla_job, expid, record, jobs_dir, verbose
+    )
+
+
+def _create_members(template, vanilla_job, jobs_dir, members, workers=1, verbose=False):
+    """
+    Create the ensemble members and yield the results in ensemble order.
+
+    Args:
+        members (iterable): (expid, record, build) tuples, members with `build` set to
+            False are skipped and yield None as result.
+        workers (int): Number of worker processes, 1 creates all members serially.
+        verbose (bool): Log every parameter set in the namelists (see
+            `create_member`).
+
+    Yields:
+        tuple: (member, result) with `result` as returned by `create_member`.
+    """
+    if workers <= 1:
+        for member in members:
+            expid, record, build = member
+            if build:
+                yield member, create_member(
+                    template, vanilla_job, expid, record, jobs_dir, verbose
+                )
+            else:
+                yield member, None
+        return
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(template,)
+    )
+    # only keep a limited number of members in flight to keep the memory use flat
+    pending = collections.deque()
+    try:
+        for member in members:
+            expid, record, build = member
+            future = None
+            if build:
+                future = executor.submit(
+                    _create_member_in_worker,
+                    vanilla_job,
+                    expid,
+                    record,
+                    jobs_dir,
+                    verbose,
+                )
+            pending.append((member, future))
+            while len(pending) > 4 * workers:
+                member, future = pending.popleft()
+                yield member, future.result() if future else None
+        while pending:
+            member, future = pending.popleft()
+            yield member, future.result() if future else None
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def main(
+    vanilla_job,
+    parameter_file,
+    ensemble_exp,
+    singleJob=False,
+    workers=1,
+    incremental=False,
+    storage_dir=None,
+    link_dir=None,
+    validate=True,
+    verify=False,
+    verbose=False,
+):
     """
     Generates ensemble job directories based on a template job and new model parameters
     to generate a perturbed parameter ensemble.
 
-    This script reads new model parameters from a JSON file, creates copies of a
-    vanilla job template for each parameter set, and updates the job files with
-    the new parameters. The generated jobs are saved in the specified directory.
-    Logs the operations to both the console and a log file.
+    This script reads new model parameters from a parameter table (JSON or JSON Lines),
+    creates copies of a vanilla job template for each parameter set, and updates the
+    job files with the new parameters. The generated jobs are saved in the specified
+    directory. Logs the operations to both the console and a log file.
+
+    The parameter table is streamed one parameter set at a time and the logs are
+    written incrementally, so the memory use does not grow with the ensemble size.
+
+    With `workers` > 1 the ensemble members are created concurrently in a process
+    pool. The generated jobs and log files are identical to a serial run.
+
+    A manifest with a content hash of each generated member (vanilla job, parameters
+    and generator version) is kept next to the logs. With `incremental` set, members
+    whose hash is unchanged and whose job still exists are skipped, so re-runs only
+    touch changed members and an interrupted run resumes where it stopped.
+
+    All parameter sets are checked against the namelist schema of `validation.py`
+    before any job is created (unless `validate` is False). Invalid sets (e.g. negative
+    values or TLOW above TUPP) are logged and skipped, so that no cluster time is spent
+    on jobs that would crash at start-up. Their IDs are not used by other members.
+
+    With `verify` set, all generated members are compared with the vanilla job after
+    the generation (see `fingerprint.verify_member`). Members that differ in anything
+    but the job ID substitutions and their parameters are logged as errors.
+
+    With `storage_dir` set, the output directories of all members are created in
+    `storage_dir` and linked into `link_dir` (default ~/dump2hold) before any job is
+    generated. Nothing is generated if a link conflicts with an existing file or the
+    projected output of the ensemble exceeds the free space of `storage_dir`.
+
+    The duration of every stage ("duplicate", "patch" and "log-write" of each member,
+    and "validate", "provision", "template" and "verify" of the whole run) is written
+    to a JSON Lines event log next to the other logs and summarised at the end (see
+    `telemetry.py`). The parameters set in every member are only logged with `verbose`.
     """
     home_dir = os.path.expanduser("~")
     jobs_dir = os.path.join(home_dir, "umui_jobs")  # Fixed path for jobs_dir
 
     # Setup logging
     logger, generated_ids_log_file, generated_params_log_file = (
-        setup_logging_directories(home_dir, ensemble_exp)
+        setup_logging_directories(
+            home_dir,
+            ensemble_exp,
+            keep_previous=incremental,
+            level=logging.DEBUG if verbose else logging.INFO,
+        )
+    )
+    manifest_file = os.path.join(
+        os.path.dirname(generated_ids_log_file), f"{ensemble_exp}_manifest.jsonl"
     )
 
-    # Read JSON file with new model parameters
-    try:
-        with open(parameter_file, "r") as f:
-            json_data = json.load(f)
-    except FileNotFoundError:
-        logger.error(f"Input file not found: {parameter_file}")
-        return
-    except json.JSONDecodeError:
-        logger.error(f"Error decoding JSON file: {parameter_file}")
-        return
-
-    num_records = len(json_data)
+    # Time all stages of the run, see `telemetry.py`
+    events_file = f"{os.path.splitext(generated_ids_log_file)[0]}.jsonl".replace(
+        "_generated_ids_", "_telemetry_"
+    )
+    with Telemetry(events_file) as telemetry:
+        # Check the file with the new model parameters, it is read one set at a time
+        if not os.path.isfile(parameter_file):
+            logger.error(f"Input file not found: {parameter_file}")
+            return
 
-    # Prepare to log generated ensemble IDs and parameters to disk
-    updated_params_data = []
+        def member_id(i):
+            if singleJob:
+                return f"{ensemble_exp}_{i:03d}"
+            return generate_ensemble_jobid(ensemble_exp, i)
 
-    # Create a new ensemble job for each record in the JSON file
-    for i in range(num_records):
-        if singleJob:
-            expid = f"{ensemble_exp}_{i:03d}"
-        else:
-            expid = generate_ensemble_jobid(ensemble_exp, i)
+        # Check all parameter sets before creating any job
+        invalid = {}
+        if validate:
+            try:
+                with telemetry.span("validate"):
+                    invalid, unknown = validate_table(parameter_file)
+            except json.JSONDecodeError:
+                logger.error(f"Error decoding JSON file: {parameter_file}")
+                return
+            for key, n_sets in unknown.items():
+                logger.warning(
+                    f"{key} ({n_sets} parameter sets) is not in the schema and is not checked"
+                )
+            for i, violations in sorted(invalid.items()):
+                logger.error(
+                    f"{member_id(i)}: Invalid parameter set, skipping: {'; '.join(violations)}"
+                )
+            if invalid:
+                logger.warning(
+                    f"{len(invalid)} invalid parameter sets will not be generated."
+                )
 
-        with open(generated_ids_log_file, "a") as f:
-            f.write(f"{expid}\n")
+        # Provision the storage of all members in one batch before generating any job
+        if storage_dir is not None:
+            try:
+                ids = [
+                    member_id(i)
+                    for i, _ in enumerate(iter_records(parameter_file))
+                    if i not in invalid
+                ]
+                with telemetry.span("provision"):
+                    member_bytes = estimate_member_bytes(vanilla_job)
+                    report = provision_storage(
+                        ids,
+                        storage_dir,
+                        link_dir or os.path.join(home_dir, "dump2hold"),
+                        member_bytes,
+                    )
+            except json.JSONDecodeError:
+                logger.error(f"Error decoding JSON file: {parameter_file}")
+                return
+            except ProvisioningError as e:
+                logger.error(f"Storage provisioning failed: {e}")
+                return
+            logger.info(
+                f"Provisioned storage of {report['created']} ensemble members in {storage_dir} "
+                f"({report['existing']} already existed), projected output "
+                f"{report['projected'] / 1e9:.1f} GB of {report['free'] / 1e9:.1f} GB free."
+            )
 
-        # Create a copy of the vanilla job
-        if not duplicate_job(vanilla_job, expid, force_overwrite=True):
-            logger.error(f"Failed to duplicate job: {vanilla_job} to {expid}")
-            continue
+        # Read and tokenise the vanilla job only once for all ensemble members
+        try:
+            with telemetry.span("template"):
+                template = JobTemplate(vanilla_job)
+                template_digest = template.digest()
+        except FileNotFoundError as e:
+            logger.error(str(e))
+            return
+        manifest = ManifestWriter(manifest_file)
+        hashes = {}
 
-        # Get the new parameters for this ensemble member
-        record = json_data[i]
-        record["ensemble_id"] = expid
-        updated_params_data.append(record)
+        def plan_members():
+            # assign the ensemble ID to each record and decide whether it needs to be built
+            for i, record in enumerate(iter_records(parameter_file)):
+                if i in invalid:
+                    continue
+                expid = member_id(i)
+                record["ensemble_id"] = expid
 
-        original_file = os.path.join(jobs_dir, expid, "CNTLATM")
+                # compare the content hash of the member with the manifest of previous runs
+                hashes[expid] = member_hash(template_digest, expid, record)
+                build = not (
+                    incremental
+                    and manifest.manifest.get(expid) == hashes[expid]
+                    and os.path.isdir(os.path.join(jobs_dir, expid))
+                )
+                if build:
+                    # mark member as unfinished until it has been rebuilt
+                    manifest.record(expid, None)
+                yield expid, record, build
 
-        # Read the content of the namelist file
+        # Prepare to log generated ensemble IDs and parameters to disk
+        num_records = 0
+        num_built = 0
+        ids_log = open(f"{generated_ids_log_file}.tmp", "w")
+        params_log = JsonArrayWriter(generated_params_log_file)
         try:
-            with open(original_file, "r") as file:
-                file_content = file.read()
-        except FileNotFoundError:
-            logger.error(f"File not found: {original_file}")
-            continue
-
-        # Loop over all keys (i.e., all parameters to change)
-        for key, value in record.items():
-            if key == "ensemble_id":
-                continue
-            # Check if the key exists in the namelist
-            if f"{key}=" not in file_content:
-                logger.warning(f"{expid}: Key {key} not found in {original_file}")
-                continue
-
-            # Convert value to string and remove square brackets if it is a list
-            if isinstance(value, list):
-                value_str = ",".join(map(str, value))
-            else:
-                value_str = str(value)
+            # Create a new ensemble job for each record, results are returned in order
+            for (expid, record, build), result in _create_members(
+                template, vanilla_job, jobs_dir, plan_members(), workers, verbose
+            ):
+                num_records += 1
+                digest = hashes.pop(expid)
+                ids_log.write(f"{expid}\n")
+                if not build:
+                    logger.info(f"{expid}: Unchanged since last run, skipping")
+                    telemetry.skip(expid)
+                    params_log.write(record)
+                    continue
+                num_built += 1
+                duplicated, output, messages, spans = result
+                for stage, start, duration in spans:
+                    telemetry.record(stage, duration, expid, start)
+                with telemetry.span("log-write", expid):
+                    print(output, end="")
+                    for level, message in messages:
+                        logger.log(level, message)
+                    if duplicated:
+                        params_log.write(record)
+                    if duplicated and all(
+                        level < logging.ERROR for level, _ in messages
+                    ):
+                        manifest.record(expid, digest)
+        except json.JSONDecodeError:
+            logger.error(f"Error decoding JSON file: {parameter_file}")
+            return
+        finally:
+            manifest.close()
+            # Save the generated IDs and the updated JSON data to new files for logging
+            ids_log.close()
+            os.replace(f"{generated_ids_log_file}.tmp", generated_ids_log_file)
+            params_log.close()
 
-            # Update the parameters in the job namelist
-            logger.info(f"{expid}: Setting {key} to {value_str}")
+        if incremental:
+            logger.info(
+                f"Generation of {ensemble_exp} ensemble finished. {num_built} ensemble members have been created in {jobs_dir}, "
+                f"{num_records - num_built} unchanged members were skipped."
+            )
+        else:
+            logger.info(
+                f"Generation of {ensemble_exp} ensemble finished. {num_records} ensemble members have been created in {jobs_dir}."
+            )
+        logger.info(
+            f"List of generated ensemble IDs saved to {generated_ids_log_file}."
+        )
+        logger.info(f"Updated JSON file saved to {generated_params_log_file}.")
 
-            # Replace whole line in namelist
-            subprocess.run(
-                ["sed", "-i", f"s|{key}=.*|{key}={value_str}|", original_file],
-                check=True,
+        if verify:
+            cache = FingerprintCache(
+                os.path.join(
+                    os.path.dirname(generated_ids_log_file), "fingerprint_cache.json"
+                )
+            )
+            with telemetry.span("verify"):
+                mismatches = verify_ensemble(
+                    template, jobs_dir, iter_records(generated_params_log_file), cache
+                )
+                cache.save()
+            for expid, differences in sorted(mismatches.items()):
+                logger.error(
+                    f"{expid}: Unexpected differences to {vanilla_job}: "
+                    + "; ".join(format_difference(d) for d in differences)
+                )
+            logger.info(
+                f"Verified {num_records} ensemble members against {vanilla_job}, "
+                f"{len(mismatches)} with unexpected differences."
             )
 
-    # Save the updated JSON data to a new file for logging
-    with open(generated_params_log_file, "w") as f:
-        json.dump(updated_params_data, f, indent=4)
+        for line in format_summary(telemetry.close()):
+            logger.info(line)
+        logger.info(f"Timing events saved to {events_file}.")
 
-    logger.info(
-        f"Generation of {ensemble_exp} ensemble finished. {num_records} ensemble members have been created in {jobs_dir}."
-    )
-    logger.info(f"List of generated ensemble IDs saved to {generated_ids_log_file}.")
-    logger.info(f"Updated JSON file saved to {generated_params_log_file}.")
 
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the generator, also used by `python -m ensemble generate`.
 
-if __name__ == "__main__":
+    Args:
+        argv (list, optional): Command line arguments. Defaults to `sys.argv[1:]`.
+        prog (str, optional): Program name shown in the usage message.
+    """
     # Set up command-line argument parsing
     parser = argparse.ArgumentParser(
-        description="Generate perturbed parameter ensemble jobs."
+        prog=prog, description="Generate perturbed parameter ensemble jobs."
     )
     parser.add_argument(
         "--vanilla_job",
@@ -129,7 +444,7 @@ if __name__ == "__main__":
         "--parameter_file",
         type=str,
         required=True,
-        help="Path to the JSON file containing the parameters to update",
+        help="Path to the parameter table (JSON or JSON Lines) containing the parameters to update",
     )
     parser.add_argument("--ensemble_exp", type=str, required=True, help="Ensemble name")
     parser.add_argument(
@@ -137,8 +452,71 @@ if __name__ == "__main__":
         action="store_true",
         help="Create variations of a single job (with underscores) or variations of letters a-z",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to create ensemble members in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only (re)build ensemble members whose vanilla job or parameters changed since the last run (resumes interrupted runs)",
+    )
+    parser.add_argument(
+        "--skip_validation",
+        action="store_true",
+        help="Do not check the parameter sets against the namelist schema before generating",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check that all members only differ from the vanilla job in their ID and parameters after generating",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Log every parameter that is set in every member",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        metavar="PROFILE_FILE",
+        help="Profile the run with cProfile and save the statistics to PROFILE_FILE (view with `python -m pstats PROFILE_FILE`)",
+    )
+    parser.add_argument(
+        "--provision_storage",
+        type=str,
+        default=None,
+        metavar="STORAGE_DIR",
+        help="Create the output directory of every member in STORAGE_DIR and link it into --link_dir before generating (checks conflicts and free space first)",
+    )
+    parser.add_argument(
+        "--link_dir",
+        type=str,
+        default=None,
+        help="Directory with the links to the output of each job (default: ~/dump2hold)",
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Run the main function with input arguments
-    main(args.vanilla_job, args.parameter_file, args.ensemble_exp, args.singleJob)
+    with profiled(args.profile):
+        main(
+            args.vanilla_job,
+            args.parameter_file,
+            args.ensemble_exp,
+            args.singleJob,
+            args.workers,
+            args.incremental,
+            args.provision_storage,
+            args.link_dir,
+            not args.skip_validation,
+            args.verify,
+            args.verbose,
+        )
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,19 +1,17 @@
 # create job directories for each ensemble job on larger, private BRIDGE disk 
 # create symlinks in dump2hold for normal model I/O
+# all links are checked and the projected output of the ensemble is compared to the
+# free space before anything is created, a failed run is rolled back
+# (the same can be done directly when generating the jobs with
+# `create_ensemble_jobs.py --provision_storage /mnt/storage/private/bridge/um_output/$user_name`)
 user_name=$(whoami)
-while IFS= read -r job_id; do
-    echo "ln -s /mnt/storage/private/bridge/um_output/$user_name/$job_id /user/home/$user_name/dump2hold/$job_id"
-    mkdir -p "/mnt/storage/private/bridge/um_output/$user_name/$job_id"
-    ln -s "/mnt/storage/private/bridge/um_output/$user_name/$job_id" "/user/home/$user_name/dump2hold/$job_id"
-
-# done < logs/xqaRd_generated_ids_20241028.log
-done < logs/XqArn_generated_ids_20241028.log
-
-
-
-
-
-
-
 
+# ids_file=logs/xqaRd_generated_ids_20241028.log
+ids_file=logs/XqArn_generated_ids_20241028.log
 
+python -m ensemble provision \
+    --ids_file "$ids_file" \
+    --storage_dir "/mnt/storage/private/bridge/um_output/$user_name" \
+    --link_dir "/user/home/$user_name/dump2hold" \
+    --vanilla_job ./vanilla_jobs/xqapa \
+    "$@"
@@ -1,12 +1,20 @@
-import random
 import json
-from helpers import create_json_file, plot_param_distributions
+
+import numpy as np
+
+from helpers import create_json_file
+from plotting import plot_many_param_distributions
+from sampling import generate_perturbed_params, design_to_records
 
 ensemble_name = "xqac_csoil"
 
 default_params_file = f"./input_params/top_random_candidates_parameters.json"
 
 N = 50  # number of perturbed parameter sets to generate
+seed = None  # set to an integer to generate a reproducible design
+# sampling strategy: "random", "lhs", "sobol" or "maximin" (see sampling.py)
+strategy = "random"
+processes = None  # number of processes to plot the distributions, None uses all CPUs
 
 # define perturbation ranges for each parameter
 # new parameter sets will generate a random value for each parameter within the defined ranges
@@ -18,50 +26,19 @@ perturbed_BL_params = {
 }
 
 
-def generate_random_perturbed_params(default_params, new_params, N):
-    perturbed_sets = []
-    for _ in range(N):
-        perturbed_set = {}
-        for key in new_params:
-            random_value = random.uniform(new_params[key][0], new_params[key][1])
-            perturbed_set[key] = perturb_list(default_params[key], key, random_value)
-            if key == "TLOW":
-                perturbed_set["TUPP"] = perturb_list(
-                    default_params["TUPP"], "TUPP", random_value
-                )
-        perturbed_sets.append(perturbed_set)
-    return perturbed_sets
-
-
-# Function to perturb a list of values
-def perturb_list(defaults, key, new_bl_param):
-    perturbed_list = defaults.copy()
-    if key == "F0" or key == "NL0":
-        delta_bl = new_bl_param - defaults[0]
-        for i in range(len(defaults)):
-            perturbed_list[i] += delta_bl
-    elif key == "LAI_MIN":
-        perturbed_list[0] = new_bl_param
-        perturbed_list[1] = new_bl_param
-    elif key == "R_GROW" or key in ["V_CRIT_ALPHA", "Q10", "KAPS"]:
-        perturbed_list = [new_bl_param for _ in perturbed_list]
-    elif key == "TLOW" or key == "TUPP":
-        perturbed_list = [default + new_bl_param for default in perturbed_list]
-
-    if key == "KAPS":
-        perturbed_list = [value for value in perturbed_list]
-    else:
-        perturbed_list = [round(value, 5) for value in perturbed_list]
-    return perturbed_list
-
-
 # load in the default parameter sets for each potential candidate
+# and collect the distribution plots to render them in parallel at the end
+plot_jobs = []
 
 with open(default_params_file) as f:
     data = json.load(f)
 
+    # independent seeds for the designs of all candidates, a fixed `seed` would
+    # otherwise give every candidate the same design
+    seeds = np.random.SeedSequence(seed).spawn(len(data))
+
     # Loop through each ensemble and read the parameters
-    for ensemble in data:
+    for ensemble, candidate_seed in zip(data, seeds):
         ensemble_id = ensemble.get("ensemble_id", "Unknown ID")
 
         default_params = {
@@ -93,9 +70,16 @@ with open(default_params_file) as f:
             "KAPS": [2.5e-009, 7.5e-009],
         }
 
-        perturbed_sets = generate_random_perturbed_params(
-            default_params, perturbed_BL_params, N
+        design, quality = generate_perturbed_params(
+            default_params,
+            perturbed_BL_params,
+            N,
+            strategy,
+            candidate_seed,
+            unrounded=["KAPS"],
+            quality=True,
         )
+        perturbed_sets = design_to_records(design)
 
         output_file = f"./param_tables/{ensemble_id}_csoil.json"
         pdf_file = f"./param_tables/{ensemble_id}_csoil_param_distributions.pdf"
@@ -106,7 +90,8 @@ with open(default_params_file) as f:
         print(
             f"Generated {len(perturbed_sets)} parameter sets and saved to '{output_file}'"
         )
+        print(f"Design quality ({strategy}): {quality}")
 
-        plot_param_distributions(
-            perturbed_sets, perturbed_BL_params, pdf_file, ensemble_id
-        )
+        plot_jobs.append((perturbed_sets, perturbed_BL_params, pdf_file, ensemble_id))
+
+plot_many_param_distributions(plot_jobs, processes)
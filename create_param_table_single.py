@@ -1,4 +1,5 @@
 from helpers import create_json_file, plot_param_distributions
+from sampling import perturb_values
 
 ensemble_name = "acang_single_param_tuning"
 
@@ -53,39 +54,23 @@ def generate_perturbed_params(default_params, new_params):
 
 
 def perturb_params(key, defaults, new_params):
+    # perturb all defined values of the current key at once
+    values = {key: perturb_values(defaults[key], key, new_params[key], decimals=3)}
+    if key == "TLOW":
+        values["TUPP"] = perturb_values(
+            defaults["TUPP"], "TUPP", new_params["TLOW"], decimals=3
+        )
     perturbed_sets = []
     # generate a new set for each defined perturbed value
     for idx in range(len(new_params[key])):
-        # copy default set first and then onlu update the current key
+        # copy default set first and then only update the current key
         perturbed_set = defaults.copy()
-        perturbed_set[key] = perturb_list(defaults[key], key, new_params[key][idx])
-        if key == "TLOW":
-            perturbed_set["TUPP"] = perturb_list(
-                defaults["TUPP"], "TUPP", new_params["TLOW"][idx]
-            )
+        for perturbed_key in values:
+            perturbed_set[perturbed_key] = values[perturbed_key][idx].tolist()
         perturbed_sets.append(perturbed_set)
     return perturbed_sets
 
 
-# Function to perturb a list of values
-def perturb_list(defaults, key, new_bl_param):
-    perturbed_list = defaults.copy()
-    if key == "F0" or key == "NL0":
-        delta_bl = new_bl_param - defaults[0]
-        for i in range(0, len(defaults)):
-            perturbed_list[i] += delta_bl
-    elif key == "LAI_MIN":
-        perturbed_list[0] = new_bl_param
-        perturbed_list[1] = new_bl_param
-    elif key == "R_GROW" or key == "V_CRIT_ALPHA":
-        perturbed_list = [new_bl_param for _ in perturbed_list]
-    elif key == "TLOW" or key == "TUPP":
-        perturbed_list = [default + new_bl_param for default in perturbed_list]
-
-    perturbed_list = [round(value, 3) for value in perturbed_list]
-    return perturbed_list
-
-
 perturbed_sets = generate_perturbed_params(default_params, perturbed_BL_params)
 
 # save the parameters to a JSON file with custom formatting
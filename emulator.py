@@ -0,0 +1,162 @@
+import numpy as np
+
+
+def normal_cdf(z):
+    """Cumulative distribution function of the standard normal distribution."""
+    # Abramowitz & Stegun 7.1.26, absolute error < 1.5e-7 (NumPy has no erf)
+    x = np.abs(np.asarray(z, dtype=float)) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (
+        0.254829592
+        + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429)))
+    )
+    erf = 1.0 - poly * np.exp(-(x**2))
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+def normal_pdf(z):
+    """Probability density function of the standard normal distribution."""
+    return np.exp(-0.5 * np.asarray(z, dtype=float) ** 2) / np.sqrt(2.0 * np.pi)
+
+
+def _squared_distances(A, B, length_scales):
+    A = A / length_scales
+    B = B / length_scales
+    return np.maximum(
+        (A**2).sum(1)[:, np.newaxis] + (B**2).sum(1)[np.newaxis, :] - 2.0 * A @ B.T,
+        0.0,
+    )
+
+
+class GaussianProcess:
+    """
+    Gaussian process emulator with a squared exponential kernel in NumPy.
+
+    The inputs should be scaled to the unit hypercube (e.g. the BL values of the
+    perturbed parameters relative to their min/max range), the outputs are
+    standardised internally. The length scale of every input and the noise variance
+    are chosen by maximising the log marginal likelihood over `n_candidates` random
+    candidates, which is fast enough for the few hundred members of an ensemble.
+
+    Args:
+        n_candidates (int, optional): Number of hyperparameter candidates. Defaults
+            to 128.
+        seed (int, optional): Seed of the hyperparameter search. Defaults to 0.
+    """
+
+    def __init__(self, n_candidates=128, seed=0):
+        self.n_candidates = n_candidates
+        self.seed = seed
+        self.length_scales = None
+        self.noise = None
+
+    def _factorise(self, X, y, length_scales, noise):
+        K = np.exp(-0.5 * _squared_distances(X, X, length_scales))
+        K[np.diag_indices_from(K)] += noise + 1e-8
+        L = np.linalg.cholesky(K)
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+        # log marginal likelihood without the constant term
+        log_likelihood = -0.5 * y @ alpha - np.log(np.diag(L)).sum()
+        return L, alpha, log_likelihood
+
+    def fit(self, X, y, length_scales=None, noise=None):
+        """
+        Fit the emulator to the training data.
+
+        Args:
+            X (numpy.ndarray): N x P array of inputs.
+            y (numpy.ndarray): N outputs.
+            length_scales (numpy.ndarray, optional): Fixed length scales, skips the
+                hyperparameter search (together with `noise`).
+            noise (float, optional): Fixed noise variance of the standardised outputs.
+
+        Returns:
+            GaussianProcess: The fitted emulator.
+
+        Raises:
+            ValueError: If the covariance matrix cannot be factorised for any
+                hyperparameters (e.g. duplicated inputs or non-finite values).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        y = np.asarray(y, dtype=float)
+        self.X = X
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        y = (y - self.y_mean) / self.y_std
+
+        if length_scales is None or noise is None:
+            rng = np.random.default_rng(self.seed)
+            P = X.shape[1]
+            # log-uniform candidates, the first one is a neutral default
+            candidates = [(np.full(P, 0.3), 1e-2)] + [
+                (10 ** rng.uniform(-1.5, 0.7, P), 10 ** rng.uniform(-6, -0.5))
+                for _ in range(self.n_candidates - 1)
+            ]
+            best = -np.inf
+            for candidate_scales, candidate_noise in candidates:
+                try:
+                    *_, log_likelihood = self._factorise(
+                        X, y, candidate_scales, candidate_noise
+                    )
+                except np.linalg.LinAlgError:
+                    continue
+                if log_likelihood > best:
+                    best = log_likelihood
+                    length_scales, noise = candidate_scales, candidate_noise
+            if length_scales is None:
+                raise ValueError(
+                    f"Emulator fit failed: the covariance matrix of the {len(X)} "
+                    f"training points could not be factorised for any of the "
+                    f"{len(candidates)} hyperparameter candidates"
+                )
+
+        self.length_scales = np.asarray(length_scales, dtype=float)
+        self.noise = float(noise)
+        try:
+            self._L, self._alpha, self.log_likelihood = self._factorise(
+                X, y, self.length_scales, self.noise
+            )
+        except np.linalg.LinAlgError as e:
+            raise ValueError(f"Emulator fit failed: {e}")
+        return self
+
+    def predict(self, X):
+        """
+        Predict the outputs at new inputs.
+
+        Args:
+            X (numpy.ndarray): M x P array of inputs.
+
+        Returns:
+            tuple: (mean, standard deviation) of the prediction, two arrays of length M.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        K_star = np.exp(-0.5 * _squared_distances(X, self.X, self.length_scales))
+        mean = K_star @ self._alpha
+        v = np.linalg.solve(self._L, K_star.T)
+        variance = np.maximum(1.0 - (v**2).sum(0), 1e-12)
+        return (
+            self.y_mean + self.y_std * mean,
+            self.y_std * np.sqrt(variance),
+        )
+
+
+def expected_improvement(mean, std, best, xi=0.0, maximise=True):
+    """
+    Expected improvement of new points over the best output so far.
+
+    Args:
+        mean (numpy.ndarray): Predicted mean of the new points.
+        std (numpy.ndarray): Predicted standard deviation of the new points.
+        best (float): Best output of the training data.
+        xi (float, optional): Minimum improvement in units of the outputs, larger
+            values favour exploration over exploitation. Defaults to 0.
+        maximise (bool, optional): Whether higher outputs are better. Defaults to True.
+
+    Returns:
+        numpy.ndarray: Expected improvement of every point.
+    """
+    improvement = (mean - best) if maximise else (best - mean)
+    improvement = improvement - xi
+    z = improvement / std
+    return improvement * normal_cdf(z) + std * normal_pdf(z)
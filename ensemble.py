@@ -0,0 +1,250 @@
+"""
+Single entry point for the ensemble generator workflow.
+
+    python -m ensemble sample --config ./input_params/xqau_sample.json
+    python -m ensemble propose --config ./input_params/xqau_sample.json --params_logs ./logs/xqau_updated_parameters_20240909.json --scores ./xqau_scores.csv --N 20 --output_file ./param_tables/xqav.json
+    python -m ensemble screen --config ./input_params/xqau_sample.json --parameter_file ./param_tables/xqav.json --params_logs ./logs/xqau_updated_parameters_20240909.json --scores ./xqau_scores.csv --targets ./xqau_targets.json --output_file ./param_tables/xqav_screened.json
+    python -m ensemble validate --parameter_file ./param_tables/xqau.json
+    python -m ensemble generate --vanilla_job ./vanilla_jobs/xqapa --parameter_file ./param_tables/xqau.json --ensemble_exp xqau
+    python -m ensemble diff ./vanilla_jobs/xqapa ./vanilla_jobs/xqaba
+    python -m ensemble plot --parameter_file ./param_tables/xqau.json
+    python -m ensemble submit --ids_file ./logs/xqau_generated_ids_20240909.log --max_queued 300
+    python -m ensemble status --ids_file ./logs/xqau_generated_ids_20240909.log --target_year 1890
+    python -m ensemble restarts --ids_file ./logs/xqau_generated_ids_20240909.log
+    python -m ensemble harvest --ids_file ./logs/xqau_generated_ids_20240909.log --params_logs ./logs/xqau_updated_parameters_20240909.json
+    python -m ensemble provision --ids_file ./logs/xqau_generated_ids_20240909.log --storage_dir /mnt/storage/private/bridge/um_output/$USER --vanilla_job ./vanilla_jobs/xqapa
+    python -m ensemble prune --ids_file ./logs/xqau_generated_ids_20240909.log --execute
+    python -m ensemble benchmark --exp_name xqbb --dry_run
+
+Every subcommand only imports the modules it needs, e.g. `generate`, `status` and `restarts` never
+import NumPy or Matplotlib, which are slow to import on network file systems. Keep it
+that way when adding new subcommands (`benchmarks/bench_import_time.py` checks this).
+"""
+
+import os
+import sys
+import argparse
+
+
+def sample(argv, prog):
+    """Generate a parameter table from a JSON sampling configuration."""
+    import json
+
+    from param_io import write_param_table
+    from sampling import SAMPLERS, generate_perturbed_params, design_to_records
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Generate perturbed parameter sets with a space-filling design.",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=True,
+        help='JSON file with the "default_params" and the min/max "perturbed_BL_params"',
+    )
+    parser.add_argument(
+        "--output_file",
+        type=str,
+        required=True,
+        help="Parameter table to write (.json, .jsonl or .ptab)",
+    )
+    parser.add_argument(
+        "--N", type=int, default=256, help="Number of parameter sets (default: 256)"
+    )
+    parser.add_argument(
+        "--strategy",
+        type=str,
+        default="maximin",
+        choices=list(SAMPLERS),
+        help="Sampling strategy (default: maximin)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Seed for a reproducible design"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    design, quality = generate_perturbed_params(
+        config["default_params"],
+        config["perturbed_BL_params"],
+        args.N,
+        strategy=args.strategy,
+        seed=args.seed,
+        quality=True,
+    )
+    write_param_table(
+        args.output_file, design_to_records(design), config["default_params"]
+    )
+
+    quality_file = f"{os.path.splitext(args.output_file)[0]}_design_quality.json"
+    with open(quality_file, "w") as f:
+        json.dump(quality, f, indent=4)
+    print(f"Parameter sets saved to '{args.output_file}'")
+    print(f"Design quality ({args.strategy}): {quality}")
+
+
+def propose(argv, prog):
+    """Propose the next ensemble wave from member scores (see `adaptive_design.py`)."""
+    import adaptive_design
+
+    adaptive_design.cli(argv, prog)
+
+
+def screen(argv, prog):
+    """Remove implausible parameter sets (see `history_matching.py`)."""
+    import history_matching
+
+    history_matching.cli(argv, prog)
+
+
+def validate(argv, prog):
+    """Check the parameter sets of a parameter table (see `validation.py`)."""
+    import validation
+
+    validation.cli(argv, prog)
+
+
+def generate(argv, prog):
+    """Create the ensemble jobs (see `create_ensemble_jobs.py`)."""
+    import create_ensemble_jobs
+
+    create_ensemble_jobs.cli(argv, prog)
+
+
+def diff(argv, prog):
+    """Structural differences between two jobs (see `fingerprint.py`)."""
+    import fingerprint
+
+    fingerprint.cli(argv, prog)
+
+
+def plot(argv, prog):
+    """Plot the parameter distributions of a parameter table."""
+    from param_io import iter_records
+    from plotting import plot_param_distributions
+
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Plot the parameter distributions of a parameter table."
+    )
+    parser.add_argument(
+        "--parameter_file", type=str, required=True, help="Path to the parameter table"
+    )
+    parser.add_argument(
+        "--pdf_file",
+        type=str,
+        default=None,
+        help="Output PDF file (default: <parameter_file>_param_distributions.pdf)",
+    )
+    parser.add_argument(
+        "--ensemble_name",
+        type=str,
+        default=None,
+        help="Ensemble name used in the titles (default: name of the parameter table)",
+    )
+    parser.add_argument(
+        "--keys",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Parameters to plot (default: all parameters of the table)",
+    )
+    args = parser.parse_args(argv)
+
+    base = os.path.splitext(args.parameter_file)[0]
+    pdf_file = args.pdf_file or f"{base}_param_distributions.pdf"
+    ensemble_name = args.ensemble_name or os.path.basename(base)
+
+    records = iter_records(args.parameter_file)
+    # the first set holds the default parameters
+    default_params = next(records)
+    perturbed_sets = list(records)
+    keys = args.keys or list(default_params)
+    plot_param_distributions(
+        perturbed_sets, dict.fromkeys(keys), pdf_file, ensemble_name
+    )
+
+
+def status(argv, prog):
+    """Show the status of all ensemble members (see `status.py`)."""
+    import status as status_scanner
+
+    status_scanner.cli(argv, prog)
+
+
+def restarts(argv, prog):
+    """Show the latest restart year of all ensemble members (see `restart_index.py`)."""
+    import restart_index
+
+    restart_index.cli(argv, prog)
+
+
+def harvest(argv, prog):
+    """Harvest global diagnostics of all ensemble members (see `harvester.py`)."""
+    import harvester
+
+    harvester.cli(argv, prog)
+
+
+def submit(argv, prog):
+    """Submit all jobs of an ensemble (see `submission.py`)."""
+    import submission
+
+    submission.cli(argv, prog)
+
+
+def provision(argv, prog):
+    """Create the output directories of all members (see `provisioning.py`)."""
+    import provisioning
+
+    provisioning.cli(argv, prog)
+
+
+def prune(argv, prog):
+    """Delete old model output of all ensemble members (see `pruning.py`)."""
+    import pruning
+
+    pruning.cli(argv, prog)
+
+
+def benchmark(argv, prog):
+    """Create and submit the benchmarking jobs (see `benchmarking.py`)."""
+    import benchmarking
+
+    benchmarking.cli(argv, prog)
+
+
+SUBCOMMANDS = {
+    "sample": sample,
+    "propose": propose,
+    "screen": screen,
+    "validate": validate,
+    "generate": generate,
+    "diff": diff,
+    "plot": plot,
+    "status": status,
+    "restarts": restarts,
+    "harvest": harvest,
+    "submit": submit,
+    "provision": provision,
+    "prune": prune,
+    "benchmark": benchmark,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ensemble",
+        description="HadCM3B land carbon cycle ensembles generator.",
+    )
+    parser.add_argument("command", choices=list(SUBCOMMANDS), help="Subcommand to run")
+    parser.add_argument(
+        "args", nargs=argparse.REMAINDER, help="Arguments of the subcommand"
+    )
+    args = parser.parse_args(argv)
+    SUBCOMMANDS[args.command](args.args, f"{parser.prog} {args.command}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
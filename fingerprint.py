@@ -0,0 +1,455 @@
+import os
+import re
+import json
+import fnmatch
+import hashlib
+import argparse
+import threading
+import collections
+import concurrent.futures
+
+from namelist import _GROUP_END, _GROUP_START, format_value
+
+# shell scripts whose variable assignments (e.g. LOADMODULE in SCRIPT) are compared
+# one by one
+SHELL_FILES = ["SCRIPT", "SUBMIT", "PPCNTL"]
+# lists of mods, override files and scripts, compared as sets of entries
+LIST_FILES = ["MODS_*", "COMP_OPTS", "RECON_COMP_OPTS"]
+# files that are not compared by default: backups of the substituted files and the
+# timestamped copies of earlier UMUI processing (e.g. CNTLATM-xpzna-202161842)
+DEFAULT_IGNORE = ["*.ORIGINAL", "*-*-[0-9]*"]
+
+_QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+_ENTRY = re.compile(r"(?:^|(?<=[,\s]))([A-Za-z_]\w*(?:\([^)]*\))?)\s*=")
+_SHELL_ASSIGNMENT = re.compile(r"^\s*(?:export\s+)?([A-Za-z_]\w*)=(.*)$")
+
+Difference = collections.namedtuple(
+    "Difference", ["file", "section", "key", "old", "new"]
+)
+Difference.__doc__ = """
+Single difference between two jobs.
+
+Args:
+    file (str): Relative path of the file.
+    section (str): Section of the file, e.g. "&LAND_CC" for a namelist group,
+        "variables" for the variables of a shell script, "mods" for a list of mods or
+        "text" for everything else, None if the file only exists in one of the jobs.
+    key (str): Entry of the section (e.g. the namelist or shell variable), None for
+        sections that are compared as a whole.
+    old (str): Value in the first job, None if missing.
+    new (str): Value in the second job, None if missing.
+"""
+
+
+def _hash(lines):
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def _unique(section, key):
+    # number repeated keys, e.g. the &STREQ groups of STASHC or MESSAGE in SCRIPT
+    if key not in section:
+        return key
+    n = 2
+    while f"{key}#{n}" in section:
+        n += 1
+    return f"{key}#{n}"
+
+
+def _namelist_entries(body):
+    # split the body of a namelist group into its entries, ignoring `=` and `,` in
+    # quoted strings; values are normalised by removing all whitespace outside quotes
+    # and trailing commas
+    quoted = []
+
+    def mask(match):
+        quoted.append(match.group(0))
+        return f"\0{len(quoted) - 1}\0"
+
+    masked = _QUOTED.sub(mask, body)
+    parts = _ENTRY.split(masked)
+    entries = {}
+    for key, value in zip(parts[1::2], parts[2::2]):
+        value = re.sub(r"\s+", "", value).rstrip(",")
+        value = re.sub(r"\0(\d+)\0", lambda m: quoted[int(m.group(1))], value)
+        entries[_unique(entries, re.sub(r"\s+", "", key).upper())] = value
+    return entries
+
+
+def parse_sections(name, content):
+    """
+    Parse the content of a job file into normalised sections.
+
+    Namelist groups become one section each (named "&GROUP"), the variable assignments
+    of shell scripts the section "variables", the entries of mods lists the section
+    "mods". All remaining lines are summarised by their hash in the section "text",
+    so formatting changes of namelist values (e.g. spaces or trailing commas) are not
+    reported as differences.
+
+    Args:
+        name (str): File name, determines how the file is parsed.
+        content (bytes): Content of the file.
+
+    Returns:
+        dict: Section names mapped to dicts of their entries and values.
+    """
+    lines = content.decode(errors="replace").splitlines()
+    sections = {}
+    if any(fnmatch.fnmatchcase(name, pattern) for pattern in LIST_FILES):
+        entries = [line.strip() for line in lines if line.strip()]
+        sections["mods"] = {entry: "" for entry in entries}
+        return sections
+
+    text = []
+    if name in SHELL_FILES:
+        variables = {}
+        for line in lines:
+            match = _SHELL_ASSIGNMENT.match(line)
+            if match:
+                variables[_unique(variables, match.group(1))] = match.group(2).strip()
+            else:
+                text.append(line)
+        sections["variables"] = variables
+    else:
+        group, body = None, []
+        for line in lines:
+            if group is None:
+                match = _GROUP_START.match(line)
+                if match:
+                    group, body = _unique(sections, f"&{match.group(1)}"), []
+                else:
+                    text.append(line)
+            elif _GROUP_END.match(line):
+                sections[group] = _namelist_entries("\n".join(body))
+                group = None
+            else:
+                body.append(line)
+        if group is not None:
+            # unterminated group, keep it as text
+            text.extend(body)
+    if any(line.strip() for line in text):
+        sections["text"] = {None: _hash(text)}
+    return sections
+
+
+class FingerprintCache:
+    """
+    Cache of the parsed sections of job files.
+
+    Entries are keyed by device and inode and are only reused if the modification time
+    and size of the file are unchanged, so the hardlinked files of all members of an
+    ensemble share the entry of their vanilla job file and are never parsed again.
+
+    Args:
+        cache_file (str, optional): JSON file to keep the cache between runs, None for
+            an in-memory cache.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.n_parsed = 0
+        self._lock = threading.Lock()
+        if cache_file is not None and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, "r") as f:
+                    for key, entry in json.load(f).get("files", {}).items():
+                        entry["sections"] = _decode_sections(entry["sections"])
+                        self.entries[key] = entry
+            except (json.JSONDecodeError, AttributeError, KeyError):
+                # rebuild a corrupt cache
+                self.entries = {}
+
+    def sections(self, path):
+        """Parsed sections of a file (see `parse_sections`)."""
+        stat = os.stat(path)
+        key = f"{stat.st_dev}:{stat.st_ino}"
+        entry = self.entries.get(key)
+        if (
+            entry is not None
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            return entry["sections"]
+        with open(path, "rb") as f:
+            sections = parse_sections(os.path.basename(path), f.read())
+        with self._lock:
+            self.n_parsed += 1
+            self.entries[key] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sections": sections,
+            }
+        return sections
+
+    def save(self):
+        if self.cache_file is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w") as f:
+            files = {
+                key: dict(entry, sections=_encode_sections(entry["sections"]))
+                for key, entry in self.entries.items()
+            }
+            json.dump({"version": 1, "files": files}, f)
+        os.replace(tmp_file, self.cache_file)
+
+
+def _encode_sections(sections):
+    # JSON keys must be strings, sections compared as a whole use the key None
+    return {
+        section: {"" if key is None else key: value for key, value in entries.items()}
+        for section, entries in sections.items()
+    }
+
+
+def _decode_sections(sections):
+    return {
+        section: {
+            None if key == "" and section == "text" else key: value
+            for key, value in entries.items()
+        }
+        for section, entries in sections.items()
+    }
+
+
+def _ignored(rel_path, ignore):
+    return any(fnmatch.fnmatchcase(os.path.basename(rel_path), p) for p in ignore)
+
+
+def job_fingerprint_files(job_dir, ignore=DEFAULT_IGNORE):
+    """Relative paths of all compared files of a job."""
+    for root, dirs, files in os.walk(job_dir):
+        dirs.sort()
+        for name in sorted(files):
+            rel_path = os.path.relpath(os.path.join(root, name), job_dir)
+            if not _ignored(rel_path, ignore):
+                yield rel_path
+
+
+def job_fingerprint(job_dir, cache=None, ignore=DEFAULT_IGNORE):
+    """
+    Parsed sections of all files of a job.
+
+    Returns:
+        dict: Relative file paths mapped to their sections.
+    """
+    cache = cache or FingerprintCache()
+    return {
+        rel_path: cache.sections(os.path.join(job_dir, rel_path))
+        for rel_path in job_fingerprint_files(job_dir, ignore)
+    }
+
+
+def diff_fingerprints(old, new):
+    """
+    Structural differences between two job fingerprints.
+
+    Returns:
+        list: `Difference`s, ordered by file, section and key.
+    """
+    differences = []
+    for rel_path in sorted(set(old) | set(new)):
+        if rel_path not in new or rel_path not in old:
+            differences.append(
+                Difference(
+                    rel_path,
+                    None,
+                    None,
+                    "present" if rel_path in old else None,
+                    "present" if rel_path in new else None,
+                )
+            )
+            continue
+        old_sections, new_sections = old[rel_path], new[rel_path]
+        for section in sorted(set(old_sections) | set(new_sections)):
+            old_entries = old_sections.get(section, {})
+            new_entries = new_sections.get(section, {})
+            keys = list(old_entries) + [k for k in new_entries if k not in old_entries]
+            for key in keys:
+                if old_entries.get(key) != new_entries.get(key):
+                    differences.append(
+                        Difference(
+                            rel_path,
+                            section,
+                            key,
+                            old_entries.get(key),
+                            new_entries.get(key),
+                        )
+                    )
+    return differences
+
+
+def diff_jobs(old_job, new_job, cache=None, ignore=DEFAULT_IGNORE):
+    """Structural differences between two jobs (see `diff_fingerprints`)."""
+    cache = cache or FingerprintCache()
+    return diff_fingerprints(
+        job_fingerprint(old_job, cache, ignore), job_fingerprint(new_job, cache, ignore)
+    )
+
+
+def verify_member(
+    template, job_dir, record, cache=None, parameter_file="CNTLATM", group="&LAND_CC"
+):
+    """
+    Check that a generated member only differs from its template by the job ID
+    substitutions and the parameters of its parameter set.
+
+    Files that are identical to the template (hardlinks) or to the rendered template
+    file are not parsed at all, so usually only the parameter file is compared
+    section by section.
+
+    Args:
+        template (JobTemplate): Compiled vanilla job.
+        job_dir (str): Directory of the member, the directory name is its job ID.
+        record (dict): Parameter set of the member.
+        cache (FingerprintCache, optional): Cache of parsed files.
+        parameter_file (str, optional): File with the parameters. Defaults to "CNTLATM".
+        group (str, optional): Namelist group of the parameters. Defaults to
+            "&LAND_CC".
+
+    Returns:
+        list: Unexpected `Difference`s, empty if the member is as intended.
+    """
+    cache = cache or FingerprintCache()
+    expid = os.path.basename(job_dir.rstrip("/"))
+    rendered = template.render(expid)
+    expected_files = set(rendered) | {
+        rel_path
+        for rel_path in template.linked_files
+        if not _ignored(rel_path, DEFAULT_IGNORE)
+    }
+    actual_files = set(job_fingerprint_files(job_dir))
+
+    differences = []
+    for rel_path in sorted(expected_files | actual_files):
+        path = os.path.join(job_dir, rel_path)
+        if rel_path not in actual_files or rel_path not in expected_files:
+            differences.append(
+                Difference(
+                    rel_path,
+                    None,
+                    None,
+                    "present" if rel_path in expected_files else None,
+                    "present" if rel_path in actual_files else None,
+                )
+            )
+            continue
+        if rel_path in rendered:
+            with open(path, "rb") as f:
+                if f.read() == rendered[rel_path]:
+                    continue
+            expected = parse_sections(os.path.basename(rel_path), rendered[rel_path])
+        else:
+            template_path = os.path.join(template.template_dir, rel_path)
+            if os.path.samefile(template_path, path):
+                continue
+            expected = cache.sections(template_path)
+        differences.extend(
+            diff_fingerprints({rel_path: expected}, {rel_path: cache.sections(path)})
+        )
+
+    intended = {
+        key.upper(): format_value(value).replace(" ", "")
+        for key, value in record.items()
+        if key != "ensemble_id"
+    }
+    return [
+        difference
+        for difference in differences
+        if not (
+            difference.file == parameter_file
+            and difference.section == group
+            and difference.key in intended
+            and difference.new == intended[difference.key]
+        )
+    ]
+
+
+def verify_ensemble(template, jobs_dir, records, cache=None, threads=16):
+    """
+    Verify many members in parallel (see `verify_member`).
+
+    Args:
+        template (JobTemplate): Compiled vanilla job.
+        jobs_dir (str): Directory with the member jobs.
+        records (iterable): Parameter sets with their "ensemble_id".
+        cache (FingerprintCache, optional): Cache of parsed files.
+        threads (int, optional): Number of threads. Defaults to 16.
+
+    Returns:
+        dict: Ensemble IDs of the members with unexpected differences mapped to their
+            `Difference`s.
+    """
+    cache = cache or FingerprintCache()
+
+    def verify(record):
+        job_dir = os.path.join(jobs_dir, record["ensemble_id"])
+        if not os.path.isdir(job_dir):
+            return record["ensemble_id"], [
+                Difference(record["ensemble_id"], None, None, "present", None)
+            ]
+        return record["ensemble_id"], verify_member(template, job_dir, record, cache)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return {
+            expid: differences
+            for expid, differences in executor.map(verify, records)
+            if differences
+        }
+
+
+def format_difference(difference):
+    """One-line description of a `Difference`."""
+    if difference.section is None:
+        where = (
+            "only in the first job"
+            if difference.new is None
+            else "only in the second job"
+        )
+        return f"{difference.file}: {where}"
+    location = f"{difference.file} {difference.section}"
+    if difference.key is not None:
+        location += f" {difference.key}"
+    return f"{location}: {difference.old} -> {difference.new}"
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the job diff, also used by `python -m ensemble diff`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Show the structural differences between two jobs (templates or "
+        "ensemble members).",
+    )
+    parser.add_argument("old_job", type=str, help="Path to the first job")
+    parser.add_argument("new_job", type=str, help="Path to the second job")
+    parser.add_argument(
+        "--cache_file",
+        type=str,
+        default=os.path.join("logs", "fingerprint_cache.json"),
+        help="Cache of parsed job files (default: ./logs/fingerprint_cache.json)",
+    )
+    parser.add_argument(
+        "--all_files",
+        action="store_true",
+        help="Also compare the .ORIGINAL backups and timestamped UMUI copies",
+    )
+    args = parser.parse_args(argv)
+
+    for job in (args.old_job, args.new_job):
+        if not os.path.isdir(job):
+            parser.error(f"Job not found: {job}")
+    cache = FingerprintCache(args.cache_file)
+    differences = diff_jobs(
+        args.old_job, args.new_job, cache, [] if args.all_files else DEFAULT_IGNORE
+    )
+    cache.save()
+    for difference in differences:
+        print(format_difference(difference))
+    print(f"{len(differences)} differences.")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,484 @@
+import os
+import json
+import argparse
+import collections
+import concurrent.futures
+
+import numpy as np
+
+from param_io import iter_records
+from restart_index import stream_key
+from status import read_ensemble_ids
+from um_output import parse_um_filename
+
+# global diagnostics of the TRIFFID vegetation (STASH section 19) harvested by default
+DEFAULT_DIAGNOSTICS = {
+    "veg_carbon": 19002,  # gridbox mean vegetation carbon (kg C m-2)
+    "soil_carbon": 19016,  # soil carbon content (kg C m-2)
+    "pft_fractions": 19013,  # fractions of the surface types (one per pseudo level)
+}
+
+# atmosphere pp stream i (UPI, unit 68), to which the STASHC of the vanilla jobs sends
+# the section 19 diagnostics
+DEFAULT_STREAM = "api"
+
+STORE_VERSION = 1
+
+# header words of a pp field (0-based), see UM documentation paper F3
+_LBROW, _LBNPT, _LBPACK = 17, 18, 20
+_LBLEV, _LBUSER4, _LBUSER5 = 32, 41, 42
+_BZY, _BDY, _BMDI = 58, 59, 62
+
+PPField = collections.namedtuple(
+    "PPField", ["stash", "level", "pseudo_level", "zy", "dy", "mdi", "data"]
+)
+
+
+def read_pp_fields(filename, stash_codes=None):
+    """
+    Read the fields of a UM pp file (big-endian Fortran sequential records with a
+    64-word header record and a data record per field, 32- or 64-bit words).
+
+    Only the data of the requested fields is read, the data records of all other
+    fields are skipped. Packed fields (WGDOS or CRAY 32-bit packing) are not supported.
+
+    Args:
+        filename (str): Path to the pp file.
+        stash_codes (set, optional): STASH codes (section * 1000 + item) to read.
+            Defaults to all fields.
+
+    Yields:
+        PPField: STASH code, model level, pseudo level, latitude origin and spacing,
+            missing data indicator and the LBROW x LBNPT data of every field.
+    """
+
+    def read_record(f):
+        marker = f.read(4)
+        if not marker:
+            return None
+        if len(marker) < 4:
+            raise ValueError(f"Truncated record marker in {filename}")
+        return int.from_bytes(marker, "big")
+
+    with open(filename, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        while True:
+            length = read_record(f)
+            if length is None:
+                return
+            if length not in (256, 512):
+                raise ValueError(
+                    f"Unexpected header length {length} in {filename}, not a pp file"
+                )
+            word = ">i4" if length == 256 else ">i8"
+            real = ">f4" if length == 256 else ">f8"
+            header = f.read(length)
+            if len(header) < length:
+                raise ValueError(f"Truncated header in {filename}")
+            ints = np.frombuffer(header, dtype=word, count=45)
+            reals = np.frombuffer(header, dtype=real, offset=45 * length // 64)
+            f.seek(4, os.SEEK_CUR)
+
+            data_length = read_record(f)
+            if data_length is None:
+                raise ValueError(f"Missing data record in {filename}")
+            stash = int(ints[_LBUSER4])
+            if stash_codes is not None and stash not in stash_codes:
+                if f.seek(data_length + 4, os.SEEK_CUR) > file_size:
+                    raise ValueError(f"Truncated data of field {stash} in {filename}")
+                continue
+            if ints[_LBPACK] % 10 != 0:
+                raise ValueError(
+                    f"Field {stash} in {filename} is packed (LBPACK={ints[_LBPACK]}), "
+                    "only unpacked pp files are supported"
+                )
+            n_rows, n_points = int(ints[_LBROW]), int(ints[_LBNPT])
+            data = f.read(data_length)
+            if len(data) < data_length or n_rows * n_points * (length // 64) > len(
+                data
+            ):
+                raise ValueError(f"Truncated data of field {stash} in {filename}")
+            f.seek(4, os.SEEK_CUR)
+            yield PPField(
+                stash,
+                int(ints[_LBLEV]),
+                int(ints[_LBUSER5]),
+                float(reals[_BZY - 45]),
+                float(reals[_BDY - 45]),
+                float(reals[_BMDI - 45]),
+                np.frombuffer(data, dtype=real, count=n_rows * n_points).reshape(
+                    n_rows, n_points
+                ),
+            )
+
+
+def global_mean(field):
+    """
+    Area-weighted global mean of a field on a regular latitude-longitude grid.
+
+    Missing points (e.g. ocean points of land diagnostics) are left out, so the mean of
+    a land diagnostic is the mean over the land area.
+
+    Returns:
+        float: The global mean, NaN if all points are missing.
+    """
+    if field.dy == 0:
+        raise ValueError(f"Field {field.stash} is not on a regular latitude grid")
+    n_rows = field.data.shape[0]
+    latitudes = field.zy + field.dy * np.arange(1, n_rows + 1)
+    weights = np.clip(np.cos(np.deg2rad(latitudes)), 0, None)[:, None]
+    valid = (field.data != field.mdi) & np.isfinite(field.data)
+    weights = np.broadcast_to(weights, field.data.shape) * valid
+    total_weight = weights.sum()
+    if total_weight == 0:
+        return float("nan")
+    return float((np.where(valid, field.data, 0) * weights).sum() / total_weight)
+
+
+def harvest_file(filename, diagnostics):
+    """
+    Global means of the diagnostics of a single pp file.
+
+    Args:
+        filename (str): Path to the pp file.
+        diagnostics (dict): Diagnostic names mapped to their STASH code.
+
+    Returns:
+        dict: Diagnostic names mapped to an array with the global mean of every
+            (model level, pseudo level) of the diagnostic, averaged over all fields of
+            that level in the file (e.g. monthly fields). Diagnostics that are not in
+            the file are left out.
+    """
+    names = {code: name for name, code in diagnostics.items()}
+    means = collections.defaultdict(lambda: collections.defaultdict(list))
+    for field in read_pp_fields(filename, set(names)):
+        means[names[field.stash]][(field.level, field.pseudo_level)].append(
+            global_mean(field)
+        )
+    return {
+        name: np.array([np.mean(levels[key]) for key in sorted(levels)])
+        for name, levels in means.items()
+    }
+
+
+def harvest_member(data_dir, expid, diagnostics, stream=DEFAULT_STREAM, skip_years=()):
+    """
+    Global means of the diagnostics of every model year of an ensemble member.
+
+    Args:
+        data_dir (str): Directory with the output of each job (e.g. ~/dump2hold).
+        expid (str): Ensemble ID.
+        diagnostics (dict): Diagnostic names mapped to their STASH code.
+        stream (str, optional): Stream key of the pp files (see
+            `restart_index.stream_key`). Defaults to `DEFAULT_STREAM`.
+        skip_years (set, optional): Model years that have already been harvested.
+
+    Returns:
+        tuple: (dict mapping the newly harvested model years to the diagnostics of
+            `harvest_file`, averaged over all files of the year, and a list of
+            warnings about unreadable files and years without any of the
+            diagnostics). These years are left out, so that they are harvested again
+            on the next run.
+    """
+    files = collections.defaultdict(list)
+    try:
+        with os.scandir(os.path.join(data_dir, expid, "datam")) as entries:
+            for entry in entries:
+                output_file = parse_um_filename(entry.name)
+                if (
+                    output_file is not None
+                    and stream_key(output_file) == stream
+                    and output_file.year not in skip_years
+                ):
+                    files[output_file.year].append(entry.path)
+    except (FileNotFoundError, NotADirectoryError):
+        return {}, []
+
+    years, warnings = {}, []
+    for year in sorted(files):
+        try:
+            file_means = [
+                harvest_file(path, diagnostics) for path in sorted(files[year])
+            ]
+        except (OSError, ValueError) as e:
+            warnings.append(f"{expid}: Skipping year {year}: {e}")
+            continue
+        values = {}
+        for name in diagnostics:
+            arrays = [means[name] for means in file_means if name in means]
+            if arrays and all(len(a) == len(arrays[0]) for a in arrays):
+                values[name] = np.mean(arrays, axis=0)
+        if values:
+            years[year] = values
+        else:
+            warnings.append(
+                f"{expid}: Skipping year {year}: none of the STASH codes "
+                f"{sorted(diagnostics.values())} in the stream {stream} files"
+            )
+    return years, warnings
+
+
+class HarvestStore:
+    """
+    Compact store of the harvested global diagnostics of all ensemble members.
+
+    The store is a single NumPy `.npz` file with one row per member and model year:
+    "ensemble_id" and "year" are the keys of the rows and every diagnostic is a
+    (rows x levels) column. The parameters of the members are joined in as
+    "param_<KEY>" (members x PFTs) columns with the member IDs in "member_id", so the
+    store is all that is needed to train an emulator on the ensemble.
+
+    Args:
+        store_file (str): Path to the `.npz` file, loaded if it exists.
+        diagnostics (dict): Diagnostic names mapped to their STASH code, must be the
+            same as when the store was created.
+
+    Raises:
+        ValueError: If the existing store has another version or other diagnostics.
+
+    Example:
+        store = np.load("./logs/xqau_harvest.npz")
+        store["veg_carbon"][store["ensemble_id"] == "xqaua"]
+    """
+
+    def __init__(self, store_file, diagnostics=DEFAULT_DIAGNOSTICS):
+        self.store_file = store_file
+        self.diagnostics = dict(diagnostics)
+        # ensemble ID -> model year -> diagnostic name -> values of every level
+        self.members = collections.defaultdict(dict)
+        self.parameters = {}
+        if not os.path.isfile(store_file):
+            return
+        with np.load(store_file) as store:
+            if int(store["version"]) != STORE_VERSION:
+                raise ValueError(
+                    f"{store_file} has the store version {int(store['version'])}, "
+                    f"this harvester writes version {STORE_VERSION}; use a new store"
+                )
+            stored_diagnostics = json.loads(str(store["diagnostics"]))
+            if stored_diagnostics != self.diagnostics:
+                raise ValueError(
+                    f"{store_file} holds the diagnostics {stored_diagnostics}, "
+                    "use a new store for other diagnostics"
+                )
+            columns = {name: store[name] for name in self.diagnostics}
+            for i, (expid, year) in enumerate(zip(store["ensemble_id"], store["year"])):
+                self.members[str(expid)][int(year)] = {
+                    name: values[i] for name, values in columns.items()
+                }
+            member_ids = [str(expid) for expid in store["member_id"]]
+            for name in store.files:
+                if not name.startswith("param_"):
+                    continue
+                for expid, values in zip(member_ids, store[name].tolist()):
+                    self.parameters.setdefault(expid, {})[name[6:]] = values
+
+    def __len__(self):
+        """Number of member years in the store."""
+        return sum(len(years) for years in self.members.values())
+
+    def years(self, expid):
+        """Model years of a member that are in the store."""
+        return set(self.members.get(expid, ()))
+
+    def add(self, expid, year, values):
+        """Add (or replace) the diagnostics of a member and model year."""
+        self.members[expid][year] = values
+
+    def join_parameters(self, param_files):
+        """
+        Join the parameters of the members from logs of generated parameters (see
+        `create_ensemble_jobs.py`), later files override earlier ones.
+        """
+        for param_file in param_files:
+            for record in iter_records(param_file):
+                expid = record.get("ensemble_id")
+                if expid is not None:
+                    self.parameters[expid] = {
+                        key: value
+                        for key, value in record.items()
+                        if key != "ensemble_id"
+                    }
+
+    def save(self):
+        """Write the store atomically to `store_file`."""
+        members = sorted(expid for expid, years in self.members.items() if years)
+        keys = [
+            (expid, year) for expid in members for year in sorted(self.members[expid])
+        ]
+        arrays = {
+            "version": np.array(STORE_VERSION),
+            "diagnostics": np.array(json.dumps(self.diagnostics)),
+            "ensemble_id": np.array([expid for expid, _ in keys], dtype=str),
+            "year": np.array([year for _, year in keys], dtype=np.int32),
+            "member_id": np.array(members, dtype=str),
+        }
+        for name in self.diagnostics:
+            values = [
+                self.members[expid][year].get(name, np.array([]))
+                for expid, year in keys
+            ]
+            # members or years with fewer levels are padded with NaN
+            width = max((len(v) for v in values), default=0)
+            column = np.full((len(keys), width), np.nan)
+            for i, v in enumerate(values):
+                column[i, : len(v)] = v
+            arrays[name] = column
+
+        param_keys = dict.fromkeys(
+            key for expid in members for key in self.parameters.get(expid, {})
+        )
+        for key in param_keys:
+            values = [
+                np.atleast_1d(self.parameters.get(expid, {}).get(key, []))
+                for expid in members
+            ]
+            width = max(len(v) for v in values)
+            column = np.full((len(members), width), np.nan)
+            for i, v in enumerate(values):
+                column[i, : len(v)] = v
+            arrays[f"param_{key}"] = column
+
+        tmp_file = f"{self.store_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_file, self.store_file)
+
+
+def harvest_ensemble(
+    ids, data_dir, store, stream=DEFAULT_STREAM, workers=8, progress=None
+):
+    """
+    Harvest the new model years of all ensemble members into the store, in parallel
+    across members.
+
+    Args:
+        ids (list): Ensemble IDs.
+        data_dir (str): Directory with the output of each job (e.g. ~/dump2hold).
+        store (HarvestStore): Store with the already harvested years, updated in place
+            (but not saved).
+        stream (str, optional): Stream key of the pp files. Defaults to
+            `DEFAULT_STREAM`.
+        workers (int, optional): Number of worker processes. Defaults to 8.
+        progress (callable, optional): Called with the ensemble ID and the number of
+            new years after every member.
+
+    Returns:
+        tuple: (number of new member years, list of warnings)
+    """
+    new_years, warnings = 0, []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                harvest_member,
+                data_dir,
+                expid,
+                store.diagnostics,
+                stream,
+                store.years(expid),
+            ): expid
+            for expid in ids
+        }
+        for future in concurrent.futures.as_completed(futures):
+            expid = futures[future]
+            years, member_warnings = future.result()
+            for year, values in years.items():
+                store.add(expid, year, values)
+            new_years += len(years)
+            warnings.extend(member_warnings)
+            if progress is not None:
+                progress(expid, len(years))
+    return new_years, sorted(warnings)
+
+
+def parse_diagnostic(text):
+    """Parse a NAME=STASH diagnostic of the command line, e.g. "veg_carbon=19002"."""
+    name, _, code = text.partition("=")
+    if not name or not code.isdigit():
+        raise argparse.ArgumentTypeError(
+            f"Invalid diagnostic '{text}', expected NAME=STASH (e.g. veg_carbon=19002)"
+        )
+    return name, int(code)
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the harvester, also used by `python -m ensemble harvest`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Harvest global diagnostics of all ensemble members into a compact "
+        "store.",
+    )
+    parser.add_argument(
+        "--ids_file",
+        type=str,
+        required=True,
+        help="Log file of generated IDs or manifest (.jsonl) of create_ensemble_jobs.py",
+    )
+    parser.add_argument(
+        "--params_logs",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Logs of generated parameters (with ensemble IDs) to join to the store",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.path.expanduser("~/dump2hold"),
+        help="Directory with the model output of each job (default: ~/dump2hold)",
+    )
+    parser.add_argument(
+        "--store_file",
+        type=str,
+        default=None,
+        help="Store of the diagnostics (default: <ids_file without extension>_harvest.npz)",
+    )
+    parser.add_argument(
+        "--stream",
+        type=str,
+        default=DEFAULT_STREAM,
+        help=f"Stream of the pp files, e.g. apa for atmosphere pp stream a (default: {DEFAULT_STREAM})",
+    )
+    parser.add_argument(
+        "--diagnostics",
+        type=parse_diagnostic,
+        nargs="+",
+        default=None,
+        metavar="NAME=STASH",
+        help="Diagnostics to harvest (default: "
+        + " ".join(f"{name}={code}" for name, code in DEFAULT_DIAGNOSTICS.items())
+        + ")",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of processes to read the output in parallel (default: 8)",
+    )
+    args = parser.parse_args(argv)
+
+    store_file = args.store_file or f"{os.path.splitext(args.ids_file)[0]}_harvest.npz"
+    diagnostics = dict(args.diagnostics) if args.diagnostics else DEFAULT_DIAGNOSTICS
+    try:
+        store = HarvestStore(store_file, diagnostics)
+    except ValueError as e:
+        parser.error(str(e))
+    ids = read_ensemble_ids(args.ids_file)
+    new_years, warnings = harvest_ensemble(
+        ids, os.path.expanduser(args.data_dir), store, args.stream, args.workers
+    )
+    for warning in warnings:
+        print(f"WARNING: {warning}")
+    store.join_parameters(args.params_logs)
+    store.save()
+    print(
+        f"Harvested {new_years} new model years of {len(ids)} ensemble members, "
+        f"{len(store)} in total. Store saved to {store_file} "
+        f"({os.path.getsize(store_file) / 1e3:.1f} kB)"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,10 +1,58 @@
 import os
 import shutil
-import subprocess
-import os
-import json
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
+import functools
+import itertools
+
+from job_template import JobTemplate
+from param_io import write_param_table
+
+# Case of the four characters of the experiment name and of the member letter for every
+# block of 26 ensemble IDs: "l" lower case, "u" upper case and "-" unchanged. These are
+# the original blocks of the indices 0-259, which must not change so that existing
+# ensembles keep their IDs.
+_LEGACY_CASE_BLOCKS = [
+    "----l",
+    "ullll",
+    "lu--l",
+    "llu-l",
+    "lllul",
+    "llllu",
+    "uu--l",
+    "ulu-l",
+    "ullul",
+    "ulllu",
+]
+# all combinations of upper and lower case, fewest upper case characters first
+_ALL_CASES = sorted(
+    ("".join(cases) for cases in itertools.product("lu", repeat=5)),
+    key=lambda cases: (cases.count("u"), cases),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _case_blocks(experiment_name):
+    # case of every character of the job IDs in each block of 26 IDs of an ensemble:
+    # the original blocks followed by all combinations they do not produce for this
+    # experiment name
+    name_cases = "".join("u" if c.isupper() else "l" for c in experiment_name)
+    blocks = [
+        "".join(n if c == "-" else c for c, n in zip(cases, name_cases + "l"))
+        for cases in _LEGACY_CASE_BLOCKS
+    ]
+    blocks.extend(cases for cases in _ALL_CASES if cases not in blocks)
+    # case of the job ID -> first block that generates it
+    lookup = {}
+    for block, cases in enumerate(blocks):
+        lookup.setdefault(cases, block)
+    return blocks, lookup
+
+
+def max_ensemble_size(experiment_name):
+    """
+    Number of job IDs that `generate_ensemble_jobid` can generate for an experiment
+    name, 832 for lower case names.
+    """
+    return 26 * len(_case_blocks(experiment_name)[0])
 
 
 def generate_ensemble_jobid(experiment_name, index):
@@ -14,79 +62,59 @@ def generate_ensemble_jobid(experiment_name, index):
 
     Parameters:
         experiment_name (str): The name of the ensemble experiment. Must be exactly 4 characters long.
-        index (int): The index of the ensemble experiment. Must be between 0 and 259 inclusive.
+        index (int): The index of the ensemble experiment. Must be between 0 and
+            `max_ensemble_size(experiment_name)` - 1 inclusive (831 for lower case
+            names). The IDs of the indices 0-259 are the same as in previous versions.
 
     Returns:
         str: The generated job ID.
 
     History:
         2024-07-16: Created by Sebastian Steinig
+        2026-10-18: Look up the case variations in a table, extended beyond 260 IDs
     """
     if len(experiment_name) != 4:
         raise ValueError("Ensemble experiment name must be exactly 4 characters long.")
 
-    if not (0 <= index < 260):
-        raise ValueError("Index must be between 0 and 259 inclusive.")
-
-    # Determine the modified character
-    if 0 <= index < 26:
-        modified_char = chr(ord("a") + index)
-    elif 26 <= index < 52:
-        modified_char = chr(ord("a") + (index - 26))
-        experiment_name = experiment_name.capitalize()
-    elif 52 <= index < 78:
-        modified_char = chr(ord("a") + (index - 52))
-        experiment_name = (
-            experiment_name[0].lower()
-            + experiment_name[1].upper()
-            + experiment_name[2:]
-        )
-    elif 78 <= index < 104:
-        modified_char = chr(ord("a") + (index - 78))
-        experiment_name = (
-            experiment_name[:2].lower()
-            + experiment_name[2].upper()
-            + experiment_name[3:]
-        )
-    elif 104 <= index < 130:
-        modified_char = chr(ord("a") + (index - 104))
-        experiment_name = experiment_name[:3].lower() + experiment_name[3].upper()
-    elif 130 <= index < 156:
-        modified_char = chr(ord("a") + (index - 130)).upper()
-        experiment_name = experiment_name.lower()  # All lower, since next is upper
-    elif 156 <= index < 182:
-        modified_char = chr(ord("a") + (index - 156))
-        experiment_name = (
-            experiment_name[0].upper()
-            + experiment_name[1].upper()
-            + experiment_name[2:]
-        )
-    elif 182 <= index < 208:
-        modified_char = chr(ord("a") + (index - 182))
-        experiment_name = (
-            experiment_name[0].upper()
-            + experiment_name[1].lower()
-            + experiment_name[2].upper()
-            + experiment_name[3]
-        )
-    elif 208 <= index < 234:
-        modified_char = chr(ord("a") + (index - 208))
-        experiment_name = (
-            experiment_name[0].upper()
-            + experiment_name[1].lower()
-            + experiment_name[2].lower()
-            + experiment_name[3].upper()
+    blocks = _case_blocks(experiment_name)[0]
+    if not (0 <= index < 26 * len(blocks)):
+        raise ValueError(
+            f"Index must be between 0 and {26 * len(blocks) - 1} inclusive."
         )
-    elif 234 <= index < 260:
-        modified_char = chr(ord("a") + (index - 234)).upper()
-        experiment_name = experiment_name[0].upper() + experiment_name[1:].lower()
 
-    new_jobid = experiment_name + modified_char
+    block, letter = divmod(index, 26)
+    return "".join(
+        c.upper() if case == "u" else c.lower()
+        for c, case in zip(experiment_name + chr(ord("a") + letter), blocks[block])
+    )
+
 
-    return new_jobid
+def decode_ensemble_jobid(experiment_name, jobid):
+    """
+    Inverse of `generate_ensemble_jobid`: the index of a job ID in its ensemble, e.g. to
+    find the parameter set of a job without the log file of generated IDs.
 
+    Parameters:
+        experiment_name (str): The name of the ensemble experiment (exactly 4 characters,
+            same case as used to generate the IDs).
+        jobid (str): The job ID.
 
-def duplicate_job(old_runid_input, new_RUNID, force_overwrite=True):
+    Returns:
+        int: The index of the job, or None if the ID is not part of the ensemble. For
+            experiment names with upper case characters, some of the original IDs
+            (indices 0-259) are generated twice and the lower index is returned.
+    """
+    if len(jobid) != 5 or jobid[:4].lower() != experiment_name.lower():
+        return None
+    letter = ord(jobid[4].lower()) - ord("a")
+    if not (0 <= letter < 26):
+        return None
+    cases = "".join("u" if c.isupper() else "l" for c in jobid)
+    block = _case_blocks(experiment_name)[1].get(cases)
+    return None if block is None else block * 26 + letter
+
+
+def duplicate_job(old_runid_input, new_RUNID, force_overwrite=True, template=None):
     """
     Duplicate a UMUI job. The input can have an arbitrary path, the new job will always be
     written to the `~/umui_jobs` directory.
@@ -97,6 +125,8 @@ def duplicate_job(old_runid_input, new_RUNID, force_overwrite=True):
         old_runid_input (str): The path or ID of the old job to be duplicated.
         new_RUNID (str): The ID of the new job to be created.
         force_overwrite (bool, optional): Whether to overwrite an existing new job with the same ID. Defaults to True.
+        template (JobTemplate, optional): Compiled template of the old job. Pass this when
+            creating many jobs from the same template so that it is only read once.
 
     Returns:
         bool: True if the job was successfully duplicated, False otherwise.
@@ -130,39 +160,11 @@ def duplicate_job(old_runid_input, new_RUNID, force_overwrite=True):
             print(f"Error: new JOBID already exists: {new_RUNID}")
             return False
 
-    shutil.copytree(old_runid_input, new_job_path)
-    os.chdir(new_job_path)
-
-    # Extract substrings
-    old_EXPTID, old_JOBID = old_RUNID[:4], old_RUNID[4:]
-    new_EXPTID, new_JOBID = new_RUNID[:4], new_RUNID[4:]
-
-    # Process files
-    files_to_process = ["CNTLALL", "CNTLATM", "CONTCNTL", "INITHIS", "SCRIPT", "SUBMIT"]
-    for file in files_to_process:
-        file_path = os.path.join(new_job_path, file)
-        backup_file_path = f"{file_path}.ORIGINAL"
-
-        if os.path.exists(file_path):
-            # Make a backup of the original file
-            shutil.copyfile(file_path, backup_file_path)
-
-            # Replace references to old jobs with new one
-            subprocess.run(
-                [
-                    "sed",
-                    "-i",
-                    f"-e s/JOBID={old_JOBID}/JOBID={new_JOBID}/g",
-                    f"-e s/RUNID={old_RUNID}/RUNID={new_RUNID}/g",
-                    f"-e s/CJOBN={old_RUNID}/CJOBN={new_RUNID}/g",
-                    f"-e s/JOB_ID='{old_JOBID}'/JOB_ID='{new_JOBID}'/g",
-                    f"-e s/EXPT_ID='{old_EXPTID}'/EXPT_ID='{new_EXPTID}'/g",
-                    f"-e s/EXPTID={old_EXPTID}/EXPTID={new_EXPTID}/g",
-                    f"-e s/RUN_JOB_NAME='{old_RUNID}/RUN_JOB_NAME='{new_RUNID}/g",
-                    f"-e s/Run {old_EXPTID}#{old_JOBID}/Run {new_EXPTID}#{new_JOBID}/g",
-                    file_path,
-                ]
-            )
+    if template is None:
+        template = JobTemplate(old_runid_input)
+
+    # Write the new job with all references to the old job replaced
+    template.materialise(new_job_path, new_RUNID)
 
     print(f"Duplicated job {old_RUNID} to {new_RUNID}")
     return True
@@ -172,12 +174,16 @@ import logging
 from datetime import datetime
 
 
-def setup_logging(ensemble_exp, log_dir):
+def setup_logging(ensemble_exp, log_dir, keep_previous=False, level=logging.INFO):
     """
     Sets up logging to both console and file.
 
     Args:
         ensemble_exp (str): The ensemble experiment name to include in the log file name.
+        keep_previous (bool, optional): Keep the generated IDs and parameter logs of a
+            previous run (used when resuming a run). Defaults to False.
+        level (int, optional): Lowest level that is logged, e.g. `logging.DEBUG` to
+            also log every parameter set in every member. Defaults to `logging.INFO`.
 
     Returns:
         logging.Logger: Configured logger instance.
@@ -197,15 +203,15 @@ def setup_logging(ensemble_exp, log_dir):
 
     # Create a logger
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    logger.setLevel(level)
 
     # Create a file handler for logging to a file
     file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(level)
 
     # Create a console handler for logging to the terminal
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(level)
 
     # Create a formatter and set it for both handlers
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
@@ -222,109 +228,35 @@ def setup_logging(ensemble_exp, log_dir):
     generated_params_log_file = os.path.join(
         log_dir, f"{ensemble_exp}_updated_parameters_{current_date}.json"
     )
-    if os.path.exists(generated_ids_log_file):
-        os.remove(generated_ids_log_file)
-    if os.path.exists(generated_params_log_file):
-        os.remove(generated_params_log_file)
+    if not keep_previous:
+        if os.path.exists(generated_ids_log_file):
+            os.remove(generated_ids_log_file)
+        if os.path.exists(generated_params_log_file):
+            os.remove(generated_params_log_file)
 
     return logger, generated_ids_log_file, generated_params_log_file
 
 
-# save the parameters to a JSON file with custom formatting
-# which will look like the following:
-# {
-#   "F0": [0.901, 0.859, 0.896, 0.733, 0.86],
-#   "LAI_MIN": [4.0, 4.0, 1.0, 1.0, 1.0],
-#   "NL0": [0.05, 0.03, 0.06, 0.03, 0.03],
-#   "R_GROW": [0.25, 0.25, 0.25, 0.25, 0.25],
-#   "TLOW": [0.0, -5.0, 0.0, 13.0, 0.0],
-#   "TUPP": [36.0, 31.0, 36.0, 45.0, 36.0],
-#   "V_CRIT_ALPHA": [0.343]
-# },
-def _format_json_string(item):
-    formatted_str = "{\n"
-    formatted_str += ",\n".join(
-        f'  "{key}": {json.dumps(value)}' for key, value in item.items()
-    )
-    formatted_str += "\n}"
-    return formatted_str
-
-
 def create_json_file(filename, data, default_params):
-    with open(filename, "w") as file:
-        file.write("[\n")
-        # write default parameters as first set
-        formatted_str = _format_json_string(default_params)
-        formatted_str += ","
-        indented_str = "    " + formatted_str.replace("\n", "\n    ")
-        file.write(indented_str)
-        file.write("\n")
-        # write all perturbed parameter sets
-        for i, item in enumerate(data):
-            formatted_str = _format_json_string(item)
-            if i < len(data) - 1:
-                formatted_str += ","
-            indented_str = "    " + formatted_str.replace("\n", "\n    ")
-            file.write(indented_str)
-            if i < len(data) - 1:
-                file.write("\n")
-        file.write("\n]")
+    """
+    Save the parameter sets to a parameter table with the default parameters as the
+    first set. `data` can be any iterable of parameter sets, which are written one at
+    a time. The format is chosen by the file extension (see `write_param_table`), the
+    default is the compact JSON format with one line per parameter.
+    """
+    write_param_table(filename, data, default_params)
 
 
 def plot_param_distributions(
     perturbed_sets, perturbed_BL_params, pdf_file, ensemble_name
 ):
-    labels = ["BL", "NL", "C3 grass", "C4 grass", "Shrub"]
-
-    # create a single PDF file to save the individual pages
-    with PdfPages(pdf_file) as pdf:
-        # loop over the PFTs
-        for idx in range(5):
-            print(f"Plotting paramater distributions for {labels[idx]}")
-            # fig, axs = plt.subplots(3, 2, figsize=(12, 12))
-            fig, axs = plt.subplots(
-                len(list(perturbed_BL_params.keys())) // 2, 2, figsize=(12, 12)
-            )
-            fig.suptitle(
-                f"Distributions of perturbed parameters for {labels[idx]} ({ensemble_name})"
-            )
-
-            param_keys = list(perturbed_BL_params.keys())
-
-            for i, key in enumerate(param_keys):
-                values = []
-                for params in perturbed_sets:
-                    if (
-                        key in ["V_CRIT_ALPHA", "Q10", "KAPS"]
-                        and isinstance(params[key], list)
-                        and len(params[key]) == 1
-                    ):
-                        values.append(params[key][0])
-                    elif (
-                        key in params
-                        and isinstance(params[key], list)
-                        and len(params[key]) > idx
-                    ):
-                        values.append(params[key][idx])
-                    else:
-                        print(
-                            f"Warning: Skipping invalid entry for key '{key}' at index {idx}."
-                        )
-                        continue
-
-                row = i // 2
-                col = i % 2
-                axs[row, col].hist(values, bins=30, color="skyblue", edgecolor="black")
-                axs[row, col].set_title(f"{key} Distribution")
-                axs[row, col].set_xlabel(f"{key}")
-                axs[row, col].set_ylabel("Frequency")
-
-            plt.tight_layout(rect=[0, 0, 1, 0.96])
-
-            # Save the current figure to the PDF as a new page
-            pdf.savefig(fig)
-
-            # Close the current figure to release memory
-            plt.close(fig)
-
-    print(f"All plots saved to '{pdf_file}'")
+    """
+    Plot histograms of all perturbed parameters to a PDF file, one page per PFT.
+    See `plotting.plot_param_distributions`.
+    """
+    # Matplotlib is slow to import, only load it when actually plotting
+    import plotting
+
+    plotting.plot_param_distributions(
+        perturbed_sets, perturbed_BL_params, pdf_file, ensemble_name
+    )
@@ -0,0 +1,235 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+from adaptive_design import bl_values, read_scores, training_data
+from emulator import GaussianProcess
+from param_io import iter_records, write_param_table
+
+# members with an implausibility above this threshold for any metric are rejected
+# (three sigma rule, Pukelsheim 1994)
+DEFAULT_THRESHOLD = 3.0
+
+
+def read_targets(targets_file):
+    """
+    Read the observed targets of the history matching.
+
+    Args:
+        targets_file (str): JSON file mapping every metric to its "observed" value, the
+            "variance" of the observation error and optionally the "discrepancy"
+            variance of the model structural error, e.g.
+            `{"global_veg_carbon": {"observed": 450, "variance": 2500}}`.
+
+    Returns:
+        dict: Metric names mapped to (observed value, total variance).
+    """
+    with open(targets_file, "r") as f:
+        config = json.load(f)
+    targets = {}
+    for metric, target in config.items():
+        try:
+            variance = float(target["variance"]) + float(target.get("discrepancy", 0))
+            targets[metric] = (float(target["observed"]), variance)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(
+                f'Target {metric} needs a numeric "observed" value and "variance"'
+            )
+    return targets
+
+
+def implausibility(mean, emulator_variance, observed, variance):
+    """
+    Implausibility of candidate parameter sets for a single metric.
+
+    Args:
+        mean (numpy.ndarray): Emulator prediction of every candidate.
+        emulator_variance (numpy.ndarray): Variance of the emulator prediction.
+        observed (float): Observed value of the metric.
+        variance (float): Variance of the observation and model discrepancy.
+
+    Returns:
+        numpy.ndarray: |observed - mean| / sqrt(total variance) of every candidate.
+    """
+    return np.abs(observed - mean) / np.sqrt(emulator_variance + variance)
+
+
+def predict_chunked(emulator, X, chunk_size=10000):
+    """
+    Emulator prediction for many candidates, in chunks to limit the memory use.
+
+    Returns:
+        tuple: (mean, variance) of the prediction of every candidate.
+    """
+    mean = np.empty(X.shape[0])
+    variance = np.empty(X.shape[0])
+    for start in range(0, X.shape[0], chunk_size):
+        chunk_mean, chunk_std = emulator.predict(X[start : start + chunk_size])
+        mean[start : start + chunk_size] = chunk_mean
+        variance[start : start + chunk_size] = chunk_std**2
+    return mean, variance
+
+
+def screen(
+    default_params,
+    new_params,
+    param_files,
+    score_file,
+    targets,
+    candidates,
+    threshold=DEFAULT_THRESHOLD,
+    seed=0,
+):
+    """
+    Reject candidate parameter sets that are implausible given the results of earlier
+    ensemble waves.
+
+    An emulator is trained for every target metric on the scores of the earlier
+    members. The implausibility of a candidate is the largest implausibility over all
+    metrics.
+
+    Args:
+        default_params (dict): Default parameter values for each PFT.
+        new_params (dict): Perturbed parameters with their [min, max] BL values.
+        param_files (list): Logs of generated parameters of the earlier waves.
+        score_file (str): CSV table with the metrics of the earlier members.
+        targets (dict): Metric names mapped to (observed value, total variance), see
+            `read_targets`.
+        candidates (list): Candidate parameter sets.
+        threshold (float, optional): Implausibility threshold. Defaults to 3.
+        seed (int, optional): Seed of the emulator fit. Defaults to 0.
+
+    Returns:
+        tuple: (boolean array of the non-implausible candidates, report dict with the
+            rejected fraction overall and per metric)
+    """
+    varied = [key for key in new_params if new_params[key][0] != new_params[key][1]]
+    varied_params = {key: new_params[key] for key in varied}
+    bounds = np.array([new_params[key][:2] for key in varied], dtype=float)
+    X = np.array(
+        [bl_values(record, default_params, varied) for record in candidates],
+        dtype=float,
+    ).reshape(len(candidates), len(varied))
+    X = (X - bounds[:, 0]) / (bounds[:, 1] - bounds[:, 0])
+
+    max_implausibility = np.zeros(len(candidates))
+    report = {"candidates": len(candidates), "threshold": threshold, "metrics": {}}
+    for metric, (observed, variance) in targets.items():
+        ids, X_train, y_train = training_data(
+            param_files, read_scores(score_file, metric), default_params, varied_params
+        )
+        emulator = GaussianProcess(seed=seed).fit(X_train, y_train)
+        mean, emulator_variance = predict_chunked(emulator, X)
+        metric_implausibility = implausibility(
+            mean, emulator_variance, observed, variance
+        )
+        max_implausibility = np.maximum(max_implausibility, metric_implausibility)
+        report["metrics"][metric] = {
+            "training_members": len(ids),
+            "rejected_fraction": float((metric_implausibility > threshold).mean()),
+        }
+
+    keep = max_implausibility <= threshold
+    report["kept"] = int(keep.sum())
+    report["rejected_fraction"] = float(1.0 - keep.mean()) if len(keep) else 0.0
+    return keep, report
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the history matching, also used by
+    `python -m ensemble screen`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Remove implausible parameter sets from a parameter table before "
+        "generating the ensemble jobs.",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=True,
+        help='JSON file with the "default_params" and the min/max "perturbed_BL_params"',
+    )
+    parser.add_argument(
+        "--parameter_file",
+        type=str,
+        required=True,
+        help="Parameter table with the candidate parameter sets",
+    )
+    parser.add_argument(
+        "--params_logs",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Logs of generated parameters of the earlier waves (with ensemble IDs)",
+    )
+    parser.add_argument(
+        "--scores",
+        type=str,
+        required=True,
+        help="CSV table with an ensemble_id column and the metrics of every member",
+    )
+    parser.add_argument(
+        "--targets",
+        type=str,
+        required=True,
+        help="JSON file with the observed value and variance of every metric",
+    )
+    parser.add_argument(
+        "--output_file",
+        type=str,
+        required=True,
+        help="Parameter table of the non-implausible sets (.json, .jsonl or .ptab)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Implausibility threshold (default: {DEFAULT_THRESHOLD})",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    # the first set of a parameter table is the default set, which is always kept
+    records = iter_records(args.parameter_file)
+    default_set = next(records)
+    candidates = list(records)
+    try:
+        keep, report = screen(
+            config["default_params"],
+            config["perturbed_BL_params"],
+            args.params_logs,
+            args.scores,
+            read_targets(args.targets),
+            candidates,
+            args.threshold,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    write_param_table(
+        args.output_file,
+        (record for record, kept in zip(candidates, keep) if kept),
+        default_set,
+    )
+
+    report_file = f"{os.path.splitext(args.output_file)[0]}_screening.json"
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=4)
+    for metric, metric_report in report["metrics"].items():
+        print(
+            f"{metric}: {metric_report['rejected_fraction']:.1%} implausible "
+            f"(emulator trained on {metric_report['training_members']} members)"
+        )
+    print(
+        f"Kept {report['kept']} of {report['candidates']} parameter sets, "
+        f"{report['rejected_fraction']:.1%} rejected. Saved to '{args.output_file}', "
+        f"report saved to '{report_file}'"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,197 @@
+import os
+import shutil
+import hashlib
+
+# files in which references to the old job ID are replaced (see `new_expt_letter`)
+SUBSTITUTED_FILES = ["CNTLALL", "CNTLATM", "CONTCNTL", "INITHIS", "SCRIPT", "SUBMIT"]
+
+# FICLONE ioctl request number to create a copy-on-write clone of a file on Linux
+_FICLONE = 0x40049409
+
+
+def id_substitutions(old_RUNID, new_RUNID):
+    """
+    List of (old, new) string replacements to turn references to `old_RUNID` into
+    references to `new_RUNID`, in the order they were applied by `new_expt_letter`.
+    """
+    old_EXPTID, old_JOBID = old_RUNID[:4], old_RUNID[4:]
+    new_EXPTID, new_JOBID = new_RUNID[:4], new_RUNID[4:]
+    return [
+        (f"JOBID={old_JOBID}", f"JOBID={new_JOBID}"),
+        (f"RUNID={old_RUNID}", f"RUNID={new_RUNID}"),
+        (f"CJOBN={old_RUNID}", f"CJOBN={new_RUNID}"),
+        (f"JOB_ID='{old_JOBID}'", f"JOB_ID='{new_JOBID}'"),
+        (f"EXPT_ID='{old_EXPTID}'", f"EXPT_ID='{new_EXPTID}'"),
+        (f"EXPTID={old_EXPTID}", f"EXPTID={new_EXPTID}"),
+        (f"RUN_JOB_NAME='{old_RUNID}", f"RUN_JOB_NAME='{new_RUNID}"),
+        (f"Run {old_EXPTID}#{old_JOBID}", f"Run {new_EXPTID}#{new_JOBID}"),
+    ]
+
+
+def _tokenise(content, substitutions):
+    """
+    Split `content` into literal chunks and placeholder indices.
+
+    The substitutions are applied in order (like consecutive `sed -e` expressions) but
+    each match is replaced by a NUL-delimited placeholder, so the result can later be
+    rendered for any new job ID by simply joining the chunks.
+    """
+    if b"\0" in content:
+        # cannot use NUL-delimited placeholders, render by plain replacement instead
+        return None
+    for idx, (old, _) in enumerate(substitutions):
+        content = content.replace(old.encode(), b"\0%d\0" % idx)
+    tokens = content.split(b"\0")
+    # even positions are literal chunks, odd positions are placeholder indices
+    return [token if i % 2 == 0 else int(token) for i, token in enumerate(tokens)]
+
+
+class JobTemplate:
+    """
+    Compiled UMUI job template.
+
+    The vanilla job directory is read and tokenised once. New jobs are then created by
+    writing pre-rendered buffers for the files that reference the job ID and by
+    hardlinking (or reflinking/copying) all files that never change.
+
+    Args:
+        template_dir (str): Path to the vanilla job, the directory name is the RUNID.
+        link_mode (str, optional): How unchanged files are materialised, one of
+            "hardlink", "reflink" or "copy". Falls back to copying if the file system
+            does not support the requested mode. Defaults to "hardlink".
+
+    Note:
+        Hardlinked files share their inode with the vanilla job, so they must never be
+        edited in place. The generator only ever rewrites the substituted files, which
+        are always written as new files.
+    """
+
+    def __init__(self, template_dir, link_mode="hardlink"):
+        if link_mode not in ("hardlink", "reflink", "copy"):
+            raise ValueError(f"Unknown link mode: {link_mode}")
+        if not os.path.isdir(template_dir):
+            raise FileNotFoundError(f"Template job not found: {template_dir}")
+        self.template_dir = os.path.abspath(template_dir)
+        self.RUNID = os.path.basename(self.template_dir.rstrip("/"))
+        self.link_mode = link_mode
+        self._substitutions = id_substitutions(self.RUNID, self.RUNID)
+
+        # relative directories, (relative path, tokens, raw content) of substituted
+        # files and relative paths of all files that are linked unchanged
+        self.directories = []
+        self.rendered_files = []
+        self.linked_files = []
+        for root, dirs, files in os.walk(self.template_dir):
+            dirs.sort()
+            rel_root = os.path.relpath(root, self.template_dir)
+            if rel_root != ".":
+                self.directories.append(rel_root)
+            for name in sorted(files):
+                rel_path = os.path.normpath(os.path.join(rel_root, name))
+                if rel_root == "." and name in SUBSTITUTED_FILES:
+                    with open(os.path.join(root, name), "rb") as file:
+                        content = file.read()
+                    tokens = _tokenise(content, self._substitutions)
+                    self.rendered_files.append((rel_path, tokens, content))
+                elif not (
+                    rel_root == "."
+                    and name.endswith(".ORIGINAL")
+                    and name[: -len(".ORIGINAL")] in SUBSTITUTED_FILES
+                ):
+                    # old backups are replaced by the new ones in `materialise`
+                    self.linked_files.append(rel_path)
+
+    def digest(self):
+        """
+        Content hash of the vanilla job (file names and content of all files).
+
+        Returns:
+            str: Hex digest, computed once and cached.
+        """
+        if getattr(self, "_digest", None) is None:
+            sha = hashlib.sha256(self.RUNID.encode())
+            contents = {
+                rel_path: content for rel_path, _, content in self.rendered_files
+            }
+            for rel_path in sorted(
+                self.directories + list(contents) + self.linked_files
+            ):
+                sha.update(b"\0" + rel_path.encode() + b"\0")
+                if rel_path in contents:
+                    sha.update(contents[rel_path])
+                elif rel_path not in self.directories:
+                    with open(os.path.join(self.template_dir, rel_path), "rb") as f:
+                        sha.update(f.read())
+            self._digest = sha.hexdigest()
+        return self._digest
+
+    def render(self, new_RUNID):
+        """
+        Render the content of all substituted files for a new job ID.
+
+        Returns:
+            dict: Mapping of relative file paths to their rendered content (bytes).
+        """
+        new_values = [
+            new.encode() for _, new in id_substitutions(self.RUNID, new_RUNID)
+        ]
+        rendered = {}
+        for rel_path, tokens, content in self.rendered_files:
+            if tokens is None:
+                for old, new in id_substitutions(self.RUNID, new_RUNID):
+                    content = content.replace(old.encode(), new.encode())
+                rendered[rel_path] = content
+            else:
+                rendered[rel_path] = b"".join(
+                    token if i % 2 == 0 else new_values[token]
+                    for i, token in enumerate(tokens)
+                )
+        return rendered
+
+    def _link(self, src, dst):
+        if self.link_mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                # e.g. different file systems, don't try again for the next files
+                self.link_mode = "copy"
+        elif self.link_mode == "reflink":
+            try:
+                import fcntl
+
+                with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                    fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                shutil.copystat(src, dst)
+                return
+            except (ImportError, OSError):
+                self.link_mode = "copy"
+        shutil.copy2(src, dst)
+
+    def materialise(self, job_path, new_RUNID=None):
+        """
+        Create a new job directory from the template.
+
+        Args:
+            job_path (str): Directory of the new job, must not exist yet.
+            new_RUNID (str, optional): ID of the new job. Defaults to the directory name.
+        """
+        new_RUNID = new_RUNID or os.path.basename(job_path.rstrip("/"))
+        os.makedirs(job_path)
+        for rel_dir in self.directories:
+            os.makedirs(os.path.join(job_path, rel_dir), exist_ok=True)
+
+        for rel_path in self.linked_files:
+            self._link(
+                os.path.join(self.template_dir, rel_path),
+                os.path.join(job_path, rel_path),
+            )
+
+        for rel_path, content in self.render(new_RUNID).items():
+            src_path = os.path.join(self.template_dir, rel_path)
+            file_path = os.path.join(job_path, rel_path)
+            # keep the unmodified file as a backup like `new_expt_letter` does
+            self._link(src_path, f"{file_path}.ORIGINAL")
+            with open(file_path, "wb") as file:
+                file.write(content)
+            shutil.copymode(src_path, file_path)
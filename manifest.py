@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+
+# bump this whenever a change to the generator changes the content of generated jobs,
+# so that incremental runs rebuild all existing ensemble members
+GENERATOR_VERSION = "1"
+
+
+def member_hash(template_digest, expid, record):
+    """
+    Content hash of a single ensemble member.
+
+    The hash covers everything that determines the content of the generated job: the
+    vanilla job, the ensemble ID, the parameter record and the generator version.
+
+    Args:
+        template_digest (str): Digest of the compiled vanilla job (see `JobTemplate.digest`).
+        expid (str): ID of the ensemble member.
+        record (dict): Parameter record of the ensemble member.
+
+    Returns:
+        str: Hex digest of the member inputs.
+    """
+    inputs = {
+        "generator_version": GENERATOR_VERSION,
+        "template": template_digest,
+        "ensemble_id": expid,
+        "record": record,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest(manifest_file):
+    """
+    Load the per-member hashes of a previous (possibly interrupted) run.
+
+    The manifest is a JSON lines file with one `{"ensemble_id": ..., "hash": ...}`
+    entry per line, later entries override earlier ones. A `null` hash marks a member
+    that was started but never finished.
+
+    Returns:
+        dict: Mapping of ensemble IDs to the hash of their generated job.
+    """
+    manifest = {}
+    if not os.path.isfile(manifest_file):
+        return manifest
+    with open(manifest_file, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # last line of an interrupted run might be incomplete
+                continue
+            manifest[entry["ensemble_id"]] = entry["hash"]
+    return manifest
+
+
+class ManifestWriter:
+    """
+    Append-only writer for the manifest of generated ensemble members.
+
+    Every entry is flushed to disk immediately, so an interrupted run can be resumed.
+    `close` compacts the file to a single entry per member.
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.manifest = load_manifest(manifest_file)
+        self._file = open(manifest_file, "a")
+
+    def record(self, expid, digest):
+        """Record the hash of a member (or None for a member that is being rebuilt)."""
+        self.manifest[expid] = digest
+        self._file.write(json.dumps({"ensemble_id": expid, "hash": digest}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, "w") as f:
+            for expid, digest in self.manifest.items():
+                if digest is not None:
+                    f.write(json.dumps({"ensemble_id": expid, "hash": digest}) + "\n")
+        os.replace(tmp_file, self.manifest_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
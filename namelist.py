@@ -0,0 +1,236 @@
+import re
+
+# a namelist group starts with `&NAME` and ends with `&END` (or `/`) on its own line, e.g.
+#  &LAND_CC
+#  ALPHA=0.08,0.08,0.08,0.040,0.08,
+#  ...
+#  &END
+_GROUP_START = re.compile(r"^\s*&(\w+)\s*$")
+_GROUP_END = re.compile(r"^\s*(&END|/)\s*$", re.IGNORECASE)
+# an entry starts with `NAME=` (optionally `NAME(1)=` and spaces around `=`); all following
+# lines without their own `NAME=` are continuation lines of the same (array) value
+_ENTRY_START = re.compile(r"^(\s*)([A-Za-z_]\w*)\s*(\([^)]*\))?\s*=")
+
+
+def format_value(value):
+    """
+    Convert a parameter value to its namelist string representation.
+
+    Lists are written as comma-separated values without the square brackets,
+    all other values are converted with `str`.
+    """
+    if isinstance(value, list):
+        return ",".join(map(str, value))
+    return str(value)
+
+
+def parse_group_lines(lines):
+    """
+    Parse the lines of a single namelist group, e.g. a block of a parameter file.
+
+    Args:
+        lines (list): Lines of the group, starting with `&NAME` and ending with `&END`.
+
+    Returns:
+        tuple: (group name, dict of entry names mapped to their list of value strings).
+            Entries spanning several lines are joined and the trailing comma is removed.
+
+    Raises:
+        ValueError: If the lines do not form a complete group.
+    """
+    if len(lines) < 2 or not _GROUP_START.match(lines[0]):
+        raise ValueError(f"Group does not start with &NAME: {lines[:1]}")
+    if not _GROUP_END.match(lines[-1]):
+        raise ValueError(f"Group does not end with &END: {lines[-1:]}")
+    group = _GROUP_START.match(lines[0]).group(1).upper()
+    entries = {}
+    key = None
+    for line in lines[1:-1]:
+        match = _ENTRY_START.match(line)
+        if match:
+            key = match.group(2).upper()
+            if key in entries:
+                raise ValueError(f"Duplicate entry {key} in &{group}")
+            entries[key] = line[match.end() :]
+        elif line.strip():
+            if key is None:
+                raise ValueError(f"Line without entry name in &{group}: {line!r}")
+            entries[key] += line
+    values = {
+        key: [value.strip() for value in text.split(",") if value.strip()]
+        for key, text in entries.items()
+    }
+    return group, values
+
+
+class Namelist:
+    """
+    In-memory model of a Fortran namelist file (e.g. CNTLATM of a UMUI job).
+
+    The file is parsed once into its groups and entries. Values are updated in memory
+    and the file is written back in a single pass. All lines that are not touched by
+    `set` are written back byte-for-byte.
+
+    Example:
+        nml = Namelist.read("~/umui_jobs/xqapa/CNTLATM")
+        nml.set("ALPHA", [0.1, 0.1, 0.1, 0.07, 0.1], group="LAND_CC")
+        nml.write()
+    """
+
+    def __init__(self, text, path=None):
+        self.path = path
+        self._lines = text.splitlines(keepends=True)
+        self._parse()
+
+    @classmethod
+    def read(cls, path):
+        """Read and parse the namelist file at `path`."""
+        path = str(path)
+        # newline="" keeps the original line endings untouched
+        with open(path, "r", newline="") as file:
+            return cls(file.read(), path=path)
+
+    def _parse(self):
+        # group name -> list of (start line, end line) of every group with that name
+        self._groups = {}
+        # entry name -> list of [group name, first line, last line]
+        self._entries = {}
+        group = None
+        entry = None
+        for i, line in enumerate(self._lines):
+            if group is None:
+                match = _GROUP_START.match(line)
+                if match and not _GROUP_END.match(line):
+                    group = match.group(1).upper()
+                    group_start = i
+                continue
+            if _GROUP_END.match(line):
+                self._groups.setdefault(group, []).append((group_start, i))
+                group = None
+                entry = None
+                continue
+            match = _ENTRY_START.match(line)
+            if match:
+                entry = [group, i, i]
+                self._entries.setdefault(match.group(2).upper(), []).append(entry)
+            elif entry is not None and line.strip():
+                # continuation line of a multi-line (array) value
+                entry[2] = i
+
+    @property
+    def groups(self):
+        """Names of all namelist groups in file order."""
+        return list(self._groups)
+
+    def keys(self, group=None):
+        """Names of all entries, optionally restricted to a single group."""
+        return [
+            key
+            for key, entries in self._entries.items()
+            if group is None or any(e[0] == group.upper() for e in entries)
+        ]
+
+    def __contains__(self, key):
+        return key.upper() in self._entries
+
+    def set(self, key, value, group=None):
+        """
+        Set the value of an existing entry.
+
+        The first line of the entry is rewritten as `KEY=value` (keeping its indentation
+        and line ending) and any continuation lines of the old value are dropped.
+
+        Args:
+            key (str): Name of the namelist entry (case-insensitive).
+            value: New value, either a list or a scalar (see `format_value`).
+            group (str, optional): Only update the entry within this group. Defaults to
+                updating every occurrence of the entry.
+
+        Returns:
+            bool: True if the entry was found and updated, False otherwise.
+        """
+        entries = [
+            e
+            for e in self._entries.get(key.upper(), [])
+            if group is None or e[0] == group.upper()
+        ]
+        if not entries:
+            return False
+
+        value_str = format_value(value)
+        removed_lines = False
+        # apply from the bottom up so that earlier line numbers stay valid
+        for entry in sorted(entries, key=lambda e: e[1], reverse=True):
+            _, first, last = entry
+            line = self._lines[first]
+            match = _ENTRY_START.match(line)
+            body = line.rstrip("\r\n")
+            eol = line[len(body) :]
+            self._lines[first : last + 1] = [f"{match.group(1)}{key}={value_str}{eol}"]
+            removed_lines = removed_lines or last > first
+        if removed_lines:
+            # line numbers have shifted, so refresh the index
+            self._parse()
+        return True
+
+    def update(self, values, group=None):
+        """
+        Set several entries at once.
+
+        Args:
+            values (dict): Mapping of entry names to new values.
+            group (str, optional): Only update entries within this group.
+
+        Returns:
+            list: Keys that could not be found in the namelist.
+        """
+        return [key for key, value in values.items() if not self.set(key, value, group)]
+
+    def replace_group(self, group, lines):
+        """
+        Replace a whole namelist group, including its `&NAME` and `&END` lines.
+
+        Args:
+            group (str): Name of the group (case-insensitive), e.g. "LAND_CC".
+            lines (list): New lines of the group without line endings, starting with
+                `&NAME` and ending with `&END`. These two lines keep the indentation of
+                the replaced group, all other lines are written as given.
+
+        Returns:
+            bool: True if the group was found and replaced, False otherwise.
+        """
+        if (
+            len(lines) < 2
+            or not _GROUP_START.match(lines[0])
+            or _GROUP_START.match(lines[0]).group(1).upper() != group.upper()
+            or not _GROUP_END.match(lines[-1])
+        ):
+            raise ValueError(f"Lines do not form a complete &{group} group: {lines}")
+        spans = self._groups.get(group.upper())
+        if not spans:
+            return False
+
+        # apply from the bottom up so that earlier line numbers stay valid
+        for start, end in reversed(spans):
+            first = self._lines[start]
+            body = first.rstrip("\r\n")
+            eol = first[len(body) :] or "\n"
+            start_indent = body[: len(body) - len(body.lstrip())]
+            end_body = self._lines[end].rstrip("\r\n")
+            end_indent = end_body[: len(end_body) - len(end_body.lstrip())]
+            new_lines = [f"{start_indent}{lines[0].strip()}{eol}"]
+            new_lines += [f"{line}{eol}" for line in lines[1:-1]]
+            new_lines.append(f"{end_indent}{lines[-1].strip()}{eol}")
+            self._lines[start : end + 1] = new_lines
+        self._parse()
+        return True
+
+    def render(self):
+        """Return the full file content including all updates."""
+        return "".join(self._lines)
+
+    def write(self, path=None):
+        """Write the namelist to `path` (defaults to the file it was read from)."""
+        path = path or self.path
+        with open(path, "w", newline="") as file:
+            file.write(self.render())
@@ -0,0 +1,358 @@
+import os
+import json
+import itertools
+
+# size of the chunks in which legacy JSON tables are read
+_CHUNK_SIZE = 1 << 16
+
+# columnar parameter tables (`.ptab`) start with this magic string, followed by the
+# length of the JSON schema header (uint64), the header itself and the data columns
+_COLUMNAR_MAGIC = b"HCPTAB01"
+# number of members that are buffered/read at once when writing/iterating columnar tables
+_COLUMNAR_CHUNK = 4096
+
+
+# save the parameters to a JSON file with custom formatting
+# which will look like the following:
+# {
+#   "F0": [0.901, 0.859, 0.896, 0.733, 0.86],
+#   "LAI_MIN": [4.0, 4.0, 1.0, 1.0, 1.0],
+#   "NL0": [0.05, 0.03, 0.06, 0.03, 0.03],
+#   "R_GROW": [0.25, 0.25, 0.25, 0.25, 0.25],
+#   "TLOW": [0.0, -5.0, 0.0, 13.0, 0.0],
+#   "TUPP": [36.0, 31.0, 36.0, 45.0, 36.0],
+#   "V_CRIT_ALPHA": [0.343]
+# },
+def _format_json_string(item):
+    formatted_str = "{\n"
+    formatted_str += ",\n".join(
+        f'  "{key}": {json.dumps(value)}' for key, value in item.items()
+    )
+    formatted_str += "\n}"
+    return formatted_str
+
+
+def write_json(filename, records, default_params):
+    """
+    Write a parameter table in the compact, human-readable JSON format (one line per
+    parameter) with the default parameters as the first set.
+
+    Records are written one at a time, so `records` can be any iterable (e.g. a
+    generator) and is never held in memory as a whole.
+    """
+    with open(filename, "w") as file:
+        file.write("[\n")
+        # write default parameters as first set
+        formatted_str = _format_json_string(default_params)
+        file.write("    " + formatted_str.replace("\n", "\n    "))
+        # write all perturbed parameter sets
+        for item in records:
+            formatted_str = _format_json_string(item)
+            file.write(",\n    " + formatted_str.replace("\n", "\n    "))
+        file.write("\n]")
+
+
+def write_jsonl(filename, records, default_params=None):
+    """
+    Write a parameter table in the streaming JSON Lines format.
+
+    The optional first line `{"default_params": {...}}` holds the default parameter
+    set, followed by one parameter set per line.
+    """
+    with open(filename, "w") as file:
+        if default_params is not None:
+            file.write(json.dumps({"default_params": default_params}) + "\n")
+        for item in records:
+            file.write(json.dumps(item) + "\n")
+
+
+def write_columnar(filename, records, default_params=None):
+    """
+    Write a parameter table in the compact, columnar binary format.
+
+    Every parameter x PFT is stored as one contiguous float64 column, preceded by a
+    small JSON header with the number of members and the name, width (number of PFTs)
+    and file offset of each parameter. See `ColumnarTable` for reading the table.
+
+    All parameter sets must have the same parameters and widths as the first one. Values
+    are stored as float64, so integer values are returned as floats.
+    """
+    import numpy as np
+
+    records = iter(records)
+    if default_params is not None:
+        records = itertools.chain([default_params], records)
+    first = next(records, None)
+    if first is None:
+        raise ValueError("Cannot write an empty columnar parameter table")
+    keys = list(first)
+    widths = [len(v) if isinstance(v, list) else 1 for v in first.values()]
+    scalars = [not isinstance(v, list) for v in first.values()]
+
+    def to_row(record):
+        if list(record) != keys:
+            raise ValueError(f"Parameter set has keys {list(record)}, expected {keys}")
+        row = []
+        for key, width, scalar in zip(keys, widths, scalars):
+            values = [record[key]] if scalar else record[key]
+            if len(values) != width:
+                raise ValueError(f"Expected {width} values for {key}, got {values}")
+            row.extend(values)
+        return row
+
+    # stream all rows to a temporary row-major file first, as the number of members is
+    # only known at the end, and transpose it into columns afterwards
+    spill_file = f"{filename}.rows.tmp"
+    try:
+        N = 0
+        with open(spill_file, "wb") as spill:
+            chunk = []
+            for record in itertools.chain([first], records):
+                chunk.append(to_row(record))
+                if len(chunk) == _COLUMNAR_CHUNK:
+                    spill.write(np.asarray(chunk, dtype="<f8").tobytes())
+                    N += len(chunk)
+                    chunk = []
+            if chunk:
+                spill.write(np.asarray(chunk, dtype="<f8").tobytes())
+                N += len(chunk)
+
+        rows = np.memmap(spill_file, dtype="<f8", mode="r", shape=(N, sum(widths)))
+        columns = []
+        offset = 0
+        for key, width, scalar in zip(keys, widths, scalars):
+            columns.append(
+                {"key": key, "width": width, "scalar": scalar, "offset": offset}
+            )
+            offset += width * N * 8
+        header = json.dumps({"members": N, "columns": columns}).encode()
+        # pad the header so that the data columns are 8-byte aligned
+        header += b" " * (-(len(_COLUMNAR_MAGIC) + 8 + len(header)) % 8)
+
+        with open(f"{filename}.tmp", "wb") as file:
+            file.write(_COLUMNAR_MAGIC)
+            file.write(np.uint64(len(header)).astype("<u8").tobytes())
+            file.write(header)
+            for col in range(rows.shape[1]):
+                file.write(np.ascontiguousarray(rows[:, col]).tobytes())
+        del rows
+        os.replace(f"{filename}.tmp", filename)
+    finally:
+        if os.path.exists(spill_file):
+            os.remove(spill_file)
+
+
+class ColumnarTable:
+    """
+    Memory-mapped reader for columnar parameter tables (see `write_columnar`).
+
+    Only the small header is parsed when opening the table. Single members or whole
+    columns are read directly from the memory-mapped file without touching the rest.
+
+    Example:
+        table = ColumnarTable("./param_tables/xqau.ptab")
+        table.column("ALPHA", pft=0)  # BL values of all members
+        table.record(42)  # parameter set of member 42
+    """
+
+    def __init__(self, filename):
+        import numpy as np
+
+        self.filename = filename
+        with open(filename, "rb") as file:
+            if file.read(len(_COLUMNAR_MAGIC)) != _COLUMNAR_MAGIC:
+                raise ValueError(f"Not a columnar parameter table: {filename}")
+            header_length = int(np.frombuffer(file.read(8), dtype="<u8")[0])
+            header = json.loads(file.read(header_length))
+        data_offset = len(_COLUMNAR_MAGIC) + 8 + header_length
+
+        self.members = header["members"]
+        self._columns = {}
+        for column in header["columns"]:
+            self._columns[column["key"]] = (
+                np.memmap(
+                    filename,
+                    dtype="<f8",
+                    mode="r",
+                    offset=data_offset + column["offset"],
+                    shape=(column["width"], self.members),
+                ),
+                column["scalar"],
+            )
+
+    @property
+    def keys(self):
+        """Names of all parameters in table order."""
+        return list(self._columns)
+
+    def width(self, key):
+        """Number of values (PFTs) of a parameter."""
+        return self._columns[key][0].shape[0]
+
+    def __len__(self):
+        return self.members
+
+    def column(self, key, pft=None):
+        """
+        Values of a parameter for all members.
+
+        Returns:
+            numpy.ndarray: (number of PFTs) x N memory-mapped array, or the N values of a
+                single PFT if `pft` is given.
+        """
+        values = self._columns[key][0]
+        return values if pft is None else values[pft]
+
+    def record(self, i):
+        """Parameter set of member `i` as a dict (like in the JSON tables)."""
+        record = {}
+        for key, (values, scalar) in self._columns.items():
+            member_values = values[:, i].tolist()
+            record[key] = member_values[0] if scalar else member_values
+        return record
+
+    def __iter__(self):
+        for start in range(0, self.members, _COLUMNAR_CHUNK):
+            # read a block of members from every column at once
+            chunk = {
+                key: (values[:, start : start + _COLUMNAR_CHUNK].T.tolist(), scalar)
+                for key, (values, scalar) in self._columns.items()
+            }
+            for j in range(min(_COLUMNAR_CHUNK, self.members - start)):
+                yield {
+                    key: rows[j][0] if scalar else rows[j]
+                    for key, (rows, scalar) in chunk.items()
+                }
+
+
+def write_param_table(filename, records, default_params=None):
+    """
+    Write a parameter table, the format is chosen by the file extension: `.jsonl` for
+    JSON Lines, `.ptab` for the columnar binary format and anything else for the
+    compact JSON format.
+    """
+    if filename.endswith(".jsonl"):
+        write_jsonl(filename, records, default_params)
+    elif filename.endswith(".ptab"):
+        write_columnar(filename, records, default_params)
+    else:
+        write_json(filename, records, default_params)
+
+
+def _iter_json_array(file):
+    # incrementally decode the items of a top-level JSON array
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def next_char():
+        # skip whitespace and return the next character (empty string at the end)
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos : pos + 1]
+            chunk = file.read(_CHUNK_SIZE)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+    if next_char() != "[":
+        raise json.JSONDecodeError("Expecting '['", buffer, pos)
+    pos += 1
+    first = True
+    while True:
+        char = next_char()
+        if char == "]":
+            return
+        if not first:
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' or ']'", buffer, pos)
+            pos += 1
+            next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # item is not complete yet, read the next chunk
+                chunk = file.read(_CHUNK_SIZE)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+        yield item
+        pos = end
+        first = False
+
+
+def iter_records(filename):
+    """
+    Iterate over the parameter sets of a parameter table without loading it at once.
+
+    Supports the JSON Lines (`.jsonl`), the columnar binary (`.ptab`) and the compact
+    JSON format. The default parameters are always returned as the first set, like in
+    the JSON tables.
+
+    Yields:
+        dict: One parameter set at a time.
+    """
+    if filename.endswith(".ptab"):
+        yield from ColumnarTable(filename)
+        return
+    with open(filename, "r") as file:
+        if filename.endswith(".jsonl"):
+            for line in file:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if list(item) == ["default_params"]:
+                    yield item["default_params"]
+                else:
+                    yield item
+        else:
+            yield from _iter_json_array(file)
+
+
+def read_default_params(filename):
+    """Return the default parameter set (i.e. the first set) of a parameter table."""
+    for record in iter_records(filename):
+        return record
+    return None
+
+
+def export_json(filename, json_file):
+    """Export any parameter table to the compact, human-readable JSON format."""
+    records = iter_records(filename)
+    default_params = next(records)
+    write_json(json_file, records, default_params)
+
+
+class JsonArrayWriter:
+    """
+    Incrementally write a JSON array that is identical to `json.dump(items, f, indent)`.
+
+    The array is written to a temporary file which replaces `filename` on `close`, so
+    the file is never left half-written.
+    """
+
+    def __init__(self, filename, indent=4):
+        self.filename = filename
+        self._tmp_file = f"{filename}.tmp"
+        self._indent = " " * indent
+        self._file = open(self._tmp_file, "w")
+        self.count = 0
+
+    def write(self, item):
+        text = json.dumps(item, indent=len(self._indent))
+        self._file.write("[\n" if self.count == 0 else ",\n")
+        self._file.write(self._indent + text.replace("\n", "\n" + self._indent))
+        self.count += 1
+
+    def close(self):
+        self._file.write("[]" if self.count == 0 else "\n]")
+        self._file.close()
+        os.replace(self._tmp_file, self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
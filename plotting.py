@@ -0,0 +1,164 @@
+import math
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+
+PFT_LABELS = ["BL", "NL", "C3 grass", "C4 grass", "Shrub"]
+# parameters with a single value that is used for all PFTs
+SINGLE_VALUE_KEYS = ["V_CRIT_ALPHA", "Q10", "KAPS"]
+
+
+def design_columns(perturbed_sets, keys, n_pfts=len(PFT_LABELS)):
+    """
+    Collect the values of each parameter and PFT of all parameter sets.
+
+    Args:
+        perturbed_sets (list or ColumnarTable): Parameter sets.
+        keys (list): Parameters to collect.
+        n_pfts (int, optional): Number of PFTs. Defaults to 5.
+
+    Returns:
+        dict: (key, PFT index) mapped to a 1D array with the values of all parameter
+            sets. Parameter sets without a value for a PFT are skipped (with a warning).
+    """
+    columns = {}
+    for key in keys:
+        if hasattr(perturbed_sets, "column"):
+            # columnar table, read the memory-mapped columns directly
+            values = np.asarray(perturbed_sets.column(key)).T
+        else:
+            rows = [params.get(key) for params in perturbed_sets]
+            rows = [row if isinstance(row, list) else [] for row in rows]
+            width = max((len(row) for row in rows), default=0)
+            # pad parameter sets with fewer values with NaN, which are skipped below
+            values = np.full((len(rows), width), np.nan)
+            for i, row in enumerate(rows):
+                values[i, : len(row)] = row
+
+        for idx in range(n_pfts):
+            if key in SINGLE_VALUE_KEYS and values.shape[1] == 1:
+                pft_values = values[:, 0]
+            elif values.shape[1] > idx:
+                pft_values = values[:, idx]
+            else:
+                pft_values = np.full(values.shape[0], np.nan)
+            valid = ~np.isnan(pft_values)
+            if not valid.all():
+                print(
+                    f"Warning: Skipping {np.count_nonzero(~valid)} invalid entries for key '{key}' at index {idx}."
+                )
+            columns[key, idx] = pft_values[valid]
+    return columns
+
+
+def plot_param_distributions(
+    perturbed_sets, perturbed_BL_params, pdf_file, ensemble_name, bins=30
+):
+    """
+    Plot histograms of all perturbed parameters, one PDF page per PFT.
+
+    The histograms of all parameters and PFTs are computed at once with NumPy and drawn
+    on a single figure that is reused for every page. Matplotlib is only used through
+    the object-oriented API with the Agg/PDF backends, i.e. without pyplot state.
+
+    Args:
+        perturbed_sets (list or ColumnarTable): Parameter sets.
+        perturbed_BL_params (dict): Perturbed parameters, one histogram per parameter.
+        pdf_file (str): Output PDF file.
+        ensemble_name (str): Ensemble name used in the page titles.
+        bins (int, optional): Number of histogram bins. Defaults to 30.
+    """
+    param_keys = list(perturbed_BL_params.keys())
+    columns = design_columns(perturbed_sets, param_keys)
+    histograms = {
+        column: np.histogram(values, bins=bins) if values.size else None
+        for column, values in columns.items()
+    }
+
+    # create the figure and axes only once and update the bars for every page
+    nrows = max(1, math.ceil(len(param_keys) / 2))
+    fig = Figure(figsize=(12, 12))
+    FigureCanvasAgg(fig)
+    axs = fig.subplots(nrows, 2, squeeze=False).flatten()
+    for ax in axs[len(param_keys) :]:
+        ax.set_visible(False)
+    bars = {}
+
+    # create a single PDF file to save the individual pages
+    with PdfPages(pdf_file) as pdf:
+        # loop over the PFTs
+        for idx, label in enumerate(PFT_LABELS):
+            print(f"Plotting paramater distributions for {label}")
+            fig.suptitle(
+                f"Distributions of perturbed parameters for {label} ({ensemble_name})"
+            )
+            for ax, key in zip(axs, param_keys):
+                if histograms[key, idx] is not None:
+                    counts, edges = histograms[key, idx]
+                else:
+                    counts, edges = np.zeros(bins), np.linspace(0, 1, bins + 1)
+                if key not in bars:
+                    bars[key] = ax.bar(
+                        edges[:-1],
+                        counts,
+                        width=np.diff(edges),
+                        align="edge",
+                        color="skyblue",
+                        edgecolor="black",
+                    )
+                    ax.set_title(f"{key} Distribution")
+                    ax.set_xlabel(f"{key}")
+                    ax.set_ylabel("Frequency")
+                else:
+                    for bar, x, width, height in zip(
+                        bars[key], edges[:-1], np.diff(edges), counts
+                    ):
+                        bar.set_x(x)
+                        bar.set_width(width)
+                        bar.set_height(height)
+                    ax.relim()
+                    ax.autoscale_view()
+
+            # the tick labels differ between the pages, so the layout is recomputed
+            # for every page
+            fig.tight_layout(rect=[0, 0, 1, 0.96])
+
+            # Save the current figure to the PDF as a new page
+            pdf.savefig(fig)
+
+    print(f"All plots saved to '{pdf_file}'")
+
+
+def _plot_param_distributions(args):
+    return plot_param_distributions(*args)
+
+
+def plot_many_param_distributions(jobs, processes=None):
+    """
+    Render the parameter distributions of several ensembles (e.g. one per candidate)
+    in parallel processes.
+
+    Args:
+        jobs (list): Arguments of `plot_param_distributions` for each PDF, i.e.
+            (perturbed_sets, perturbed_BL_params, pdf_file, ensemble_name) tuples.
+        processes (int, optional): Number of processes, None uses all CPUs and 1
+            renders all PDFs in the current process.
+    """
+    if processes == 1:
+        for job in jobs:
+            plot_param_distributions(*job)
+        return
+    # fork the workers where possible, as the sampler scripts are not import-safe
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = None
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes, mp_context=context
+    ) as executor:
+        # consume the results to raise any exceptions from the worker processes
+        list(executor.map(_plot_param_distributions, jobs))
@@ -0,0 +1,362 @@
+import os
+import re
+import shutil
+import argparse
+
+from status import read_ensemble_ids
+
+# model days per year of the 360-day calendar used by HadCM3
+DAYS_PER_YEAR = 360
+# size of a pp field header (64 words of 4 bytes) and of a packed value in bytes
+PP_HEADER_BYTES = 256
+PP_VALUE_BYTES = 4
+# approximate number of fields per atmosphere level (prognostics, clouds, tracers) and
+# additional single-level fields (surface, soil, TRIFFID) of an atmosphere dump, and
+# prognostic fields per ocean level in addition to the tracers; dumps are stored in
+# 64-bit words
+ATMOS_DUMP_FIELDS_PER_LEVEL = 6
+ATMOS_DUMP_SINGLE_LEVEL_FIELDS = 100
+OCEAN_DUMP_FIELDS_PER_LEVEL = 2
+DUMP_WORD_BYTES = 8
+# number of dumps of each component that are kept on disk (see pruning.DEFAULT_RULES)
+DEFAULT_RETAINED_DUMPS = 10
+
+# a record of a STASHC file, e.g. `&STREQ IMOD= 1, ISEC=0, ITEM=1, ... &END`
+_STASH_RECORD = re.compile(r"&(\w+)(.*?)&END", re.DOTALL)
+_STASH_VALUE = re.compile(r"(\w+)\s*=\s*(\"[^\"]*\"|[^=]+?)\s*,?\s*(?=\w+\s*=|$)")
+
+
+class ProvisioningError(Exception):
+    """Raised if the storage of an ensemble cannot (or should not) be provisioned."""
+
+
+def _parse_stash_records(text):
+    # list of (record type, {name: value}) of all records in file order
+    records = []
+    for match in _STASH_RECORD.finditer(text):
+        values = {}
+        for name, value in _STASH_VALUE.findall(match.group(2).replace("\n", " ")):
+            value = value.strip().rstrip(",")
+            if value.startswith('"'):
+                values[name.upper()] = value.strip('"')
+            else:
+                values[name.upper()] = [
+                    v.strip() for v in value.split(",") if v.strip()
+                ]
+        records.append((match.group(1).upper(), values))
+    return records
+
+
+def _first_int(values, name, default=0):
+    value = values.get(name)
+    return int(float(value[0])) if value else default
+
+
+def _sizes(vanilla_job):
+    # integer sizes of SIZES, e.g. {"ROW_LENGTH": 96, "P_ROWS": 73, ...}
+    with open(os.path.join(vanilla_job, "SIZES"), "r") as f:
+        return {
+            name.upper(): int(value)
+            for name, value in re.findall(r"(\w+)=\s*(-?\d+)\s*,", f.read())
+        }
+
+
+def _steps_per_day(vanilla_job):
+    # time steps per day of the atmosphere and ocean (internal models 1 and 2)
+    with open(os.path.join(vanilla_job, "CNTLGEN"), "r") as f:
+        text = f.read()
+    steps = re.search(r"STEPS_PER_PERIODim=([\d,\s]+)", text)
+    secs = re.search(r"SECS_PER_PERIODim=([\d,\s]+)", text)
+    steps = [int(v) for v in steps.group(1).split(",") if v.strip()]
+    secs = [int(v) for v in secs.group(1).split(",") if v.strip()]
+    return {
+        imod: steps[imod - 1] * 86400 / secs[imod - 1]
+        for imod in (1, 2)
+        if secs[imod - 1]
+    }
+
+
+def run_years(vanilla_job):
+    """Run length of a job in model years (from RUN_TARGET_END in CNTLALL)."""
+    with open(os.path.join(vanilla_job, "CNTLALL"), "r") as f:
+        match = re.search(r"RUN_TARGET_END=([^\n]*)", f.read())
+    target = [int(v) for v in match.group(1).split(",") if v.strip()]
+    years, months, days = (target + [0, 0, 0])[:3]
+    return years + months / 12 + days / DAYS_PER_YEAR
+
+
+def pp_bytes_per_year(vanilla_job):
+    """
+    Approximate volume of the pp output of a job per model year.
+
+    Every STASH request that is written to a pp file (`&USE` with LOCN=3) contributes
+    one field per output time (`&TIME` IFRE/UNT3) and level (`&DOMAIN` levels, pseudo
+    levels and spatial meaning), on the atmosphere (ROW_LENGTH x P_ROWS) or ocean
+    (IMT x JMT) grid of SIZES.
+
+    Returns:
+        int: Bytes per model year.
+    """
+    with open(os.path.join(vanilla_job, "STASHC"), "r") as f:
+        records = _parse_stash_records(f.read())
+    sizes = _sizes(vanilla_job)
+    steps_per_day = _steps_per_day(vanilla_job)
+    times = [values for kind, values in records if kind == "TIME"]
+    domains = [values for kind, values in records if kind == "DOMAIN"]
+    uses = [values for kind, values in records if kind == "USE"]
+    grids = {
+        1: (sizes.get("ROW_LENGTH", 0), sizes.get("P_ROWS", 0)),
+        2: (sizes.get("IMT", 0), sizes.get("JMT", 0)),
+    }
+
+    total = 0
+    for kind, request in records:
+        if kind != "STREQ":
+            continue
+        imod = _first_int(request, "IMOD", 1)
+        use = uses[_first_int(request, "IUSE") - 1]
+        if _first_int(use, "LOCN") != 3:
+            # not written to a pp file
+            continue
+        time = times[_first_int(request, "ITIM") - 1]
+        domain = domains[_first_int(request, "IDOM") - 1]
+
+        # output frequency in days
+        frequency = _first_int(time, "IFRE", 1)
+        unit = time.get("UNT3", "DA").strip()
+        if unit == "T":
+            frequency /= steps_per_day.get(imod, 48)
+        elif unit == "H":
+            frequency /= 24
+        fields_per_year = DAYS_PER_YEAR / frequency if frequency > 0 else 0
+
+        # number of levels
+        if "RLEVLST" in domain:
+            levels = len(domain["RLEVLST"])
+        elif "LEVLST" in domain:
+            levels = len(domain["LEVLST"])
+        elif "LEVB" in domain and "LEVT" in domain:
+            levels = _first_int(domain, "LEVT") - _first_int(domain, "LEVB") + 1
+        else:
+            levels = 1
+        levels *= max(1, len(domain.get("PSLIST", [])))
+
+        # spatial meaning: 1 vertical, 2 zonal, 3 meridional, 4 field mean
+        columns, rows = grids.get(imod, grids[1])
+        meaning = _first_int(domain, "IMN")
+        if meaning == 1:
+            levels = max(1, len(domain.get("PSLIST", [])))
+        points = {2: rows, 3: columns, 4: 1}.get(meaning, columns * rows)
+
+        total += fields_per_year * levels * (points * PP_VALUE_BYTES + PP_HEADER_BYTES)
+    return int(total)
+
+
+def dump_bytes(vanilla_job):
+    """
+    Approximate size of an atmosphere and an ocean dump of a job from its grid sizes.
+
+    Returns:
+        tuple: (atmosphere dump bytes, ocean dump bytes)
+    """
+    sizes = _sizes(vanilla_job)
+    atmos_points = sizes.get("ROW_LENGTH", 0) * sizes.get("P_ROWS", 0)
+    atmos_fields = (
+        sizes.get("P_LEVELS", 0) * ATMOS_DUMP_FIELDS_PER_LEVEL
+        + ATMOS_DUMP_SINGLE_LEVEL_FIELDS
+    )
+    ocean_points = sizes.get("IMT", 0) * sizes.get("JMT", 0)
+    ocean_fields = sizes.get("KM", 0) * (
+        sizes.get("NT", 0) + OCEAN_DUMP_FIELDS_PER_LEVEL
+    )
+    return (
+        atmos_points * atmos_fields * DUMP_WORD_BYTES,
+        ocean_points * ocean_fields * DUMP_WORD_BYTES,
+    )
+
+
+def estimate_member_bytes(vanilla_job, years=None, retained_dumps=None):
+    """
+    Estimate the peak output volume of a single ensemble member.
+
+    Args:
+        vanilla_job (str): Path to the vanilla job.
+        years (float, optional): Run length in model years. Defaults to the run length
+            of the vanilla job.
+        retained_dumps (int, optional): Number of dumps of each component kept on
+            disk. Defaults to DEFAULT_RETAINED_DUMPS.
+
+    Returns:
+        int: Bytes of pp output over the whole run plus the retained dumps.
+    """
+    years = run_years(vanilla_job) if years is None else years
+    if retained_dumps is None:
+        retained_dumps = DEFAULT_RETAINED_DUMPS
+    atmos_dump, ocean_dump = dump_bytes(vanilla_job)
+    n_dumps = min(retained_dumps, max(1, int(years)))
+    return int(
+        years * pp_bytes_per_year(vanilla_job) + n_dumps * (atmos_dump + ocean_dump)
+    )
+
+
+def provision_storage(
+    ids, storage_dir, link_dir, member_bytes=0, safety_factor=1.2, dry_run=False
+):
+    """
+    Create the storage directories of all members and link them into `link_dir`.
+
+    All links are checked first and the free space of `storage_dir` is compared to the
+    projected output volume before anything is created. If creating a directory or
+    link fails, everything created so far is removed again.
+
+    Args:
+        ids (list): Ensemble IDs.
+        storage_dir (str): Directory for the output of all members (e.g. on the
+            private BRIDGE partition).
+        link_dir (str): Directory in which the model expects the output of each job
+            (e.g. ~/dump2hold).
+        member_bytes (int, optional): Projected output volume of a member in bytes.
+        safety_factor (float, optional): Required free space relative to the
+            projected volume. Defaults to 1.2.
+        dry_run (bool, optional): Only run the checks.
+
+    Returns:
+        dict: Number of "created" and already "existing" members and the "projected"
+            and "free" bytes.
+
+    Raises:
+        ProvisioningError: If a link conflicts with an existing file or link, or the
+            projected volume exceeds the free space.
+    """
+    storage_dir = os.path.abspath(os.path.expanduser(storage_dir))
+    link_dir = os.path.abspath(os.path.expanduser(link_dir))
+
+    todo, conflicts = [], []
+    for expid in ids:
+        target = os.path.join(storage_dir, expid)
+        link = os.path.join(link_dir, expid)
+        if os.path.islink(link):
+            if os.readlink(link) != target:
+                conflicts.append(f"{link} points to {os.readlink(link)}")
+            elif not os.path.isdir(target):
+                # dangling link of a previous run, the directory is created below
+                todo.append((expid, target, link, False))
+        elif os.path.exists(link):
+            conflicts.append(f"{link} exists and is not a link")
+        else:
+            todo.append((expid, target, link, True))
+    if conflicts:
+        raise ProvisioningError(
+            f"{len(conflicts)} conflicting entries in {link_dir}:\n"
+            + "\n".join(conflicts[:20])
+        )
+
+    # free space of the partition of the storage directory (or its closest existing
+    # parent, if it has not been created yet)
+    projected = int(len(todo) * member_bytes * safety_factor)
+    usage_dir = storage_dir
+    while not os.path.isdir(usage_dir):
+        usage_dir = os.path.dirname(usage_dir)
+    free = shutil.disk_usage(usage_dir).free
+    report = {
+        "created": len(todo),
+        "existing": len(ids) - len(todo),
+        "projected": projected,
+        "free": free,
+    }
+    if projected > free:
+        raise ProvisioningError(
+            f"Projected output of {len(todo)} members ({projected / 1e9:.1f} GB "
+            f"including a safety factor of {safety_factor}) exceeds the free space of "
+            f"{free / 1e9:.1f} GB in {storage_dir}"
+        )
+    if dry_run:
+        return report
+
+    created_dirs, created_links = [], []
+    try:
+        os.makedirs(storage_dir, exist_ok=True)
+        os.makedirs(link_dir, exist_ok=True)
+        for expid, target, link, new_link in todo:
+            if not os.path.isdir(target):
+                os.mkdir(target)
+                created_dirs.append(target)
+            if new_link:
+                os.symlink(target, link)
+                created_links.append(link)
+    except OSError as e:
+        # roll back, so that no dangling links or half-provisioned members remain
+        for link in reversed(created_links):
+            os.unlink(link)
+        for target in reversed(created_dirs):
+            os.rmdir(target)
+        raise ProvisioningError(f"Provisioning failed and was rolled back: {e}")
+    return report
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the storage provisioning, also used by
+    `python -m ensemble provision`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Create the output directories of all ensemble members and link "
+        "them into dump2hold.",
+    )
+    parser.add_argument(
+        "--ids_file",
+        type=str,
+        required=True,
+        help="Log file of generated IDs or manifest (.jsonl) of create_ensemble_jobs.py",
+    )
+    parser.add_argument(
+        "--storage_dir",
+        type=str,
+        required=True,
+        help="Directory for the output of all members",
+    )
+    parser.add_argument(
+        "--link_dir",
+        type=str,
+        default=os.path.expanduser("~/dump2hold"),
+        help="Directory with the links to the output of each job (default: ~/dump2hold)",
+    )
+    parser.add_argument(
+        "--vanilla_job",
+        type=str,
+        default=None,
+        help="Vanilla job to estimate the output volume of each member from",
+    )
+    parser.add_argument(
+        "--years",
+        type=float,
+        default=None,
+        help="Run length in model years (default: run length of the vanilla job)",
+    )
+    parser.add_argument("--dry_run", action="store_true", help="Only run the checks")
+    args = parser.parse_args(argv)
+
+    member_bytes = 0
+    if args.vanilla_job is not None:
+        member_bytes = estimate_member_bytes(args.vanilla_job, args.years)
+        print(f"Projected output per member: {member_bytes / 1e9:.2f} GB")
+    try:
+        report = provision_storage(
+            read_ensemble_ids(args.ids_file),
+            args.storage_dir,
+            args.link_dir,
+            member_bytes,
+            dry_run=args.dry_run,
+        )
+    except ProvisioningError as e:
+        parser.exit(1, f"{e}\n")
+    print(
+        f"{report['created']} members {'to provision' if args.dry_run else 'provisioned'}, "
+        f"{report['existing']} already existed. Projected output "
+        f"{report['projected'] / 1e9:.1f} GB, {report['free'] / 1e9:.1f} GB free."
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,225 @@
+import os
+import fnmatch
+import argparse
+import collections
+import concurrent.futures
+
+from status import read_ensemble_ids
+from um_output import parse_um_filename
+from restart_index import stream_key
+
+PruneRule = collections.namedtuple("PruneRule", ["streams", "keep_last", "keep_every"])
+PruneRule.__doc__ = """
+Retention rule for the output streams of a job.
+
+Args:
+    streams (str): Pattern (fnmatch) of the stream keys the rule applies to, e.g. "?da"
+        for the atmosphere and ocean dumps or "?p[a-f]" for the pp streams a to f (see
+        `restart_index.stream_key`).
+    keep_last (int): Number of most recent model years to keep of every matching
+        stream, 0 deletes all files and None keeps all years.
+    keep_every (int): Additionally keep every model year that is a multiple of this
+        number (e.g. 50 to keep a restart every 50 years), None to disable.
+"""
+
+# same retention as the old clean_all_jobs.sh: delete the pp streams a, b, c, d and f
+# and keep the dumps of the last 10 years (i.e. the 20 newest atmosphere/ocean dumps)
+DEFAULT_RULES = [
+    PruneRule("?p[abcdf]", 0, None),
+    PruneRule("?da", 10, None),
+]
+
+JobPlan = collections.namedtuple("JobPlan", ["ensemble_id", "delete", "n_kept"])
+
+
+def parse_rule(text):
+    """
+    Parse a retention rule from the command line, e.g. "?da:keep_last=10,keep_every=50".
+    """
+    streams, _, options = text.partition(":")
+    values = {"keep_last": None, "keep_every": None}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in values:
+            raise ValueError(f"Unknown option {key} in retention rule {text}")
+        values[key] = int(value)
+    return PruneRule(streams, values["keep_last"], values["keep_every"])
+
+
+def _kept_years(years, rule):
+    years = sorted(years)
+    kept = set()
+    if rule.keep_last is None:
+        kept.update(years)
+    elif rule.keep_last > 0:
+        kept.update(years[-rule.keep_last :])
+    if rule.keep_every:
+        kept.update(year for year in years if year % rule.keep_every == 0)
+    return kept
+
+
+def plan_job(data_dir, expid, rules):
+    """
+    Plan the pruning of the `datam` directory of a single job.
+
+    Every file is matched against the rules in order, the first rule whose stream
+    pattern matches decides whether it is kept. Files that are no UM output or don't
+    match any rule are always kept.
+
+    Returns:
+        JobPlan: Ensemble ID, list of (path, size) of the files to delete and the number
+            of kept files.
+    """
+    datam = os.path.join(data_dir, expid, "datam")
+    # stream key -> year -> [(path, size)]
+    streams = collections.defaultdict(lambda: collections.defaultdict(list))
+    n_kept = 0
+    try:
+        with os.scandir(datam) as entries:
+            for entry in entries:
+                output_file = parse_um_filename(entry.name)
+                if output_file is None or not entry.is_file(follow_symlinks=False):
+                    n_kept += 1
+                    continue
+                size = entry.stat(follow_symlinks=False).st_size
+                streams[stream_key(output_file)][output_file.year].append(
+                    (entry.path, size)
+                )
+    except (FileNotFoundError, NotADirectoryError):
+        return JobPlan(expid, [], 0)
+
+    delete = []
+    for key, years in streams.items():
+        rule = next((r for r in rules if fnmatch.fnmatchcase(key, r.streams)), None)
+        kept = set(years) if rule is None else _kept_years(years, rule)
+        for year, files in years.items():
+            if year in kept:
+                n_kept += len(files)
+            else:
+                delete.extend(files)
+    delete.sort()
+    return JobPlan(expid, delete, n_kept)
+
+
+def plan_pruning(data_dir, ids, rules=DEFAULT_RULES, threads=32):
+    """
+    Plan the pruning of all jobs (dry run), scanning the directories in parallel.
+
+    Returns:
+        list: `JobPlan` of every job, in the order of `ids`.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda expid: plan_job(data_dir, expid, rules), ids))
+
+
+def execute_plan(plans, threads=32):
+    """
+    Delete all files of a pruning plan in parallel.
+
+    Files that were already removed in the meantime are skipped.
+
+    Returns:
+        tuple: (number of deleted files, bytes reclaimed)
+    """
+
+    def unlink(file):
+        path, size = file
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return 0, 0
+        return 1, size
+
+    files = [file for plan in plans for file in plan.delete]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(unlink, files, chunksize=64))
+    return sum(n for n, _ in results), sum(size for _, size in results)
+
+
+def format_bytes(n_bytes):
+    """Human-readable size, e.g. "1.5 TB"."""
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(n_bytes) < 1024 or unit == "TB":
+            return f"{n_bytes:.1f} {unit}" if unit != "B" else f"{n_bytes} B"
+        n_bytes /= 1024
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the pruning engine, also used by
+    `python -m ensemble prune`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Delete old model output of all ensemble members (dry run by default).",
+    )
+    parser.add_argument(
+        "--ids_file",
+        type=str,
+        required=True,
+        help="Log file of generated IDs or manifest (.jsonl) of create_ensemble_jobs.py",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.path.expanduser("~/dump2hold"),
+        help="Directory with the model output of each job (default: ~/dump2hold)",
+    )
+    parser.add_argument(
+        "--rule",
+        type=str,
+        action="append",
+        default=None,
+        help='Retention rule "<stream pattern>:keep_last=N,keep_every=K", can be given '
+        "several times, the first matching rule applies (default: delete pp streams "
+        "a-d and f and keep the dumps of the last 10 years)",
+    )
+    parser.add_argument(
+        "--execute",
+        action="store_true",
+        help="Delete the files, otherwise only show what would be deleted",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=32,
+        help="Number of threads to scan and delete (default: 32)",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="List every file to delete"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        rules = [parse_rule(rule) for rule in args.rule] if args.rule else DEFAULT_RULES
+    except ValueError as e:
+        parser.error(str(e))
+
+    plans = plan_pruning(
+        args.data_dir, read_ensemble_ids(args.ids_file), rules, args.threads
+    )
+    n_files = sum(len(plan.delete) for plan in plans)
+    n_bytes = sum(size for plan in plans for _, size in plan.delete)
+    for plan in plans:
+        if args.verbose:
+            for path, _ in plan.delete:
+                print(path)
+        elif plan.delete:
+            size = sum(size for _, size in plan.delete)
+            print(
+                f"{plan.ensemble_id}: delete {len(plan.delete)} files "
+                f"({format_bytes(size)}), keep {plan.n_kept}"
+            )
+
+    if not args.execute:
+        print(
+            f"Dry run: {n_files} files ({format_bytes(n_bytes)}) would be deleted. "
+            "Use --execute to delete them."
+        )
+        return
+    n_deleted, n_reclaimed = execute_plan(plans, args.threads)
+    print(f"Deleted {n_deleted} files, {format_bytes(n_reclaimed)} reclaimed.")
+
+
+if __name__ == "__main__":
+    cli()
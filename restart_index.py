@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import argparse
+import concurrent.futures
+
+from status import read_ensemble_ids
+from um_output import parse_um_filename
+
+INDEX_VERSION = 1
+
+# directories modified less than this many seconds before a scan are scanned again on
+# the next update, as files created in the same mtime tick would otherwise be missed
+_MTIME_GRACE = 2.0
+
+
+def stream_key(output_file):
+    """Key of the output stream of a parsed file, e.g. "ada" for atmosphere dumps."""
+    return output_file.component + output_file.file_type + output_file.stream
+
+
+def _scan_job(data_dir, expid):
+    # returns (mtime_ns, {stream key: {year: [file names]}}) of the datam directory, or
+    # None if the directory does not exist
+    datam = os.path.join(data_dir, expid, "datam")
+    try:
+        mtime_ns = os.stat(datam).st_mtime_ns
+        streams = {}
+        with os.scandir(datam) as entries:
+            for entry in entries:
+                output_file = parse_um_filename(entry.name)
+                if output_file is None:
+                    continue
+                years = streams.setdefault(stream_key(output_file), {})
+                years.setdefault(str(output_file.year), []).append(entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    for years in streams.values():
+        for names in years.values():
+            names.sort()
+    if time.time() - mtime_ns / 1e9 < _MTIME_GRACE:
+        mtime_ns = None
+    return mtime_ns, streams
+
+
+class RestartIndex:
+    """
+    Persistent index of the UM dump and pp files in the `datam` directories of all jobs.
+
+    The files are indexed by job, stream ("ada" atmosphere dumps, "oda" ocean dumps,
+    "apa" atmosphere pp stream a, ...) and model year. `update` only rescans the `datam`
+    directories whose mtime changed since the last update (a single stat per job), so
+    questions like the latest complete restart year of all members are answered without
+    listing millions of files again.
+
+    Args:
+        index_file (str): JSON file that holds the index between runs.
+        data_dir (str): Directory with the output of each job (e.g. ~/dump2hold).
+
+    Example:
+        index = RestartIndex("./logs/xqau_restart_index.json", "~/dump2hold")
+        index.update(ids)
+        index.latest_restart_year("xqaua")
+    """
+
+    def __init__(self, index_file, data_dir):
+        self.index_file = index_file
+        self.data_dir = os.path.expanduser(data_dir)
+        self.jobs = {}
+        if os.path.isfile(index_file):
+            with open(index_file, "r") as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION and index.get("data_dir") == (
+                self.data_dir
+            ):
+                self.jobs = index["jobs"]
+
+    def update(self, ids, threads=32):
+        """
+        Bring the index up to date for the given jobs and save it.
+
+        Args:
+            ids (list): Ensemble IDs.
+            threads (int, optional): Number of threads to stat/scan the directories.
+
+        Returns:
+            int: Number of `datam` directories that were (re)scanned.
+        """
+
+        def needs_scan(expid):
+            entry = self.jobs.get(expid)
+            if entry is None or entry["mtime_ns"] is None:
+                return True
+            try:
+                mtime_ns = os.stat(
+                    os.path.join(self.data_dir, expid, "datam")
+                ).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                return True
+            return mtime_ns != entry["mtime_ns"]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            stale = [
+                expid
+                for expid, stale in zip(ids, executor.map(needs_scan, ids))
+                if stale
+            ]
+            scans = executor.map(lambda expid: _scan_job(self.data_dir, expid), stale)
+            for expid, scan in zip(stale, scans):
+                if scan is None:
+                    self.jobs.pop(expid, None)
+                else:
+                    self.jobs[expid] = {"mtime_ns": scan[0], "streams": scan[1]}
+        self.save()
+        return len(stale)
+
+    def save(self):
+        """Write the index atomically to `index_file`."""
+        index = {"version": INDEX_VERSION, "data_dir": self.data_dir, "jobs": self.jobs}
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def files(self, expid, stream="ada", year=None):
+        """
+        Names of the indexed files of a job.
+
+        Args:
+            expid (str): Ensemble ID.
+            stream (str, optional): Stream key, e.g. "ada" (atmosphere dumps), "oda"
+                (ocean dumps) or "apa" (atmosphere pp stream a). Defaults to "ada".
+            year (int, optional): Only return the files of this model year.
+
+        Returns:
+            list: File names, sorted by model year.
+        """
+        years = self.jobs.get(expid, {"streams": {}})["streams"].get(stream, {})
+        if year is not None:
+            return list(years.get(str(year), []))
+        return [name for y in sorted(years, key=int) for name in years[y]]
+
+    def years(self, expid, stream="ada"):
+        """Sorted model years of a stream of a job (see `files`)."""
+        years = self.jobs.get(expid, {"streams": {}})["streams"].get(stream, {})
+        return sorted(int(year) for year in years)
+
+    def restart_years(self, expid):
+        """Sorted model years with both an atmosphere and an ocean dump."""
+        return sorted(set(self.years(expid, "ada")) & set(self.years(expid, "oda")))
+
+    def latest_restart_year(self, expid):
+        """Latest model year with both an atmosphere and an ocean dump, or None."""
+        years = self.restart_years(expid)
+        return years[-1] if years else None
+
+    def restarts_exist(self, expid, year):
+        """Whether the atmosphere and ocean dumps of a job exist for a model year."""
+        return bool(self.files(expid, "ada", year) and self.files(expid, "oda", year))
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the restart index, also used by
+    `python -m ensemble restarts`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Show the latest complete restart year of all ensemble members.",
+    )
+    parser.add_argument(
+        "--ids_file",
+        type=str,
+        required=True,
+        help="Log file of generated IDs or manifest (.jsonl) of create_ensemble_jobs.py",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.path.expanduser("~/dump2hold"),
+        help="Directory with the model output of each job (default: ~/dump2hold)",
+    )
+    parser.add_argument(
+        "--index_file",
+        type=str,
+        default=None,
+        help="Index file (default: <ids_file without extension>_restart_index.json)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=32,
+        help="Number of threads to scan the output directories (default: 32)",
+    )
+    args = parser.parse_args(argv)
+
+    index_file = args.index_file or (
+        f"{os.path.splitext(args.ids_file)[0]}_restart_index.json"
+    )
+    ids = read_ensemble_ids(args.ids_file)
+    index = RestartIndex(index_file, args.data_dir)
+    rescanned = index.update(ids, args.threads)
+    for expid in ids:
+        year = index.latest_restart_year(expid)
+        print(f"{expid} {year if year is not None else '-'}")
+    print(
+        f"{rescanned} of {len(ids)} output directories rescanned, index saved to {index_file}"
+    )
+
+
+if __name__ == "__main__":
+    cli()
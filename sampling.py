@@ -0,0 +1,339 @@
+import warnings
+
+import numpy as np
+
+# new BL value is applied as a delta to all PFTs, i.e. other PFTs are changed pro-rata
+PRO_RATA_KEYS = ["F0", "NL0", "ALPHA", "G_AREA"]
+# new value is only applied to the tree PFTs (BL and NL), grass and shrubs keep the default
+TREE_ONLY_KEYS = ["LAI_MIN"]
+TREE_PFTS = slice(0, 2)
+# new value is used for all PFTs
+BROADCAST_KEYS = ["R_GROW", "V_CRIT_ALPHA", "Q10", "KAPS"]
+# new value is a delta around the default of each PFT
+DELTA_KEYS = ["TLOW", "TUPP"]
+# perturbing the first key also shifts the second one by the same delta
+CO_VARYING_KEYS = {"TLOW": "TUPP"}
+
+
+def get_rng(seed=None):
+    """
+    Random number generator for all samplers.
+
+    Args:
+        seed (int or numpy.random.SeedSequence, optional): Seed for a reproducible
+            design. Defaults to None, i.e. a different design for every call.
+
+    Returns:
+        numpy.random.Generator: Seeded random number generator.
+    """
+    return np.random.default_rng(seed)
+
+
+def random_design(N, P, rng):
+    """Independent uniform samples (N x P) in the unit hypercube."""
+    return rng.random((N, P))
+
+
+def latin_hypercube(N, P, rng):
+    """
+    Latin hypercube design (N x P) in the unit hypercube.
+
+    Each parameter range is split into N equally sized intervals and every interval
+    is sampled exactly once, at a random position within the interval.
+    """
+    strata = rng.permuted(np.tile(np.arange(N), (P, 1)), axis=1).T
+    return (strata + rng.random((N, P))) / N
+
+
+def sobol(N, P, rng):
+    """
+    Scrambled Sobol design (N x P) in the unit hypercube (requires SciPy).
+
+    Sobol sequences are most balanced if N is a power of 2.
+    """
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError("The Sobol sampler requires SciPy (pip install scipy).")
+
+    try:
+        sampler = qmc.Sobol(d=P, scramble=True, rng=rng)
+    except TypeError:
+        # SciPy < 1.15
+        sampler = qmc.Sobol(d=P, scramble=True, seed=rng)
+    with warnings.catch_warnings():
+        # warning about the balance properties if N is not a power of 2
+        warnings.simplefilter("ignore", UserWarning)
+        return sampler.random(N)
+
+
+def maximin_latin_hypercube(N, P, rng, n_candidates=50):
+    """
+    Maximin-optimised Latin hypercube design (N x P) in the unit hypercube.
+
+    Out of `n_candidates` Latin hypercubes, the design with the largest minimum
+    distance between any two points is returned, i.e. the one without clumped points.
+    """
+    best_design, best_distance = None, -np.inf
+    for _ in range(n_candidates):
+        design = latin_hypercube(N, P, rng)
+        distance = min_pairwise_distance(design)
+        if distance > best_distance:
+            best_design, best_distance = design, distance
+    return best_design
+
+
+# the quality report of larger designs is computed on a random subsample of this many
+# points, as the discrepancy and pairwise distances scale with the square of N
+QUALITY_SAMPLE_SIZE = 2048
+
+# number of elements of the chunks of the pairwise computations (about 32 MB of float64)
+_PAIRWISE_CHUNK_ELEMENTS = 1 << 22
+
+
+def _chunk_rows(N, P):
+    # number of rows per chunk so that a chunk x N x P array stays within the budget
+    return max(1, _PAIRWISE_CHUNK_ELEMENTS // max(1, N * P))
+
+
+# available sampling strategies for `generate_perturbed_params`
+SAMPLERS = {
+    "random": random_design,
+    "lhs": latin_hypercube,
+    "sobol": sobol,
+    "maximin": maximin_latin_hypercube,
+}
+
+
+def min_pairwise_distance(unit_samples, chunk_size=None):
+    """Minimum Euclidean distance between any two points of a design."""
+    N = unit_samples.shape[0]
+    if N < 2:
+        return np.nan
+    chunk_size = chunk_size or _chunk_rows(N, unit_samples.shape[1])
+    min_distance = np.inf
+    # compute the distance matrix in chunks of rows to limit the memory use
+    for start in range(0, N, chunk_size):
+        chunk = unit_samples[start : start + chunk_size]
+        distances = np.sqrt(
+            ((chunk[:, np.newaxis, :] - unit_samples[np.newaxis, :, :]) ** 2).sum(-1)
+        )
+        # ignore the distance of each point to itself
+        rows = np.arange(chunk.shape[0])
+        distances[rows, start + rows] = np.inf
+        min_distance = min(min_distance, distances.min())
+    return float(min_distance)
+
+
+def centered_discrepancy(unit_samples, chunk_size=None):
+    """
+    Centered L2 discrepancy of a design (lower is more uniform).
+
+    Uses the same definition as `scipy.stats.qmc.discrepancy(method="CD")`.
+    """
+    N, P = unit_samples.shape
+    chunk_size = chunk_size or _chunk_rows(N, P)
+    centred = np.abs(unit_samples - 0.5)
+    term_1 = (13.0 / 12.0) ** P
+    term_2 = np.prod(1.0 + 0.5 * centred - 0.5 * centred**2, axis=1).sum() * 2.0 / N
+    term_3 = 0.0
+    for start in range(0, N, chunk_size):
+        chunk = unit_samples[start : start + chunk_size]
+        chunk_centred = centred[start : start + chunk_size]
+        term_3 += np.prod(
+            1.0
+            + 0.5 * chunk_centred[:, np.newaxis, :]
+            + 0.5 * centred[np.newaxis, :, :]
+            - 0.5 * np.abs(chunk[:, np.newaxis, :] - unit_samples[np.newaxis, :, :]),
+            axis=2,
+        ).sum()
+    return float(term_1 - term_2 + term_3 / N**2)
+
+
+def design_quality(unit_samples, max_points=QUALITY_SAMPLE_SIZE, seed=0):
+    """
+    Space-filling quality report of a design in the unit hypercube.
+
+    Both measures cost O(N^2), so designs with more than `max_points` points are
+    assessed on a random subsample of `max_points` points.
+
+    Returns:
+        dict: Number of points and parameters, number of assessed points, centered L2
+            discrepancy and minimum pairwise distance of the (subsampled) design.
+    """
+    N = unit_samples.shape[0]
+    assessed = unit_samples
+    if N > max_points:
+        rows = get_rng(seed).choice(N, max_points, replace=False)
+        assessed = unit_samples[np.sort(rows)]
+    return {
+        "members": int(N),
+        "parameters": int(unit_samples.shape[1]),
+        "assessed_members": int(assessed.shape[0]),
+        "centered_l2_discrepancy": centered_discrepancy(assessed),
+        "min_pairwise_distance": min_pairwise_distance(assessed),
+    }
+
+
+def scale_to_ranges(unit_samples, new_params):
+    """
+    Scale samples from the unit hypercube to the min/max ranges of each parameter.
+
+    Args:
+        unit_samples (numpy.ndarray): N x P array of samples in [0, 1).
+        new_params (dict): P parameters with their [min, max] values, in column order.
+
+    Returns:
+        numpy.ndarray: N x P array of new BL values.
+    """
+    bounds = np.array([new_params[key][:2] for key in new_params], dtype=float)
+    return bounds[:, 0] + unit_samples * (bounds[:, 1] - bounds[:, 0])
+
+
+def perturb_values(defaults, key, new_bl_values, decimals=5):
+    """
+    Perturb a parameter for all PFTs for N new BL values at once.
+
+    Args:
+        defaults (list): Default values of the parameter for each PFT.
+        key (str): Name of the parameter, determines how the other PFTs are changed.
+        new_bl_values (numpy.ndarray): N new values for the BL PFT (or N deltas for
+            TLOW/TUPP).
+        decimals (int, optional): Number of decimals to round to. None keeps the values
+            unrounded. Defaults to 5.
+
+    Returns:
+        numpy.ndarray: N x (number of PFTs) array of perturbed values.
+    """
+    defaults = np.asarray(defaults, dtype=float)
+    new_bl_values = np.asarray(new_bl_values, dtype=float)[:, np.newaxis]
+    shape = (new_bl_values.shape[0], defaults.shape[0])
+
+    if key in PRO_RATA_KEYS:
+        values = defaults + (new_bl_values - defaults[0])
+    elif key in TREE_ONLY_KEYS:
+        values = np.broadcast_to(defaults, shape).copy()
+        values[:, TREE_PFTS] = new_bl_values
+    elif key in BROADCAST_KEYS:
+        values = np.broadcast_to(new_bl_values, shape).copy()
+    elif key in DELTA_KEYS:
+        values = defaults + new_bl_values
+    else:
+        values = np.broadcast_to(defaults, shape).copy()
+
+    if decimals is not None:
+        values = np.round(values, decimals)
+    return values
+
+
+def perturb_design(default_params, new_params, bl_values, decimals=5, unrounded=()):
+    """
+    Turn a design of new BL values into perturbed values for all PFTs.
+
+    Args:
+        default_params (dict): Default parameter values for each PFT.
+        new_params (dict): Parameters to perturb, in column order of `bl_values`.
+        bl_values (numpy.ndarray): N x P array of new BL values (or deltas).
+        decimals (int, optional): Number of decimals to round to. Defaults to 5.
+        unrounded (list, optional): Parameters that are not rounded (e.g. KAPS).
+
+    Returns:
+        dict: Parameter names mapped to N x (number of PFTs) arrays of new values.
+    """
+    design = {}
+    for col, key in enumerate(new_params):
+        key_decimals = None if key in unrounded else decimals
+        design[key] = perturb_values(
+            default_params[key], key, bl_values[:, col], key_decimals
+        )
+        if key in CO_VARYING_KEYS:
+            co_key = CO_VARYING_KEYS[key]
+            design[co_key] = perturb_values(
+                default_params[co_key],
+                co_key,
+                bl_values[:, col],
+                None if co_key in unrounded else decimals,
+            )
+    return design
+
+
+def generate_perturbed_params(
+    default_params,
+    new_params,
+    N,
+    strategy="random",
+    seed=None,
+    decimals=5,
+    unrounded=(),
+    quality=False,
+):
+    """
+    Generate N parameter sets with a space-filling design of the BL values.
+
+    Args:
+        default_params (dict): Default parameter values for each PFT.
+        new_params (dict): Parameters to perturb with their [min, max] BL values.
+        N (int): Number of parameter sets.
+        strategy (str, optional): Sampling strategy, one of "random", "lhs" (Latin
+            hypercube), "sobol" (scrambled Sobol) or "maximin" (maximin-optimised
+            Latin hypercube). Defaults to "random".
+        seed (int or numpy.random.SeedSequence, optional): Seed for a reproducible
+            design (see `get_rng`). Defaults to None.
+        decimals (int, optional): Number of decimals to round to. Defaults to 5.
+        unrounded (list, optional): Parameters that are not rounded (e.g. KAPS).
+        quality (bool, optional): Whether to assess the space-filling quality of the
+            design (see `design_quality`). Defaults to False, as it is much slower
+            than the sampling itself for large designs.
+
+    Returns:
+        tuple: (design, quality) with `design` mapping parameter names to
+            N x (number of PFTs) arrays of new values and `quality` the report of
+            `design_quality` for the design (None unless `quality` is set).
+    """
+    if strategy not in SAMPLERS:
+        raise ValueError(
+            f"Unknown sampling strategy '{strategy}', choose from {list(SAMPLERS)}"
+        )
+    # only sample the parameters with a non-zero range, the others are fixed anyway
+    varied = np.array([new_params[key][0] != new_params[key][1] for key in new_params])
+    unit_samples = np.zeros((N, len(new_params)))
+    unit_samples[:, varied] = SAMPLERS[strategy](N, int(varied.sum()), get_rng(seed))
+    bl_values = scale_to_ranges(unit_samples, new_params)
+    design = perturb_design(default_params, new_params, bl_values, decimals, unrounded)
+    if not quality:
+        return design, None
+    report = design_quality(unit_samples[:, varied])
+    report["strategy"] = strategy
+    return design, report
+
+
+def generate_random_perturbed_params(
+    default_params, new_params, N, seed=None, decimals=5, unrounded=()
+):
+    """
+    Generate N random parameter sets with uniformly distributed BL values.
+
+    Args:
+        default_params (dict): Default parameter values for each PFT.
+        new_params (dict): Parameters to perturb with their [min, max] BL values.
+        N (int): Number of parameter sets.
+        seed (int, optional): Seed for a reproducible design. Defaults to None.
+        decimals (int, optional): Number of decimals to round to. Defaults to 5.
+        unrounded (list, optional): Parameters that are not rounded (e.g. KAPS).
+
+    Returns:
+        dict: Parameter names mapped to N x (number of PFTs) arrays of new values.
+    """
+    design, _ = generate_perturbed_params(
+        default_params, new_params, N, "random", seed, decimals, unrounded
+    )
+    return design
+
+
+def design_to_records(design):
+    """
+    Convert a design into a list of parameter sets (one dict of lists per member).
+    """
+    keys = list(design)
+    columns = [design[key].tolist() for key in keys]
+    return [dict(zip(keys, values)) for values in zip(*columns)]
@@ -0,0 +1,289 @@
+import os
+import getpass
+import argparse
+import subprocess
+import collections
+import concurrent.futures
+
+from manifest import load_manifest
+from um_output import parse_um_filename, is_dump
+
+NOT_STARTED = "not_started"
+PENDING = "pending"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+STATUSES = [NOT_STARTED, PENDING, RUNNING, FINISHED, FAILED]
+
+# SLURM job states (squeue %t) of jobs that are still queued or running
+_PENDING_STATES = {"PD", "CF", "RQ", "RS", "S"}
+_RUNNING_STATES = {"R", "CG", "SO"}
+
+DatamScan = collections.namedtuple(
+    "DatamScan", ["exists", "n_files", "atmos_dump_years", "ocean_dump_years"]
+)
+
+JobStatus = collections.namedtuple(
+    "JobStatus", ["ensemble_id", "status", "year", "scheduler_state", "n_files"]
+)
+
+
+def slurm_job_name(expid):
+    """Name of the SLURM job of an ensemble member (as set by `clustersubmit`)."""
+    return f"{expid}000"
+
+
+class SqueueAdapter:
+    """
+    Query the state of all jobs of a user with a single `squeue` call.
+
+    Args:
+        user (str, optional): User whose jobs are queried. Defaults to the current user.
+        runner (callable, optional): Function that runs the command (list of arguments)
+            and returns its output, e.g. to replace `squeue` in tests or on machines
+            without SLURM. Defaults to running the command with `subprocess`.
+    """
+
+    def __init__(self, user=None, runner=None):
+        self.user = user or getpass.getuser()
+        self.runner = runner or self._run
+
+    @staticmethod
+    def _run(command):
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+        except FileNotFoundError:
+            raise RuntimeError(
+                f"'{command[0]}' not found, use --no_scheduler on machines without SLURM"
+            )
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(
+                f"'{' '.join(command)}' failed with exit code {e.returncode}: "
+                f"{(e.stderr or e.stdout or '').strip()}"
+            )
+        return result.stdout
+
+    def job_states(self):
+        """
+        Returns:
+            dict: Mapping of job names to their SLURM state (e.g. "R" or "PD").
+        """
+        output = self.runner(["squeue", "-h", "-u", self.user, "-o", "%j %t"])
+        states = {}
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) == 2:
+                states[fields[0]] = fields[1]
+        return states
+
+
+class NoScheduler:
+    """Scheduler adapter without any jobs, e.g. to check the output on BRIDGE."""
+
+    def job_states(self):
+        return {}
+
+
+def read_ensemble_ids(ids_file):
+    """
+    Read the ensemble IDs from a generated IDs log or a manifest (`.jsonl`) written by
+    `create_ensemble_jobs.py`.
+    """
+    if ids_file.endswith(".jsonl"):
+        return [
+            expid
+            for expid, digest in load_manifest(ids_file).items()
+            if digest is not None
+        ]
+    with open(ids_file, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def scan_datam(data_dir, expid):
+    """
+    Scan the `datam` directory of a job once.
+
+    Returns:
+        DatamScan: Whether the directory exists, the number of files in it and the years
+            of all atmosphere and ocean restart dumps.
+    """
+    atmos_years, ocean_years = set(), set()
+    n_files = 0
+    try:
+        with os.scandir(os.path.join(data_dir, expid, "datam")) as entries:
+            for entry in entries:
+                n_files += 1
+                output_file = parse_um_filename(entry.name)
+                if output_file is None or not is_dump(output_file):
+                    continue
+                if output_file.component == "a":
+                    atmos_years.add(output_file.year)
+                else:
+                    ocean_years.add(output_file.year)
+    except (FileNotFoundError, NotADirectoryError):
+        return DatamScan(False, 0, frozenset(), frozenset())
+    return DatamScan(True, n_files, frozenset(atmos_years), frozenset(ocean_years))
+
+
+def scan_all(data_dir, ids, threads=32):
+    """
+    Scan the `datam` directories of many jobs concurrently.
+
+    Returns:
+        dict: Mapping of ensemble IDs to their `DatamScan`.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        scans = executor.map(lambda expid: scan_datam(data_dir, expid), ids)
+        return dict(zip(ids, scans))
+
+
+def job_status(expid, scan, scheduler_state=None, target_year=None):
+    """
+    Classify a single job.
+
+    Args:
+        expid (str): Ensemble ID.
+        scan (DatamScan): Scan of the `datam` directory of the job.
+        scheduler_state (str, optional): SLURM state of the job, None if not queued.
+        target_year (int, optional): Model year a finished job must have reached,
+            jobs that stopped earlier are reported as failed.
+
+    Returns:
+        JobStatus: Status of the job. `year` is the last year with both an atmosphere
+            and ocean dump (or the last atmosphere dump), None without any dumps.
+    """
+    complete_years = scan.atmos_dump_years & scan.ocean_dump_years
+    if complete_years:
+        year = max(complete_years)
+    elif scan.atmos_dump_years:
+        year = max(scan.atmos_dump_years)
+    else:
+        year = None
+
+    if scheduler_state in _RUNNING_STATES:
+        status = RUNNING
+    elif scheduler_state in _PENDING_STATES:
+        status = PENDING
+    elif scan.n_files == 0:
+        status = NOT_STARTED
+    elif year is None or (target_year is not None and year < target_year):
+        status = FAILED
+    else:
+        status = FINISHED
+    return JobStatus(expid, status, year, scheduler_state, scan.n_files)
+
+
+def ensemble_status(ids, data_dir, scheduler, target_year=None, threads=32):
+    """
+    Status of all ensemble members in one pass: the scheduler is queried once and all
+    `datam` directories are scanned concurrently.
+
+    Args:
+        ids (list): Ensemble IDs.
+        data_dir (str): Directory with the output of each job (e.g. ~/dump2hold).
+        scheduler: Adapter with a `job_states()` method (see `SqueueAdapter`).
+        target_year (int, optional): Model year a finished job must have reached.
+        threads (int, optional): Number of threads to scan the directories.
+
+    Returns:
+        list: `JobStatus` of each member, in the order of `ids`.
+    """
+    job_states = scheduler.job_states()
+    scans = scan_all(data_dir, ids, threads)
+    return [
+        job_status(
+            expid, scans[expid], job_states.get(slurm_job_name(expid)), target_year
+        )
+        for expid in ids
+    ]
+
+
+def describe(job):
+    """Human-readable status, e.g. "finished to year 1890"."""
+    text = job.status.replace("_", " ")
+    if job.year is not None and job.status in (RUNNING, FINISHED, FAILED):
+        text += f" {'to' if job.status == FINISHED else 'at'} year {job.year}"
+    return text
+
+
+def format_status_table(statuses):
+    """Format the status of all members as a table with a summary line."""
+    lines = [f"{'ID':8s} {'STATUS':28s} FILES"]
+    for job in statuses:
+        lines.append(f"{job.ensemble_id:8s} {describe(job):28s} {job.n_files}")
+    counts = collections.Counter(job.status for job in statuses)
+    lines.append(
+        ", ".join(f"{counts[status]} {status.replace('_', ' ')}" for status in STATUSES)
+    )
+    return "\n".join(lines)
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the status scanner, also used by
+    `python -m ensemble status`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Show the status of all members of an ensemble."
+    )
+    parser.add_argument(
+        "--ids_file",
+        type=str,
+        required=True,
+        help="Log file of generated IDs or manifest (.jsonl) of create_ensemble_jobs.py",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.path.expanduser("~/dump2hold"),
+        help="Directory with the model output of each job (default: ~/dump2hold)",
+    )
+    parser.add_argument(
+        "--target_year",
+        type=int,
+        default=None,
+        help="Model year a finished job must have reached, earlier stops are failures",
+    )
+    parser.add_argument(
+        "--select",
+        type=str,
+        nargs="+",
+        choices=STATUSES,
+        default=None,
+        help="Only print the IDs of members with these statuses (one per line)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=32,
+        help="Number of threads to scan the output directories (default: 32)",
+    )
+    parser.add_argument("--user", type=str, default=None, help="User of the SLURM jobs")
+    parser.add_argument(
+        "--no_scheduler",
+        action="store_true",
+        help="Do not query SLURM, e.g. on machines without squeue",
+    )
+    args = parser.parse_args(argv)
+
+    scheduler = NoScheduler() if args.no_scheduler else SqueueAdapter(args.user)
+    try:
+        statuses = ensemble_status(
+            read_ensemble_ids(args.ids_file),
+            args.data_dir,
+            scheduler,
+            args.target_year,
+            args.threads,
+        )
+    except RuntimeError as e:
+        parser.error(str(e))
+    if args.select:
+        for job in statuses:
+            if job.status in args.select:
+                print(job.ensemble_id)
+    else:
+        print(format_status_table(statuses))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import shlex
+import argparse
+import threading
+import subprocess
+import concurrent.futures
+
+from status import SqueueAdapter, read_ensemble_ids, slurm_job_name
+
+SUBMITTED = "submitted"
+FAILED = "failed"
+
+
+def clustersubmit_command(queue="cpu", walltime="12:00:00", continue_run=False):
+    """
+    `clustersubmit` command to submit a job, "{id}" is replaced by the job ID.
+
+    Args:
+        queue (str, optional): SLURM partition. Defaults to "cpu".
+        walltime (str, optional): Wall time. Defaults to "12:00:00".
+        continue_run (bool, optional): Continue the run from its last restart dumps
+            (`-c y`) instead of starting a new run. Defaults to False.
+    """
+    return [
+        "clustersubmit",
+        *("-s", "y", "-c", "y" if continue_run else "n", "-a", "y", "-r", "bc4"),
+        *("-q", queue, "-w", walltime),
+        "{id}",
+    ]
+
+
+def run_command(command, timeout=600):
+    """
+    Run a submission command.
+
+    Raises:
+        RuntimeError: If the command fails, with its output as message.
+    """
+    try:
+        result = subprocess.run(
+            command, capture_output=True, text=True, timeout=timeout
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(str(e))
+    if result.returncode != 0:
+        output = (result.stderr or result.stdout).strip().splitlines()
+        raise RuntimeError(
+            f"exit code {result.returncode}: {output[-1] if output else ''}"
+        )
+    return result.stdout
+
+
+class SubmissionLedger:
+    """
+    Persistent record of all submissions of an ensemble.
+
+    The ledger is a JSON lines file with one entry per submission attempt outcome,
+    later entries override earlier ones. Every entry is flushed immediately, so an
+    interrupted run can be resumed and re-runs only resubmit the failed jobs.
+    """
+
+    def __init__(self, ledger_file):
+        self.ledger_file = ledger_file
+        self.entries = {}
+        if os.path.isfile(ledger_file):
+            with open(ledger_file, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line of an interrupted run might be incomplete
+                        continue
+                    self.entries[entry["ensemble_id"]] = entry
+        self._file = open(ledger_file, "a")
+        self._lock = threading.Lock()
+
+    def status(self, expid):
+        """Status of the last submission of a job, None if never submitted."""
+        entry = self.entries.get(expid)
+        return entry["status"] if entry else None
+
+    def record(self, expid, status, attempts, error=None):
+        entry = {
+            "ensemble_id": expid,
+            "status": status,
+            "attempts": attempts,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if error is not None:
+            entry["error"] = error
+        with self._lock:
+            self.entries[expid] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class QueueDepthGate:
+    """
+    Limit the number of queued (pending or running) jobs of the user.
+
+    The scheduler is queried at most once every `poll_interval` seconds, submissions in
+    between are counted locally.
+
+    Args:
+        scheduler: Adapter with a `job_states()` method (see `SqueueAdapter`).
+        max_queued (int): Maximum number of queued jobs of the user.
+        poll_interval (float, optional): Seconds between scheduler queries while the
+            queue is full. Defaults to 60.
+        sleep (callable, optional): Sleep function (replaced in tests).
+    """
+
+    def __init__(self, scheduler, max_queued, poll_interval=60, sleep=time.sleep):
+        self.scheduler = scheduler
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._queued = None
+
+    def acquire(self):
+        """Block until another job can be submitted, then reserve a slot for it."""
+        while True:
+            with self._lock:
+                if self._queued is None:
+                    self._queued = len(self.scheduler.job_states())
+                if self._queued < self.max_queued:
+                    self._queued += 1
+                    return
+                # queue is full, query the scheduler again after waiting
+                self._queued = None
+            self.sleep(self.poll_interval)
+
+    def release(self):
+        """Give back the slot of a submission that failed."""
+        with self._lock:
+            if self._queued:
+                self._queued -= 1
+
+
+def submit_job(
+    expid,
+    command,
+    runner=run_command,
+    retries=3,
+    backoff=30.0,
+    sleep=time.sleep,
+    scheduler=None,
+):
+    """
+    Submit a single job, retrying with exponential backoff.
+
+    A failed (e.g. timed out) submission might still have queued the job, so before
+    every retry the scheduler is asked for the SLURM job of `expid` and the job counts
+    as submitted if it is already queued.
+
+    Args:
+        expid (str): Job ID, replaces "{id}" in the command.
+        command (list): Command template (see `clustersubmit_command`).
+        runner (callable, optional): Runs the command, raises on failure.
+        retries (int, optional): Number of retries after the first attempt.
+        backoff (float, optional): Delay before the first retry in seconds, doubled for
+            every further retry. Defaults to 30.
+        sleep (callable, optional): Sleep function (replaced in tests).
+        scheduler (optional): Adapter with a `job_states()` method (see
+            `SqueueAdapter`) to check before a retry. Defaults to retrying without
+            checking.
+
+    Returns:
+        tuple: (success, number of attempts, last error message or None)
+    """
+    job_command = [arg.replace("{id}", expid) for arg in command]
+    error = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            sleep(backoff * 2 ** (attempt - 1))
+            if scheduler is not None:
+                try:
+                    if slurm_job_name(expid) in scheduler.job_states():
+                        return True, attempt, None
+                except RuntimeError:
+                    # scheduler not reachable, retrying is the best guess
+                    pass
+        try:
+            runner(job_command)
+            return True, attempt + 1, None
+        except RuntimeError as e:
+            error = str(e)
+    return False, retries + 1, error
+
+
+def submit_all(
+    ids,
+    command,
+    ledger,
+    concurrency=4,
+    gate=None,
+    runner=run_command,
+    retries=3,
+    backoff=30.0,
+    resubmit=False,
+    sleep=time.sleep,
+    scheduler=None,
+):
+    """
+    Submit many jobs with bounded concurrency.
+
+    Jobs that were already submitted successfully according to the ledger are skipped,
+    so re-running only resubmits the failed (or never submitted) jobs.
+
+    Args:
+        ids (list): Job IDs.
+        command (list): Command template with "{id}" (see `clustersubmit_command`).
+        ledger (SubmissionLedger): Record of all submissions.
+        concurrency (int, optional): Number of submissions running at the same time.
+        gate (QueueDepthGate, optional): Cap of the queued jobs of the user.
+        runner (callable, optional): Runs the command, raises on failure (injected to
+            test against a fake `clustersubmit`).
+        retries (int, optional): Number of retries of every submission.
+        backoff (float, optional): Delay before the first retry in seconds.
+        resubmit (bool, optional): Also submit jobs that were submitted before.
+        sleep (callable, optional): Sleep function (replaced in tests).
+        scheduler (optional): Adapter with a `job_states()` method to check if a job
+            is already queued before retrying its submission (see `submit_job`).
+
+    Returns:
+        dict: Number of "submitted", "failed" and "skipped" jobs.
+    """
+    todo = [expid for expid in ids if resubmit or ledger.status(expid) != SUBMITTED]
+    counts = {SUBMITTED: 0, FAILED: 0, "skipped": len(ids) - len(todo)}
+
+    def submit(expid):
+        if gate is not None:
+            gate.acquire()
+        success, attempts, error = submit_job(
+            expid, command, runner, retries, backoff, sleep, scheduler
+        )
+        if not success and gate is not None:
+            gate.release()
+        ledger.record(expid, SUBMITTED if success else FAILED, attempts, error)
+        return expid, success, attempts, error
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for expid, success, attempts, error in executor.map(submit, todo):
+            if success:
+                print(
+                    f"Submitted {expid}"
+                    + (f" ({attempts} attempts)" if attempts > 1 else "")
+                )
+                counts[SUBMITTED] += 1
+            else:
+                print(f"Failed to submit {expid} after {attempts} attempts: {error}")
+                counts[FAILED] += 1
+    return counts
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the submission queue, also used by
+    `python -m ensemble submit`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Submit all jobs of an ensemble."
+    )
+    parser.add_argument(
+        "--ids_file",
+        type=str,
+        required=True,
+        help="Log file of generated IDs or manifest (.jsonl) of create_ensemble_jobs.py",
+    )
+    parser.add_argument(
+        "--ledger",
+        type=str,
+        default=None,
+        help="Submission ledger (default: <ids_file without extension>_submissions.jsonl "
+        "or _continuations.jsonl with --continue_run)",
+    )
+    parser.add_argument(
+        "--queue", type=str, default="cpu", help="SLURM partition (default: cpu)"
+    )
+    parser.add_argument(
+        "--walltime",
+        type=str,
+        default="12:00:00",
+        help="Wall time of the jobs (default: 12:00:00)",
+    )
+    parser.add_argument(
+        "--continue_run",
+        action="store_true",
+        help="Continue the runs from their last restart dumps (clustersubmit -c y)",
+    )
+    parser.add_argument(
+        "--command",
+        type=str,
+        default=None,
+        help='Submission command with "{id}" for the job ID (default: clustersubmit)',
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of submissions at the same time (default: 4)",
+    )
+    parser.add_argument(
+        "--max_queued",
+        type=int,
+        default=None,
+        help="Maximum number of queued jobs of the user (default: no limit)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries of a failed submission (default: 3)",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=30.0,
+        help="Seconds before the first retry, doubled for every retry (default: 30)",
+    )
+    parser.add_argument(
+        "--resubmit",
+        action="store_true",
+        help="Also submit jobs that were submitted successfully before",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command is not None:
+        command = shlex.split(args.command)
+        if "{id}" not in args.command:
+            command.append("{id}")
+    else:
+        command = clustersubmit_command(args.queue, args.walltime, args.continue_run)
+    scheduler = SqueueAdapter()
+    gate = None
+    if args.max_queued is not None:
+        gate = QueueDepthGate(scheduler, args.max_queued)
+
+    # new runs and continuations are tracked in separate ledgers
+    ledger_name = "continuations" if args.continue_run else "submissions"
+    ledger_file = args.ledger or (
+        f"{os.path.splitext(args.ids_file)[0]}_{ledger_name}.jsonl"
+    )
+    ids = read_ensemble_ids(args.ids_file)
+    with SubmissionLedger(ledger_file) as ledger:
+        try:
+            counts = submit_all(
+                ids,
+                command,
+                ledger,
+                args.concurrency,
+                gate,
+                retries=args.retries,
+                backoff=args.backoff,
+                resubmit=args.resubmit,
+                scheduler=scheduler,
+            )
+        except RuntimeError as e:
+            parser.error(str(e))
+    print(
+        f"{counts[SUBMITTED]} jobs submitted, {counts[FAILED]} failed, "
+        f"{counts['skipped']} already submitted. Ledger saved to {ledger_file}."
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -4,9 +4,8 @@
 # logfile="./logs/xqaRd_generated_ids_20241028.log"
 logfile="./logs/XqArn_generated_ids_20241028.log"
 
-# Loop through each line in the log file
-while IFS= read -r experiment_id
-do
-  # Run the command with the current experiment ID
-  clustersubmit -s y -c n -a y -r bc4 -q cpu -w 12:00:00 "$experiment_id"
-done < "$logfile"
\ No newline at end of file
+# Submit all jobs with a few parallel submissions, retries of failed submissions and at
+# most 300 queued jobs at a time. Submissions are recorded in a ledger next to the log
+# file, so re-running this script only resubmits the jobs that failed.
+python -m ensemble submit --ids_file "$logfile" --queue cpu --walltime 12:00:00 \
+    --concurrency 4 --max_queued 300
@@ -0,0 +1,212 @@
+import json
+import time
+import math
+import contextlib
+import collections
+from datetime import datetime
+
+
+def percentile(values, q):
+    """
+    Percentile of a list of values with linear interpolation (same as the default of
+    `numpy.percentile`, without importing NumPy).
+
+    Args:
+        values (list): Values, in any order.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, None for an empty list.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Telemetry:
+    """
+    Timing spans of the stages of a run, written as JSON Lines events.
+
+    Every span is written as one event with the stage, the ensemble member (if any), the
+    start time and the duration in seconds, e.g.
+
+        {"event": "span", "stage": "duplicate", "member": "xqaba", "start": "...", "duration_s": 0.004}
+
+    and `summary` aggregates all spans at the end of the run.
+
+    Args:
+        events_file (str, optional): JSON Lines file of the events. Defaults to only
+            keeping the durations in memory.
+    """
+
+    def __init__(self, events_file=None):
+        self.events_file = events_file
+        self._events = open(events_file, "w") if events_file else None
+        self._start = time.perf_counter()
+        self.durations = collections.defaultdict(list)
+        self.member_durations = collections.defaultdict(float)
+        self.skipped = 0
+        self._summary = None
+
+    def _write(self, event):
+        if self._events is not None:
+            self._events.write(json.dumps(event) + "\n")
+
+    def record(self, stage, duration, member=None, start=None):
+        """
+        Record a span that was timed elsewhere (e.g. in a worker process).
+
+        Args:
+            stage (str): Name of the stage.
+            duration (float): Duration in seconds.
+            member (str, optional): ID of the ensemble member.
+            start (float, optional): Start of the span as a Unix timestamp. Defaults
+                to `duration` seconds ago.
+        """
+        self.durations[stage].append(duration)
+        if member is not None:
+            self.member_durations[member] += duration
+        if start is None:
+            start = time.time() - duration
+        self._write(
+            {
+                "event": "span",
+                "stage": stage,
+                "member": member,
+                "start": datetime.fromtimestamp(start).isoformat(),
+                "duration_s": round(duration, 6),
+            }
+        )
+
+    def skip(self, member):
+        """
+        Record an ensemble member that was skipped (e.g. unchanged since the last run),
+        so it is counted separately from the members that were built.
+        """
+        self.skipped += 1
+        self._write({"event": "skip", "member": member})
+
+    @contextlib.contextmanager
+    def span(self, stage, member=None):
+        """
+        Time the body of a `with` block as a span of `stage`.
+        """
+        start = time.time()
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - tic, member, start)
+
+    def summary(self, slowest=5):
+        """
+        Aggregate all spans of the run.
+
+        Args:
+            slowest (int, optional): Number of slowest members to report. Defaults to 5.
+
+        Returns:
+            dict: Wall time of the run, number of built members and their throughput
+                per second, number of skipped members, count, total, p50 and p95
+                duration of every stage and the slowest members with their total
+                duration.
+        """
+        wall_s = time.perf_counter() - self._start
+        members = len(self.member_durations)
+        return {
+            "wall_s": round(wall_s, 6),
+            "members": members,
+            "skipped": self.skipped,
+            "members_per_s": round(members / wall_s, 3) if wall_s > 0 else None,
+            "stages": {
+                stage: {
+                    "count": len(durations),
+                    "total_s": round(sum(durations), 6),
+                    "p50_s": round(percentile(durations, 50), 6),
+                    "p95_s": round(percentile(durations, 95), 6),
+                }
+                for stage, durations in self.durations.items()
+            },
+            "slowest_members": [
+                [member, round(duration, 6)]
+                for member, duration in sorted(
+                    self.member_durations.items(), key=lambda item: -item[1]
+                )[:slowest]
+            ],
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Write the summary as the last event and close the events file. Calling it
+        again only returns the summary.
+
+        Returns:
+            dict: The summary (see `summary`).
+        """
+        if self._summary is None:
+            self._summary = self.summary()
+            self._write(dict(event="summary", **self._summary))
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+        return self._summary
+
+
+def format_summary(summary):
+    """
+    Format the summary of a run as log lines.
+
+    Returns:
+        list: One line with the throughput, one per stage and one with the slowest
+            members.
+    """
+    lines = [
+        f"{summary['members']} ensemble members built and {summary['skipped']} "
+        f"skipped in {summary['wall_s']:.2f} s "
+        f"({summary['members_per_s'] or 0:.1f} built members/s)."
+    ]
+    for stage, stats in summary["stages"].items():
+        lines.append(
+            f"Stage {stage}: {stats['count']} spans, total {stats['total_s']:.3f} s, "
+            f"p50 {stats['p50_s'] * 1000:.2f} ms, p95 {stats['p95_s'] * 1000:.2f} ms"
+        )
+    if summary["slowest_members"]:
+        lines.append(
+            "Slowest members: "
+            + ", ".join(
+                f"{member} ({duration * 1000:.1f} ms)"
+                for member, duration in summary["slowest_members"]
+            )
+        )
+    return lines
+
+
+@contextlib.contextmanager
+def profiled(profile_file=None):
+    """
+    Profile the body of a `with` block with cProfile and save the statistics to
+    `profile_file` (e.g. for `python -m pstats` or snakeviz). Does nothing if
+    `profile_file` is None.
+    """
+    if profile_file is None:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
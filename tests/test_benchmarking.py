@@ -0,0 +1,238 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import REPO_DIR
+import benchmarking
+from benchmarking import (
+    COMPLETE,
+    NO_TEMPLATE,
+    QUEUED,
+    READY,
+    STOPPED,
+    WAITING,
+    BenchmarkStep,
+    BenchmarkSuite,
+    FakeSubmitter,
+    evaluate,
+    run_pass,
+)
+
+PARAM_FILE = os.path.join(
+    REPO_DIR, "input_params", "TOP20_LAND_CC_params_for_benchmarking.json"
+)
+
+STEPS = [
+    BenchmarkStep("1a", "spin-up", "xqapa", None, 0, 40),
+    BenchmarkStep("1b", "no template", None, None, 0, 200),
+    BenchmarkStep("1c", "missing template", "xqzzz", None, 0, 200),
+    BenchmarkStep("2a", "continuation", "xqapa", "1a", 40, 200),
+]
+
+
+class FakeRestarts:
+    """Restart index with a fixed set of (job ID, year) restarts."""
+
+    def __init__(self, restarts=()):
+        self.restarts = set(restarts)
+
+    def restarts_exist(self, expid, year):
+        return (expid, year) in self.restarts
+
+
+class FailingSubmitter(FakeSubmitter):
+    """Fake submitter that fails to submit some jobs."""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+
+    def submit(self, job_id):
+        if job_id in self.failing:
+            raise RuntimeError(f"Submitting {job_id} failed")
+        super().submit(job_id)
+
+
+@pytest.fixture
+def jobs_dir(tmp_path):
+    shutil.copytree(os.path.join(REPO_DIR, "vanilla_jobs", "xqapa"), tmp_path / "xqapa")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def params():
+    benchmark_params = benchmarking.load_benchmark_params(PARAM_FILE)
+    return {label: benchmark_params[label] for label in ["A", "B"]}
+
+
+def states(statuses):
+    return {status.job_id: status.state for status in statuses}
+
+
+def test_suite_order_and_years():
+    suite = BenchmarkSuite()
+    assert suite.order.index("1a") < suite.order.index("2a") < suite.order.index("3g")
+    assert suite.start_year("2a") == 1890
+    assert suite.end_year("5a") == 1850 + 40 + 200 + 200 + 100 + 200
+
+
+def test_suite_rejects_cycles():
+    with pytest.raises(ValueError, match="Cyclic"):
+        BenchmarkSuite(
+            [
+                BenchmarkStep("1a", "", None, "1b", 0, 10),
+                BenchmarkStep("1b", "", None, "1a", 0, 10),
+            ]
+        )
+
+
+def test_evaluate_states(jobs_dir):
+    suite = BenchmarkSuite(STEPS)
+    os.mkdir(os.path.join(jobs_dir, "xqbbB1a"))
+    restarts = FakeRestarts([("xqbbC1a", 1890), ("xqbbC2a", 2090)])
+    job_states = {"xqbbD1a000": "R"}
+    statuses = evaluate(suite, "xqbb", "ABCD", restarts, job_states, jobs_dir)
+    assert states(statuses) == {
+        "xqbbA1a": READY,
+        "xqbbA1b": NO_TEMPLATE,
+        "xqbbA1c": NO_TEMPLATE,
+        "xqbbA2a": WAITING,
+        "xqbbB1a": STOPPED,
+        "xqbbB1b": NO_TEMPLATE,
+        "xqbbB1c": NO_TEMPLATE,
+        "xqbbB2a": WAITING,
+        "xqbbC1a": COMPLETE,
+        "xqbbC1b": NO_TEMPLATE,
+        "xqbbC1c": NO_TEMPLATE,
+        "xqbbC2a": COMPLETE,
+        "xqbbD1a": QUEUED,
+        "xqbbD1b": NO_TEMPLATE,
+        "xqbbD1c": NO_TEMPLATE,
+        "xqbbD2a": WAITING,
+    }
+    details = {status.job_id: status.detail for status in statuses}
+    assert "xqzzz not found" in details["xqbbA1c"]
+
+
+def test_run_pass_creates_and_submits_ready_jobs(jobs_dir, params):
+    suite = BenchmarkSuite(STEPS)
+    restarts = FakeRestarts([("xqbbA1a", 1890)])
+    submitter = FakeSubmitter()
+    statuses, failures = run_pass(
+        suite, "xqbb", params, restarts, submitter, submitter, jobs_dir
+    )
+    assert failures == []
+    assert submitter.submitted == ["xqbbA2a", "xqbbB1a"]
+    assert os.path.isfile(os.path.join(jobs_dir, "xqbbA2a", "CNTLATM"))
+
+    # submitted jobs are queued on the next pass
+    statuses, failures = run_pass(
+        suite, "xqbb", params, restarts, submitter, submitter, jobs_dir, dry_run=True
+    )
+    assert states(statuses)["xqbbA2a"] == QUEUED
+    assert states(statuses)["xqbbB1a"] == QUEUED
+
+
+def test_run_pass_replaces_parameters(jobs_dir, params):
+    suite = BenchmarkSuite(STEPS)
+    submitter = FakeSubmitter()
+    run_pass(suite, "xqbb", params, FakeRestarts(), submitter, submitter, jobs_dir)
+    with open(os.path.join(jobs_dir, "xqbbB1a", "CNTLATM")) as f:
+        lines = f.read().splitlines()
+    group = params["B"]["params"]
+    start = lines.index(" &LAND_CC")
+    assert lines[start + 1 : start + len(group) - 1] == group[1:-1]
+    assert lines[start + len(group) - 1] == " &END"
+
+
+def test_run_pass_continues_after_failed_submission(jobs_dir, params):
+    suite = BenchmarkSuite(STEPS)
+    submitter = FailingSubmitter(["xqbbA1a"])
+    statuses, failures = run_pass(
+        suite, "xqbb", params, FakeRestarts(), submitter, submitter, jobs_dir
+    )
+    assert failures == ["Submitting xqbbA1a failed"]
+    assert submitter.submitted == ["xqbbB1a"]
+    # the job of the failed submission is removed and ready again
+    assert not os.path.exists(os.path.join(jobs_dir, "xqbbA1a"))
+    statuses, _ = run_pass(
+        suite,
+        "xqbb",
+        params,
+        FakeRestarts(),
+        submitter,
+        submitter,
+        jobs_dir,
+        dry_run=True,
+    )
+    assert states(statuses)["xqbbA1a"] == READY
+
+
+def test_run_pass_dry_run(jobs_dir, params):
+    suite = BenchmarkSuite(STEPS)
+    submitter = FakeSubmitter()
+    statuses, failures = run_pass(
+        suite,
+        "xqbb",
+        params,
+        FakeRestarts(),
+        submitter,
+        submitter,
+        jobs_dir,
+        None,
+        True,
+    )
+    assert states(statuses)["xqbbA1a"] == READY
+    assert submitter.submitted == []
+    assert sorted(os.listdir(jobs_dir)) == ["xqapa"]
+
+
+BLOCK = {
+    "description": "default parameters",
+    "params": [
+        "&LAND_CC",
+        " ALPHA=0.08,0.08,0.08,0.040,0.08,",
+        " F0=0.875,0.875,0.900,0.800,0.900,",
+        " G_AREA=0.004,0.004,0.10,0.10,0.05,",
+        " LAI_MIN=4.0,4.0,1.0,1.0,1.0,",
+        " NL0=0.050,0.030,0.060,0.030,0.030,",
+        " R_GROW=0.25,0.25,0.25,0.25,0.25,",
+        " TLOW=-0.0,-5.0,0.0,13.0,0.0,",
+        " TUPP=36.0,31.0,36.0,45.0,36.0,",
+        " Q10=2.0,",
+        " V_CRIT_ALPHA=0.343,",
+        " KAPS=5D-009,",
+        "&END",
+    ],
+}
+
+
+def with_line(line):
+    key = line.split("=")[0]
+    lines = [l for l in BLOCK["params"] if not l.startswith(f" {key}=")]
+    return dict(BLOCK, params=lines[:-1] + [f" {line}", "&END"])
+
+
+def test_validate_block():
+    block = benchmarking.validate_block("A", BLOCK)
+    assert block["group"] == "LAND_CC"
+    assert block["namelist"] == "CNTLATM"
+    assert block["values"]["KAPS"] == [5e-09]
+    assert block["params"][1] == " ALPHA=0.08,0.08,0.08,0.040,0.08,"
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ("ALPHA=0.08,0.08,0.08,", "ALPHA has 3 values, expected 5"),
+        ("Q10=abc,", "Q10 has non-numeric values"),
+        ("ALPHA=0.08,0.08,0.08,1.5,0.08,", "is above the maximum 1.0"),
+        ("KAPS=-5D-009,", "KAPS=.* is below the minimum"),
+        ("TLOW=0.0,-5.0,40.0,13.0,0.0,", "TLOW=.* is not below TUPP"),
+        ("NEW=1.0,", "unknown parameter NEW"),
+    ],
+)
+def test_validate_block_rejects_invalid_values(line, message):
+    with pytest.raises(ValueError, match=f"Invalid parameter block A: .*{message}"):
+        benchmarking.validate_block("A", with_line(line))
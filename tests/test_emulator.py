@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from adaptive_design import read_scores
+from emulator import GaussianProcess
+
+
+def test_fit_interpolates_training_data():
+    rng = np.random.default_rng(1)
+    X = rng.uniform(size=(30, 2))
+    y = np.sin(3 * X[:, 0]) + X[:, 1]
+    mean, std = GaussianProcess(n_candidates=16).fit(X, y).predict(X)
+    assert np.allclose(mean, y, atol=0.05)
+    assert (std < 0.1).all()
+
+
+def test_fit_failure_raises_value_error():
+    X = np.random.default_rng(1).uniform(size=(10, 2))
+    X[0, 0] = np.nan
+    with pytest.raises(ValueError, match="Emulator fit failed"):
+        GaussianProcess(n_candidates=4).fit(X, np.ones(10))
+    with pytest.raises(ValueError, match="Emulator fit failed"):
+        GaussianProcess().fit(X[1:], np.ones(9), np.ones(2), -10.0)
+
+
+def test_read_scores(tmp_path):
+    score_file = tmp_path / "scores.csv"
+    score_file.write_text("ensemble_id,npp,gpp\nxqaba,1.5,2\nxqabb,,3\nxqabc,nan,4\n")
+    assert read_scores(score_file) == {"xqaba": 1.5}
+    assert read_scores(score_file, "gpp") == {"xqaba": 2, "xqabb": 3, "xqabc": 4}
+    with pytest.raises(ValueError, match="no column cveg"):
+        read_scores(score_file, "cveg")
+
+
+@pytest.mark.parametrize(
+    "content, message",
+    [
+        ("", "is empty"),
+        ("ensemble_id\nxqaba\n", "no metric column"),
+        ("id,npp\nxqaba,1\n", "no ensemble_id column"),
+    ],
+)
+def test_read_scores_without_columns(tmp_path, content, message):
+    score_file = tmp_path / "scores.csv"
+    score_file.write_text(content)
+    with pytest.raises(ValueError, match=message):
+        read_scores(score_file)
@@ -0,0 +1,54 @@
+import os
+
+from conftest import REPO_DIR
+from fingerprint import parse_sections, verify_member
+from job_template import JobTemplate
+from namelist import Namelist
+
+VANILLA_JOB = os.path.join(REPO_DIR, "vanilla_jobs", "xqapa")
+
+RECORD = {"ensemble_id": "xqapb", "ALPHA": [0.1, 0.1, 0.1, 0.07, 0.1]}
+
+
+def make_member(tmp_path, record=RECORD):
+    template = JobTemplate(VANILLA_JOB)
+    job_dir = str(tmp_path / record["ensemble_id"])
+    template.materialise(job_dir)
+    cntlatm = Namelist.read(os.path.join(job_dir, "CNTLATM"))
+    cntlatm.update(
+        {key: value for key, value in record.items() if key != "ensemble_id"},
+        group="LAND_CC",
+    )
+    cntlatm.write()
+    return template, job_dir
+
+
+def test_parse_sections_ignores_formatting():
+    old = parse_sections("CNTLATM", b" &RUNCNST\n UD_FACTOR=1.0000, \n &END\n")
+    new = parse_sections("CNTLATM", b" &RUNCNST\n UD_FACTOR = 1.0000\n /\n")
+    assert old == new == {"&RUNCNST": {"UD_FACTOR": "1.0000"}}
+
+
+def test_verify_member_accepts_intended_parameters(tmp_path):
+    template, job_dir = make_member(tmp_path)
+    assert verify_member(template, job_dir, RECORD) == []
+
+
+def test_verify_member_reports_other_groups(tmp_path):
+    template, job_dir = make_member(tmp_path)
+    cntlatm = Namelist.read(os.path.join(job_dir, "CNTLATM"))
+    cntlatm.set("UD_FACTOR", 2.0, group="RUNCNST")
+    cntlatm.write()
+
+    differences = verify_member(template, job_dir, RECORD)
+    assert [(d.file, d.section, d.key) for d in differences] == [
+        ("CNTLATM", "&RUNCNST", "UD_FACTOR")
+    ]
+    assert differences[0].old == "1.0000"
+
+
+def test_verify_member_reports_wrong_parameter_value(tmp_path):
+    template, job_dir = make_member(tmp_path)
+    record = dict(RECORD, ALPHA=[0.2, 0.1, 0.1, 0.07, 0.1])
+    differences = verify_member(template, job_dir, record)
+    assert [(d.section, d.key) for d in differences] == [("&LAND_CC", "ALPHA")]
@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+from harvester import (
+    HarvestStore,
+    global_mean,
+    harvest_ensemble,
+    harvest_member,
+    read_pp_fields,
+)
+
+# missing data indicator of the UM, as stored in 32-bit pp files
+MDI = float(np.float32(-1.0e30))
+DIAGNOSTICS = {"veg_carbon": 19002, "soil_carbon": 19016}
+
+
+def pp_field(stash, data, zy=-92.5, dy=5.0, pseudo_level=0, lbpack=0):
+    """Header and data of a big-endian 32-bit pp field on a regular grid."""
+    data = np.asarray(data, dtype=">f4")
+    ints = np.zeros(45, dtype=">i4")
+    ints[17], ints[18] = data.shape
+    ints[20] = lbpack
+    ints[41], ints[42] = stash, pseudo_level
+    reals = np.zeros(19, dtype=">f4")
+    reals[58 - 45], reals[59 - 45], reals[62 - 45] = zy, dy, MDI
+    return ints.tobytes() + reals.tobytes(), data.tobytes()
+
+
+def write_pp(path, fields):
+    with open(path, "wb") as f:
+        for header, data in fields:
+            for record in (header, data):
+                marker = len(record).to_bytes(4, "big")
+                f.write(marker + record + marker)
+
+
+def make_member(data_dir, expid, years, value=1.0):
+    datam = data_dir / expid / "datam"
+    datam.mkdir(parents=True)
+    for year in years:
+        write_pp(
+            datam / f"{expid}a#pi00000{year}c1+",
+            [
+                pp_field(19002, np.full((2, 4), value), zy=-45.0, dy=30.0),
+                pp_field(3236, np.zeros((2, 4))),
+                pp_field(19016, np.full((2, 4), 2 * value), zy=-45.0, dy=30.0),
+            ],
+        )
+
+
+def test_read_selected_fields(tmp_path):
+    write_pp(
+        tmp_path / "pp",
+        [
+            pp_field(3236, np.zeros((3, 4))),
+            pp_field(19002, np.arange(12).reshape(3, 4)),
+        ],
+    )
+    fields = list(read_pp_fields(tmp_path / "pp", {19002}))
+    assert [field.stash for field in fields] == [19002]
+    assert fields[0].data.tolist() == np.arange(12).reshape(3, 4).tolist()
+    assert (fields[0].zy, fields[0].dy, fields[0].mdi) == (-92.5, 5.0, MDI)
+    assert len(list(read_pp_fields(tmp_path / "pp"))) == 2
+
+
+def test_truncated_file(tmp_path):
+    write_pp(tmp_path / "pp", [pp_field(19002, np.ones((3, 4)))])
+    content = (tmp_path / "pp").read_bytes()
+    (tmp_path / "pp").write_bytes(content[:-20])
+    with pytest.raises(ValueError, match="Truncated data"):
+        list(read_pp_fields(tmp_path / "pp", {19002}))
+    # skipped fields are checked against the file size as well
+    with pytest.raises(ValueError, match="Truncated data"):
+        list(read_pp_fields(tmp_path / "pp", {3236}))
+    (tmp_path / "pp").write_bytes(content[:100])
+    with pytest.raises(ValueError, match="Truncated header"):
+        list(read_pp_fields(tmp_path / "pp"))
+
+
+def test_packed_field(tmp_path):
+    write_pp(tmp_path / "pp", [pp_field(19002, np.ones((3, 4)), lbpack=1)])
+    with pytest.raises(ValueError, match="packed"):
+        list(read_pp_fields(tmp_path / "pp"))
+
+
+def test_not_a_pp_file(tmp_path):
+    (tmp_path / "pp").write_bytes(b"\x00\x00\x00\x10" + bytes(20))
+    with pytest.raises(ValueError, match="not a pp file"):
+        list(read_pp_fields(tmp_path / "pp"))
+
+
+def test_area_weighted_mean_without_missing_points(tmp_path):
+    # rows at 60S, 0 and 60N: cos weights 0.5, 1 and 0.5
+    data = np.array([[1.0, 1.0], [4.0, MDI], [MDI, MDI]])
+    write_pp(tmp_path / "pp", [pp_field(19002, data, zy=-120.0, dy=60.0)])
+    (field,) = read_pp_fields(tmp_path / "pp")
+    assert global_mean(field) == pytest.approx((0.5 * 1 + 0.5 * 1 + 1 * 4) / 2.0)
+
+    write_pp(tmp_path / "pp", [pp_field(19002, np.full((2, 2), MDI))])
+    (field,) = read_pp_fields(tmp_path / "pp")
+    assert np.isnan(global_mean(field))
+
+
+def test_harvest_member(tmp_path):
+    make_member(tmp_path, "xqaba", [1850, 1851])
+    write_pp(
+        tmp_path / "xqaba" / "datam" / "xqabaa#pi000001852c1+",
+        [pp_field(3236, np.zeros((2, 4)))],
+    )
+    years, warnings = harvest_member(tmp_path, "xqaba", DIAGNOSTICS, skip_years={1850})
+    assert sorted(years) == [1851]
+    assert years[1851]["veg_carbon"].tolist() == [1.0]
+    assert years[1851]["soil_carbon"].tolist() == [2.0]
+    assert len(warnings) == 1 and "Skipping year 1852" in warnings[0]
+    assert harvest_member(tmp_path, "xqabb", DIAGNOSTICS) == ({}, [])
+
+
+def test_second_run_adds_no_years(tmp_path):
+    make_member(tmp_path, "xqaba", [1850, 1851])
+    make_member(tmp_path, "xqabb", [1850], value=3.0)
+    store_file = str(tmp_path / "harvest.npz")
+
+    store = HarvestStore(store_file, DIAGNOSTICS)
+    new_years, warnings = harvest_ensemble(
+        ["xqaba", "xqabb"], str(tmp_path), store, workers=2
+    )
+    assert (new_years, warnings) == (3, [])
+    store.save()
+
+    store = HarvestStore(store_file, DIAGNOSTICS)
+    assert len(store) == 3
+    assert store.years("xqabb") == {1850}
+    assert harvest_ensemble(["xqaba", "xqabb"], str(tmp_path), store, workers=2) == (
+        0,
+        [],
+    )
+    with np.load(store_file) as saved:
+        assert saved["veg_carbon"][saved["ensemble_id"] == "xqabb"].tolist() == [[3.0]]
+
+
+def test_store_rejects_other_version_and_diagnostics(tmp_path):
+    store_file = str(tmp_path / "harvest.npz")
+    store = HarvestStore(store_file, DIAGNOSTICS)
+    store.add("xqaba", 1850, {"veg_carbon": np.array([1.0])})
+    store.save()
+    with pytest.raises(ValueError, match="diagnostics"):
+        HarvestStore(store_file, {"veg_carbon": 19002})
+
+    with np.load(store_file) as saved:
+        arrays = dict(saved)
+    arrays["version"] = np.array(0)
+    np.savez(store_file, **arrays)
+    with pytest.raises(ValueError, match="store version 0"):
+        HarvestStore(store_file, DIAGNOSTICS)
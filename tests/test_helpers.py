@@ -0,0 +1,43 @@
+import pytest
+
+from helpers import decode_ensemble_jobid, generate_ensemble_jobid, max_ensemble_size
+
+
+def test_legacy_ids_unchanged():
+    # IDs of existing ensembles must never change
+    assert generate_ensemble_jobid("xqau", 0) == "xqaua"
+    assert generate_ensemble_jobid("xqau", 25) == "xqauz"
+    assert generate_ensemble_jobid("xqau", 26) == "Xqaua"
+    assert generate_ensemble_jobid("xqau", 52) == "xQaua"
+    assert generate_ensemble_jobid("xqau", 259) == "XqauZ"
+
+
+@pytest.mark.parametrize("experiment_name", ["xqau", "xQbB"])
+def test_decode_inverts_generate(experiment_name):
+    size = max_ensemble_size(experiment_name)
+    ids = [generate_ensemble_jobid(experiment_name, i) for i in range(size)]
+    for index, jobid in enumerate(ids):
+        decoded = decode_ensemble_jobid(experiment_name, jobid)
+        # names with upper case characters generate some legacy IDs twice
+        assert ids[decoded] == jobid
+        assert decoded <= index
+
+
+def test_lower_case_ids_unique():
+    ids = [generate_ensemble_jobid("xqau", i) for i in range(max_ensemble_size("xqau"))]
+    assert len(ids) == 832
+    assert len(set(ids)) == len(ids)
+
+
+def test_generate_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        generate_ensemble_jobid("xqa", 0)
+    with pytest.raises(ValueError):
+        generate_ensemble_jobid("xqau", max_ensemble_size("xqau"))
+    with pytest.raises(ValueError):
+        generate_ensemble_jobid("xqau", -1)
+
+
+@pytest.mark.parametrize("jobid", ["xqbaa", "xqaua1", "xqau1", "xqa"])
+def test_decode_unknown_ids(jobid):
+    assert decode_ensemble_jobid("xqau", jobid) is None
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pytest
+
+from history_matching import implausibility, read_targets, screen
+from param_io import write_json
+
+DEFAULT_PARAMS = {"Q10": [2.0], "R_GROW": [0.25, 0.25, 0.25, 0.25, 0.25]}
+NEW_PARAMS = {"Q10": [1.5, 2.5], "R_GROW": [0.25, 0.25]}
+
+
+def test_read_targets(tmp_path):
+    targets_file = tmp_path / "targets.json"
+    targets_file.write_text(
+        json.dumps(
+            {
+                "npp": {"observed": 60, "variance": 4},
+                "cveg": {"observed": 450, "variance": 2500, "discrepancy": 100},
+            }
+        )
+    )
+    assert read_targets(targets_file) == {"npp": (60.0, 4.0), "cveg": (450.0, 2600.0)}
+
+    targets_file.write_text(json.dumps({"npp": {"observed": 60}}))
+    with pytest.raises(ValueError, match='Target npp needs a numeric "observed"'):
+        read_targets(targets_file)
+
+
+def test_implausibility():
+    np.testing.assert_allclose(
+        implausibility(np.array([10.0, 16.0]), np.array([0.0, 7.0]), 10.0, 9.0),
+        [0.0, 1.5],
+    )
+
+
+def test_screen_drops_implausible_candidates(tmp_path):
+    # earlier wave with a score that grows linearly with Q10
+    q10 = np.linspace(1.5, 2.5, 11)
+    records = [
+        dict(DEFAULT_PARAMS, Q10=[float(value)], ensemble_id=f"xqab{chr(97 + i)}")
+        for i, value in enumerate(q10)
+    ]
+    param_file = str(tmp_path / "xqab_updated_parameters.json")
+    write_json(param_file, records, DEFAULT_PARAMS)
+    score_file = tmp_path / "scores.csv"
+    score_file.write_text(
+        "ensemble_id,npp\n"
+        + "".join(f"{r['ensemble_id']},{10 * r['Q10'][0]}\n" for r in records)
+    )
+
+    candidates = [dict(DEFAULT_PARAMS, Q10=[value]) for value in (2.0, 2.05, 2.5)]
+    keep, report = screen(
+        DEFAULT_PARAMS,
+        NEW_PARAMS,
+        [param_file],
+        str(score_file),
+        {"npp": (20.0, 0.25)},
+        candidates,
+    )
+    assert keep.tolist() == [True, True, False]
+    assert report["kept"] == 2
+    assert report["rejected_fraction"] == pytest.approx(1 / 3)
+    assert report["metrics"]["npp"]["training_members"] == 11
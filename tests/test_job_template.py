@@ -0,0 +1,71 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import REPO_DIR
+from job_template import SUBSTITUTED_FILES, JobTemplate, id_substitutions
+
+
+@pytest.fixture
+def vanilla_job(tmp_path):
+    # copy the vanilla job so that the members are on the same file system
+    job_dir = tmp_path / "vanilla" / "xqapa"
+    shutil.copytree(os.path.join(REPO_DIR, "vanilla_jobs", "xqapa"), job_dir)
+    return str(job_dir)
+
+
+def string_replace(content, old_RUNID, new_RUNID):
+    # the consecutive `sed -e` replacements of `new_expt_letter`
+    for old, new in id_substitutions(old_RUNID, new_RUNID):
+        content = content.replace(old.encode(), new.encode())
+    return content
+
+
+def test_materialise_matches_string_replace(vanilla_job, tmp_path):
+    job_dir = tmp_path / "xqbcd"
+    JobTemplate(vanilla_job).materialise(str(job_dir))
+
+    for name in SUBSTITUTED_FILES:
+        with open(os.path.join(vanilla_job, name), "rb") as f:
+            original = f.read()
+        assert (job_dir / name).read_bytes() == string_replace(
+            original, "xqapa", "xqbcd"
+        )
+        assert (job_dir / f"{name}.ORIGINAL").read_bytes() == original
+    assert b"RUNID=xqbcd" in (job_dir / "SUBMIT").read_bytes()
+
+
+def test_only_substituted_files_are_rewritten(vanilla_job, tmp_path):
+    template = JobTemplate(vanilla_job)
+    job_dir = tmp_path / "xqbcd"
+    template.materialise(str(job_dir))
+
+    def same_inode(rel_path, src_path=None):
+        src = os.stat(os.path.join(vanilla_job, src_path or rel_path))
+        return src.st_ino == os.stat(job_dir / rel_path).st_ino
+
+    assert template.linked_files
+    assert all(same_inode(rel_path) for rel_path in template.linked_files)
+    for name in SUBSTITUTED_FILES:
+        assert not same_inode(name)
+        assert same_inode(f"{name}.ORIGINAL", name)
+
+
+def test_copy_mode_does_not_share_files(vanilla_job, tmp_path):
+    template = JobTemplate(vanilla_job, link_mode="copy")
+    job_dir = tmp_path / "xqbcd"
+    template.materialise(str(job_dir))
+    rel_path = template.linked_files[0]
+    src_path = os.path.join(vanilla_job, rel_path)
+    with open(src_path, "rb") as f:
+        assert (job_dir / rel_path).read_bytes() == f.read()
+    assert not os.path.samefile(src_path, job_dir / rel_path)
+
+
+def test_render_with_nul_bytes(tmp_path):
+    job_dir = tmp_path / "xqapa"
+    job_dir.mkdir()
+    (job_dir / "SUBMIT").write_bytes(b"RUNID=xqapa\0\nJOBID=a\n")
+    rendered = JobTemplate(str(job_dir)).render("xqbcd")
+    assert rendered == {"SUBMIT": b"RUNID=xqbcd\0\nJOBID=d\n"}
@@ -0,0 +1,89 @@
+import os
+import json
+import logging
+
+import pytest
+
+import create_ensemble_jobs
+import manifest
+from conftest import REPO_DIR
+from manifest import ManifestWriter, load_manifest, member_hash
+
+VANILLA_JOB = os.path.join(REPO_DIR, "vanilla_jobs", "xqapa")
+
+RECORDS = [
+    {"ALPHA": [0.07, 0.07, 0.07, 0.04, 0.07], "Q10": [2.0]},
+    {"ALPHA": [0.08, 0.08, 0.08, 0.05, 0.08], "Q10": [2.1]},
+    {"ALPHA": [0.09, 0.09, 0.09, 0.06, 0.09], "Q10": [2.2]},
+]
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    yield tmp_path
+    # setup_logging adds a file and a console handler on every run
+    for handler in root.handlers[len(handlers) :]:
+        handler.close()
+        root.removeHandler(handler)
+
+
+def test_member_hash_is_stable():
+    record = {"ALPHA": [0.1, 0.2], "Q10": [2.0]}
+    digest = member_hash("template", "xqaab", record)
+    assert digest == member_hash("template", "xqaab", dict(reversed(record.items())))
+    assert digest != member_hash("template", "xqaac", record)
+    assert digest != member_hash("other", "xqaab", record)
+    assert digest != member_hash("template", "xqaab", dict(record, Q10=[2.1]))
+
+
+def test_member_hash_covers_generator_version(monkeypatch):
+    digest = member_hash("template", "xqaab", {"Q10": [2.0]})
+    monkeypatch.setattr(manifest, "GENERATOR_VERSION", "0")
+    assert member_hash("template", "xqaab", {"Q10": [2.0]}) != digest
+
+
+def test_interrupted_manifest(tmp_path):
+    manifest_file = str(tmp_path / "manifest.jsonl")
+    writer = ManifestWriter(manifest_file)
+    writer.record("xqaab", "a")
+    writer.record("xqaac", None)
+    writer.record("xqaab", "b")
+    with open(manifest_file, "a") as f:
+        f.write('{"ensemble_id": "xqa')
+    assert load_manifest(manifest_file) == {"xqaab": "b", "xqaac": None}
+
+    writer.close()
+    with open(manifest_file) as f:
+        assert [json.loads(line) for line in f] == [
+            {"ensemble_id": "xqaab", "hash": "b"}
+        ]
+
+
+def test_incremental_skips_unchanged_members(home, caplog):
+    parameter_file = home / "params.json"
+    parameter_file.write_text(json.dumps(RECORDS))
+
+    def generate():
+        caplog.clear()
+        create_ensemble_jobs.main(
+            VANILLA_JOB, str(parameter_file), "xqzz", incremental=True
+        )
+        return [r.getMessage() for r in caplog.records if "finished" in r.getMessage()]
+
+    assert generate() == [
+        f"Generation of xqzz ensemble finished. 3 ensemble members have been created "
+        f"in {home / 'umui_jobs'}, 0 unchanged members were skipped."
+    ]
+
+    cntlatm = home / "umui_jobs" / "xqzzb" / "CNTLATM"
+    inode = os.stat(cntlatm).st_ino
+    parameter_file.write_text(json.dumps(RECORDS[:2] + [dict(RECORDS[2], Q10=[2.3])]))
+    assert generate() == [
+        f"Generation of xqzz ensemble finished. 1 ensemble members have been created "
+        f"in {home / 'umui_jobs'}, 2 unchanged members were skipped."
+    ]
+    assert os.stat(cntlatm).st_ino == inode
+    assert "Q10=2.3" in (home / "umui_jobs" / "xqzzc" / "CNTLATM").read_text()
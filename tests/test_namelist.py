@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from conftest import REPO_DIR
+from namelist import Namelist, format_value, parse_group_lines
+
+CNTLATM = os.path.join(REPO_DIR, "vanilla_jobs", "xqapa", "CNTLATM")
+
+LAND_CC = [
+    "&LAND_CC",
+    " ALPHA=0.1,0.1,0.1,0.07,0.1,",
+    " F0=0.875,0.875,0.900,0.800,0.900,",
+    " Q10=2.0,",
+    "&END",
+]
+
+
+def test_read_write_unchanged(tmp_path):
+    with open(CNTLATM, "rb") as f:
+        original = f.read()
+    Namelist.read(CNTLATM).write(tmp_path / "CNTLATM")
+    assert (tmp_path / "CNTLATM").read_bytes() == original
+
+
+def test_keeps_crlf_line_endings():
+    text = " &LAND_CC\r\n ALPHA=0.08,\r\n 0.08,\r\n Q10=2.0,\r\n &END\r\n"
+    nml = Namelist(text)
+    assert nml.render() == text
+    assert nml.set("ALPHA", [0.1, 0.2], group="land_cc")
+    assert nml.render() == " &LAND_CC\r\n ALPHA=0.1,0.2\r\n Q10=2.0,\r\n &END\r\n"
+
+
+def test_set_round_trip(tmp_path):
+    nml = Namelist.read(CNTLATM)
+    assert nml.set("ALPHA", [0.1, 0.1, 0.1, 0.07, 0.1], group="LAND_CC")
+    assert nml.update({"Q10": 2.5, "NOT_A_PARAMETER": 1}) == ["NOT_A_PARAMETER"]
+    nml.write(tmp_path / "CNTLATM")
+
+    reread = Namelist.read(tmp_path / "CNTLATM")
+    assert reread.groups == nml.groups
+    assert reread.render() == nml.render()
+    lines = reread.render().splitlines()
+    assert " ALPHA=0.1,0.1,0.1,0.07,0.1" in lines
+    assert " Q10=2.5" in lines
+    # only the two updated lines differ from the original file
+    original = Namelist.read(CNTLATM).render().splitlines()
+    assert len(lines) == len(original)
+    assert sum(a != b for a, b in zip(lines, original)) == 2
+
+
+def test_set_unknown_group():
+    nml = Namelist.read(CNTLATM)
+    assert not nml.set("ALPHA", [0.1], group="NO_SUCH_GROUP")
+    assert "ALPHA" in nml.keys("LAND_CC")
+
+
+def test_format_value():
+    assert format_value([0.1, 2, "x"]) == "0.1,2,x"
+    assert format_value(5e-9) == "5e-09"
+
+
+def test_replace_group_round_trip():
+    nml = Namelist.read(CNTLATM)
+    assert nml.replace_group("LAND_CC", LAND_CC)
+    lines = nml.render().splitlines()
+    start = lines.index(" &LAND_CC")
+    assert lines[start + 1 : start + 4] == LAND_CC[1:-1]
+    assert lines[start + 4] == " &END"
+    # all other groups are unchanged
+    assert nml.groups == Namelist.read(CNTLATM).groups
+    assert "KAPS" not in nml.keys("LAND_CC")
+    group, values = parse_group_lines(lines[start : start + 5])
+    assert group == "LAND_CC"
+    assert values["ALPHA"] == ["0.1", "0.1", "0.1", "0.07", "0.1"]
+
+
+def test_replace_group_rejects_incomplete_group():
+    nml = Namelist.read(CNTLATM)
+    with pytest.raises(ValueError):
+        nml.replace_group("LAND_CC", LAND_CC[:-1])
+    assert not nml.replace_group("NO_SUCH_GROUP", ["&NO_SUCH_GROUP", "&END"])
+
+
+def test_parse_group_lines_joins_continuation_lines():
+    group, values = parse_group_lines(["&LAND_CC", " ALPHA=0.1,0.2,", " 0.3,", "/"])
+    assert group == "LAND_CC"
+    assert values == {"ALPHA": ["0.1", "0.2", "0.3"]}
+    with pytest.raises(ValueError):
+        parse_group_lines(["&LAND_CC", " ALPHA=1,", " ALPHA=2,", "&END"])
+    with pytest.raises(ValueError):
+        parse_group_lines([" ALPHA=1,", "&END"])
@@ -0,0 +1,121 @@
+import os
+import json
+
+import pytest
+
+import param_io
+from conftest import REPO_DIR
+from param_io import (
+    ColumnarTable,
+    JsonArrayWriter,
+    export_json,
+    iter_records,
+    read_default_params,
+    write_columnar,
+    write_json,
+    write_jsonl,
+)
+
+PARAM_TABLE = os.path.join(REPO_DIR, "param_tables", "XQarc_csoil.json")
+
+DEFAULT_PARAMS = {"ALPHA": [0.08, 0.08, 0.08, 0.05, 0.08], "Q10": [2.0]}
+RECORDS = [
+    {"ALPHA": [0.1, 0.1, 0.1, 0.07, 0.1], "Q10": [2.1], "ensemble_id": "xqaab"},
+    {"ALPHA": [0.06, 0.06, 0.06, 0.03, 0.06], "Q10": [1.9], "KAPS": [5e-09]},
+]
+
+
+def test_streamed_json_matches_json_load(monkeypatch):
+    # small chunks so that records are split across chunk boundaries
+    monkeypatch.setattr(param_io, "_CHUNK_SIZE", 7)
+    with open(PARAM_TABLE) as f:
+        assert list(iter_records(PARAM_TABLE)) == json.load(f)
+
+
+@pytest.mark.parametrize("name", ["table.json", "table.jsonl"])
+def test_round_trip(tmp_path, name):
+    filename = str(tmp_path / name)
+    param_io.write_param_table(filename, iter(RECORDS), DEFAULT_PARAMS)
+    assert list(iter_records(filename)) == [DEFAULT_PARAMS] + RECORDS
+    assert read_default_params(filename) == DEFAULT_PARAMS
+
+
+def test_export_json_restores_original(tmp_path):
+    records = iter_records(PARAM_TABLE)
+    default_params = next(records)
+    write_jsonl(str(tmp_path / "table.jsonl"), records, default_params)
+    export_json(str(tmp_path / "table.jsonl"), str(tmp_path / "table.json"))
+    with open(PARAM_TABLE, "rb") as f:
+        assert (tmp_path / "table.json").read_bytes() == f.read()
+
+
+@pytest.mark.parametrize("text", ['[{"Q10": [2.0]} {"Q10": [2.1]}]', '{"Q10": 2}'])
+def test_invalid_json_raises(tmp_path, text):
+    (tmp_path / "table.json").write_text(text)
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_records(str(tmp_path / "table.json")))
+
+
+@pytest.mark.parametrize("items", [[], RECORDS])
+def test_json_array_writer_matches_json_dump(tmp_path, items):
+    with JsonArrayWriter(str(tmp_path / "items.json")) as writer:
+        for item in items:
+            writer.write(item)
+    assert (tmp_path / "items.json").read_text() == json.dumps(items, indent=4)
+    assert not (tmp_path / "items.json.tmp").exists()
+
+
+def test_write_json_format(tmp_path):
+    write_json(str(tmp_path / "table.json"), RECORDS[:1], DEFAULT_PARAMS)
+    assert (tmp_path / "table.json").read_text().splitlines()[:4] == [
+        "[",
+        "    {",
+        '      "ALPHA": [0.08, 0.08, 0.08, 0.05, 0.08],',
+        '      "Q10": [2.0]',
+    ]
+
+
+def test_columnar_round_trip(tmp_path, monkeypatch):
+    # several chunks when writing and iterating
+    monkeypatch.setattr(param_io, "_COLUMNAR_CHUNK", 3)
+    records = list(iter_records(PARAM_TABLE))
+    filename = str(tmp_path / "table.ptab")
+    param_io.write_param_table(filename, iter(records[1:]), records[0])
+
+    assert list(iter_records(filename)) == records
+    table = ColumnarTable(filename)
+    assert len(table) == len(records)
+    assert table.keys == list(records[0])
+    assert table.width("ALPHA") == 5
+    assert table.record(4) == records[4]
+    assert table.column("Q10", pft=0).tolist() == [r["Q10"][0] for r in records]
+
+
+def test_columnar_scalars(tmp_path):
+    filename = str(tmp_path / "table.ptab")
+    write_columnar(filename, [{"N": 1, "Q10": [2.0]}, {"N": 2, "Q10": [2.5]}])
+    assert list(iter_records(filename)) == [
+        {"N": 1.0, "Q10": [2.0]},
+        {"N": 2.0, "Q10": [2.5]},
+    ]
+    assert os.listdir(tmp_path) == ["table.ptab"]
+
+
+@pytest.mark.parametrize(
+    "records, message",
+    [
+        ([], "empty"),
+        ([{"Q10": [2.0]}, {"KAPS": [5e-09]}], "has keys"),
+        ([{"ALPHA": [0.1, 0.1]}, {"ALPHA": [0.1]}], "Expected 2 values"),
+    ],
+)
+def test_columnar_invalid_records(tmp_path, records, message):
+    with pytest.raises(ValueError, match=message):
+        write_columnar(str(tmp_path / "table.ptab"), records)
+    assert os.listdir(tmp_path) == []
+
+
+def test_not_a_columnar_table(tmp_path):
+    (tmp_path / "table.ptab").write_bytes(b"[]")
+    with pytest.raises(ValueError, match="Not a columnar parameter table"):
+        ColumnarTable(str(tmp_path / "table.ptab"))
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from conftest import REPO_DIR
+from provisioning import ProvisioningError, estimate_member_bytes, provision_storage
+
+IDS = ["xqaab", "xqaac", "xqaad", "xqaae"]
+
+
+def test_provision_storage(tmp_path):
+    storage_dir, link_dir = tmp_path / "storage", tmp_path / "dump2hold"
+    report = provision_storage(IDS[:2], str(storage_dir), str(link_dir))
+    assert (report["created"], report["existing"]) == (2, 0)
+    assert os.readlink(link_dir / "xqaab") == str(storage_dir / "xqaab")
+    assert (link_dir / "xqaac").is_dir()
+
+    report = provision_storage(IDS, str(storage_dir), str(link_dir))
+    assert (report["created"], report["existing"]) == (2, 2)
+    assert sorted(os.listdir(link_dir)) == IDS
+
+
+def test_rollback_after_partial_failure(tmp_path):
+    storage_dir, link_dir = tmp_path / "storage", tmp_path / "dump2hold"
+    storage_dir.mkdir()
+    # a file in place of the storage directory of the third member
+    (storage_dir / "xqaad").write_text("")
+
+    with pytest.raises(ProvisioningError, match="rolled back"):
+        provision_storage(IDS, str(storage_dir), str(link_dir))
+    assert os.listdir(storage_dir) == ["xqaad"]
+    assert os.listdir(link_dir) == []
+
+
+def test_conflicting_links(tmp_path):
+    storage_dir, link_dir = tmp_path / "storage", tmp_path / "dump2hold"
+    link_dir.mkdir()
+    (link_dir / "xqaac").mkdir()
+    os.symlink(tmp_path / "elsewhere", link_dir / "xqaad")
+
+    with pytest.raises(ProvisioningError, match="2 conflicting entries") as e:
+        provision_storage(IDS, str(storage_dir), str(link_dir))
+    assert "xqaac exists and is not a link" in str(e.value)
+    assert not storage_dir.exists()
+
+
+def test_insufficient_space(tmp_path):
+    storage_dir, link_dir = tmp_path / "storage", tmp_path / "dump2hold"
+    with pytest.raises(ProvisioningError, match="exceeds the free space"):
+        provision_storage(IDS, str(storage_dir), str(link_dir), member_bytes=1 << 60)
+    assert not storage_dir.exists() and not link_dir.exists()
+
+
+def test_dry_run(tmp_path):
+    report = provision_storage(
+        IDS, str(tmp_path / "storage"), str(tmp_path / "dump2hold"), dry_run=True
+    )
+    assert report["created"] == 4
+    assert os.listdir(tmp_path) == []
+
+
+def test_estimate_member_bytes():
+    vanilla_job = os.path.join(REPO_DIR, "vanilla_jobs", "xqapa")
+    one_year = estimate_member_bytes(vanilla_job, years=1)
+    assert one_year > 0
+    assert estimate_member_bytes(vanilla_job, years=2) > one_year
+    assert estimate_member_bytes(vanilla_job, years=1, retained_dumps=0) < one_year
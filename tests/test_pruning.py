@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from pruning import DEFAULT_RULES, PruneRule, parse_rule, plan_job
+
+
+def make_datam(data_dir, expid, names):
+    datam = os.path.join(data_dir, expid, "datam")
+    os.makedirs(datam)
+    for name in names:
+        with open(os.path.join(datam, name), "w") as f:
+            f.write("x")
+
+
+def planned(plan):
+    return sorted(os.path.basename(path) for path, _ in plan.delete)
+
+
+def test_parse_rule():
+    assert parse_rule("?da:keep_last=10,keep_every=50") == PruneRule("?da", 10, 50)
+    assert parse_rule("?p[abcdf]:keep_last=0") == PruneRule("?p[abcdf]", 0, None)
+    assert parse_rule("apy") == PruneRule("apy", None, None)
+    with pytest.raises(ValueError):
+        parse_rule("?da:keep=10")
+
+
+def test_default_rules(tmp_path):
+    dumps = [f"xqaba{c}#da00000{year}c1+" for c in "ao" for year in range(1850, 1865)]
+    pp = ["xqabaa#pa000001850c1+", "xqabao#pf000001850c1+", "xqabaa#pi000001850c1+"]
+    make_datam(tmp_path, "xqaba", dumps + pp + ["xqaba.astart", "notes.txt"])
+    plan = plan_job(str(tmp_path), "xqaba", DEFAULT_RULES)
+    # the pp streams a-f and all but the last 10 years of the dumps are deleted
+    expected = pp[:2] + [
+        f"xqaba{c}#da00000{year}c1+" for c in "ao" for year in range(1850, 1855)
+    ]
+    assert planned(plan) == sorted(expected)
+    # stream i, the last 10 years of dumps and all other files are kept
+    assert plan.n_kept == 1 + 20 + 2
+
+
+def test_first_matching_rule_decides(tmp_path):
+    names = [f"xqabaa#da00000{year}c1+" for year in (1850, 1900, 1949, 1950)]
+    make_datam(tmp_path, "xqaba", names)
+    rules = [PruneRule("ada", 1, 50), PruneRule("?da", 0, None)]
+    plan = plan_job(str(tmp_path), "xqaba", rules)
+    assert planned(plan) == ["xqabaa#da000001949c1+"]
+
+    rules = [PruneRule("?da", 0, None), PruneRule("ada", 1, 50)]
+    plan = plan_job(str(tmp_path), "xqaba", rules)
+    assert planned(plan) == sorted(names)
+
+
+def test_files_without_rule_are_kept(tmp_path):
+    make_datam(tmp_path, "xqaba", ["xqabaa#pj000001850c1+", "xqabaa#da000001850c1+"])
+    plan = plan_job(str(tmp_path), "xqaba", [PruneRule("?p[a-f]", 0, None)])
+    assert plan.delete == []
+    assert plan.n_kept == 2
+
+
+def test_missing_job(tmp_path):
+    assert plan_job(str(tmp_path), "xqaba", DEFAULT_RULES) == ("xqaba", [], 0)
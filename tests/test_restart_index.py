@@ -0,0 +1,69 @@
+import os
+import time
+
+from restart_index import RestartIndex
+
+
+def make_datam(data_dir, expid, names, age=60):
+    datam = data_dir / expid / "datam"
+    datam.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (datam / name).touch()
+    # pretend that the directory was last modified `age` seconds ago
+    mtime = time.time() - age
+    os.utime(datam, (mtime, mtime))
+    return datam
+
+
+def test_restart_years(tmp_path):
+    make_datam(
+        tmp_path,
+        "xqaab",
+        [
+            "xqaaba#da000001850c1+",
+            "xqaaba#da000001860c1+",
+            "xqaabo#da000001850c1+",
+            "xqaaba#pa000001850c1+",
+            "notes.txt",
+        ],
+    )
+    index = RestartIndex(str(tmp_path / "index.json"), str(tmp_path))
+    assert index.update(["xqaab", "xqaac"]) == 2
+    assert index.years("xqaab") == [1850, 1860]
+    assert index.files("xqaab", "apa") == ["xqaaba#pa000001850c1+"]
+    assert index.latest_restart_year("xqaab") == 1850
+    assert not index.restarts_exist("xqaab", 1860)
+    assert index.latest_restart_year("xqaac") is None
+
+
+def test_unchanged_directories_are_not_rescanned(tmp_path):
+    datam = make_datam(tmp_path, "xqaab", ["xqaaba#da000001850c1+"])
+    index_file = str(tmp_path / "index.json")
+    assert RestartIndex(index_file, str(tmp_path)).update(["xqaab"]) == 1
+
+    index = RestartIndex(index_file, str(tmp_path))
+    assert index.update(["xqaab"]) == 0
+    (datam / "xqaabo#da000001850c1+").touch()
+    assert index.update(["xqaab"]) == 1
+    assert index.restarts_exist("xqaab", 1850)
+
+
+def test_recently_modified_directories_are_rescanned(tmp_path):
+    datam = make_datam(tmp_path, "xqaab", ["xqaaba#da000001850c1+"], age=0)
+    index = RestartIndex(str(tmp_path / "index.json"), str(tmp_path))
+    assert index.update(["xqaab"]) == 1
+    assert index.jobs["xqaab"]["mtime_ns"] is None
+
+    # a file created within the same mtime tick does not change the mtime
+    mtime_ns = os.stat(datam).st_mtime_ns
+    (datam / "xqaabo#da000001850c1+").touch()
+    os.utime(datam, ns=(mtime_ns, mtime_ns))
+    assert index.update(["xqaab"]) == 1
+    assert index.restarts_exist("xqaab", 1850)
+
+
+def test_index_of_other_data_dir_is_ignored(tmp_path):
+    make_datam(tmp_path, "xqaab", ["xqaaba#da000001850c1+"])
+    index_file = str(tmp_path / "index.json")
+    RestartIndex(index_file, str(tmp_path)).update(["xqaab"])
+    assert RestartIndex(index_file, str(tmp_path / "other")).jobs == {}
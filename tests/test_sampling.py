@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from sampling import (
+    design_quality,
+    generate_perturbed_params,
+    get_rng,
+    latin_hypercube,
+    maximin_latin_hypercube,
+    perturb_values,
+)
+
+DEFAULTS = {
+    "ALPHA": [0.08, 0.08, 0.08, 0.05, 0.08],
+    "LAI_MIN": [4.0, 4.0, 1.0, 1.0, 1.0],
+    "R_GROW": [0.25, 0.25, 0.25, 0.25, 0.25],
+    "TLOW": [0.0, -5.0, 0.0, 13.0, 0.0],
+    "TUPP": [36.0, 31.0, 36.0, 45.0, 36.0],
+    "KAPS": [5.0e-09],
+}
+
+RANGES = {
+    "ALPHA": [0.04, 0.16],
+    "LAI_MIN": [2.0, 4.0],
+    "R_GROW": [0.15, 0.30],
+    "TLOW": [-5.0, 5.0],
+    "KAPS": [2.5e-09, 7.5e-09],
+}
+
+
+@pytest.mark.parametrize(
+    "key, expected",
+    [
+        ("ALPHA", [[0.1, 0.1, 0.1, 0.07, 0.1], [0.04, 0.04, 0.04, 0.01, 0.04]]),
+        ("LAI_MIN", [[0.1, 0.1, 1.0, 1.0, 1.0], [0.04, 0.04, 1.0, 1.0, 1.0]]),
+        ("R_GROW", [[0.1] * 5, [0.04] * 5]),
+        ("TLOW", [[0.1, -4.9, 0.1, 13.1, 0.1], [0.04, -4.96, 0.04, 13.04, 0.04]]),
+    ],
+)
+def test_perturb_values(key, expected):
+    np.testing.assert_allclose(
+        perturb_values(DEFAULTS[key], key, [0.1, 0.04]), expected
+    )
+
+
+def test_perturb_values_rounding():
+    assert perturb_values([0.08], "ALPHA", [0.1234567])[0, 0] == 0.12346
+    assert perturb_values([0.08], "ALPHA", [0.1234567], None)[0, 0] == 0.1234567
+    assert perturb_values([5.0e-09], "KAPS", [3.0e-09], 5)[0, 0] == 0.0
+
+
+@pytest.mark.parametrize("strategy", ["random", "lhs", "maximin"])
+def test_design_within_bounds(strategy):
+    design, _ = generate_perturbed_params(
+        DEFAULTS, RANGES, 200, strategy, seed=1, unrounded=["KAPS"]
+    )
+    for key, (low, high) in RANGES.items():
+        values = design[key]
+        assert values.shape == (200, len(DEFAULTS[key]))
+        if key == "TLOW":
+            deltas = values - DEFAULTS[key]
+            assert np.all((deltas >= low) & (deltas <= high))
+            # TUPP is shifted by the same delta
+            np.testing.assert_allclose(design["TUPP"] - DEFAULTS["TUPP"], deltas)
+        else:
+            assert np.all((values[:, 0] >= low) & (values[:, 0] <= high))
+    assert np.all(design["LAI_MIN"][:, 2:] == 1.0)
+    assert len(np.unique(design["KAPS"])) == 200
+
+
+def test_fixed_parameters_are_not_sampled():
+    ranges = dict(RANGES, R_GROW=[0.2, 0.2])
+    design, _ = generate_perturbed_params(DEFAULTS, ranges, 10, seed=1)
+    assert np.all(design["R_GROW"] == 0.2)
+
+
+def test_latin_hypercube_strata():
+    design = latin_hypercube(20, 3, get_rng(0))
+    for column in design.T:
+        assert sorted(np.floor(column * 20).astype(int)) == list(range(20))
+
+
+def test_maximin_beats_latin_hypercube():
+    lhs = design_quality(latin_hypercube(30, 4, get_rng(0)))
+    maximin = design_quality(maximin_latin_hypercube(30, 4, get_rng(0)))
+    # the first candidate of the maximin design is the plain Latin hypercube
+    assert maximin["min_pairwise_distance"] > lhs["min_pairwise_distance"]
+
+
+def test_design_quality_subsample():
+    report = design_quality(get_rng(0).random((100, 2)), max_points=40)
+    assert (report["members"], report["assessed_members"]) == (100, 40)
+    assert report == design_quality(get_rng(0).random((100, 2)), max_points=40)
+
+
+def test_spawned_seeds_give_different_designs():
+    seeds = np.random.SeedSequence(1).spawn(2)
+    designs = [
+        generate_perturbed_params(DEFAULTS, RANGES, 10, "maximin", seed)[0]["ALPHA"]
+        for seed in seeds
+    ]
+    assert not np.array_equal(*designs)
+    again = generate_perturbed_params(
+        DEFAULTS, RANGES, 10, "maximin", np.random.SeedSequence(1).spawn(2)[0]
+    )[0]["ALPHA"]
+    np.testing.assert_array_equal(designs[0], again)
@@ -0,0 +1,19 @@
+import sys
+
+import pytest
+
+from status import SqueueAdapter, slurm_job_name
+
+
+def test_job_states():
+    scheduler = SqueueAdapter(
+        user="ensemble", runner=lambda command: "xqaba000 R\nxqabb000 PD\n\n"
+    )
+    assert scheduler.job_states() == {"xqaba000": "R", "xqabb000": "PD"}
+    assert slurm_job_name("xqaba") in scheduler.job_states()
+
+
+def test_failed_query_raises_runtime_error():
+    command = [sys.executable, "-c", "import sys; sys.exit('Socket timed out')"]
+    with pytest.raises(RuntimeError, match="exit code 1: Socket timed out"):
+        SqueueAdapter._run(command)
@@ -0,0 +1,157 @@
+import pytest
+
+from status import slurm_job_name
+from submission import (
+    FAILED,
+    SUBMITTED,
+    QueueDepthGate,
+    SubmissionLedger,
+    clustersubmit_command,
+    submit_all,
+    submit_job,
+)
+
+
+class FakeClustersubmit:
+    """Fake `clustersubmit` runner that fails the first `failures` calls of a job."""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.queued = []
+
+    def __call__(self, command):
+        expid = command[-1]
+        self.calls.append(expid)
+        if self.failures.get(expid, 0) > 0:
+            self.failures[expid] -= 1
+            raise RuntimeError("exit code 1: sbatch: error: Socket timed out")
+        self.queued.append(expid)
+        return f"Submitted batch job {len(self.queued)}"
+
+    def job_states(self):
+        return {slurm_job_name(expid): "PD" for expid in self.queued}
+
+
+def test_clustersubmit_command():
+    command = clustersubmit_command("veryshort", "6:00:00", continue_run=True)
+    assert command[:5] == ["clustersubmit", "-s", "y", "-c", "y"]
+    assert command[-5:] == ["-q", "veryshort", "-w", "6:00:00", "{id}"]
+
+
+def test_submit_job_retries_with_exponential_backoff():
+    runner = FakeClustersubmit({"xqaba": 3})
+    delays = []
+    success, attempts, error = submit_job(
+        "xqaba", ["clustersubmit", "{id}"], runner, 3, 30.0, delays.append
+    )
+    assert (success, attempts, error) == (True, 4, None)
+    assert delays == [30.0, 60.0, 120.0]
+    assert runner.calls == ["xqaba"] * 4
+
+
+def test_submit_job_gives_up_after_retries():
+    runner = FakeClustersubmit({"xqaba": 5})
+    delays = []
+    success, attempts, error = submit_job(
+        "xqaba", ["clustersubmit", "{id}"], runner, 2, 1.0, delays.append
+    )
+    assert not success
+    assert attempts == 3
+    assert "Socket timed out" in error
+    assert delays == [1.0, 2.0]
+
+
+def test_submit_job_checks_queue_before_retry():
+    runner = FakeClustersubmit()
+
+    def timed_out(command):
+        # the job is queued, but the submission command still fails
+        runner(command)
+        raise RuntimeError("timed out")
+
+    success, attempts, _ = submit_job(
+        "xqaba", ["clustersubmit", "{id}"], timed_out, 3, 1.0, lambda s: None, runner
+    )
+    assert (success, attempts) == (True, 1)
+    assert runner.queued == ["xqaba"]
+
+
+def test_ledger_skips_submitted_jobs_on_rerun(tmp_path, capsys):
+    ids = ["xqaba", "xqabb", "xqabc"]
+    ledger_file = tmp_path / "ledger.jsonl"
+    runner = FakeClustersubmit({"xqabb": 10})
+    with SubmissionLedger(ledger_file) as ledger:
+        counts = submit_all(
+            ids, ["{id}"], ledger, 2, runner=runner, retries=1, sleep=lambda s: None
+        )
+    assert counts == {SUBMITTED: 2, FAILED: 1, "skipped": 0}
+
+    # a re-run only resubmits the failed job
+    runner = FakeClustersubmit()
+    with SubmissionLedger(ledger_file) as ledger:
+        assert ledger.status("xqaba") == SUBMITTED
+        assert ledger.status("xqabb") == FAILED
+        counts = submit_all(ids, ["{id}"], ledger, 2, runner=runner)
+    assert counts == {SUBMITTED: 1, FAILED: 0, "skipped": 2}
+    assert runner.calls == ["xqabb"]
+    assert SubmissionLedger(ledger_file).status("xqabb") == SUBMITTED
+
+
+def test_ledger_ignores_incomplete_last_line(tmp_path):
+    ledger_file = tmp_path / "ledger.jsonl"
+    with SubmissionLedger(ledger_file) as ledger:
+        ledger.record("xqaba", SUBMITTED, 1)
+    with open(ledger_file, "a") as f:
+        f.write('{"ensemble_id": "xqabb", "sta')
+    with SubmissionLedger(ledger_file) as ledger:
+        assert ledger.status("xqaba") == SUBMITTED
+        assert ledger.status("xqabb") is None
+
+
+def test_queue_depth_gate_blocks_at_max_queued():
+    scheduler = FakeClustersubmit()
+    scheduler.queued = ["xqaaa", "xqaab"]
+    sleeps = []
+
+    def sleep(seconds):
+        # a queued job finishes while waiting
+        sleeps.append(seconds)
+        scheduler.queued.pop()
+
+    gate = QueueDepthGate(scheduler, max_queued=3, poll_interval=60, sleep=sleep)
+    gate.acquire()
+    assert sleeps == []
+    # the queue is full: wait until the scheduler reports a free slot
+    gate.acquire()
+    assert sleeps == [60]
+    gate.release()
+    gate.acquire()
+    assert sleeps == [60]
+
+
+def test_submit_all_respects_max_queued(tmp_path):
+    runner = FakeClustersubmit()
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        runner.queued.pop(0)
+
+    gate = QueueDepthGate(runner, max_queued=2, sleep=sleep)
+    with SubmissionLedger(tmp_path / "ledger.jsonl") as ledger:
+        counts = submit_all(
+            ["xqaba", "xqabb", "xqabc", "xqabd"], ["{id}"], ledger, 1, gate, runner
+        )
+    assert counts[SUBMITTED] == 4
+    assert len(runner.job_states()) <= 2
+    assert sleeps
+
+
+@pytest.mark.parametrize("retries", [0, 2])
+def test_submit_job_without_scheduler_retries_blindly(retries):
+    runner = FakeClustersubmit({"xqaba": retries})
+    success, attempts, _ = submit_job(
+        "xqaba", ["{id}"], runner, retries, 1.0, lambda s: None
+    )
+    assert success and attempts == retries + 1
@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+import pytest
+
+from telemetry import Telemetry, format_summary, percentile
+
+
+@pytest.mark.parametrize("q", [0, 25, 50, 95, 100])
+def test_percentile_matches_numpy(q):
+    values = [0.3, 0.1, 0.7, 0.2, 1.5, 0.4]
+    assert percentile(values, q) == pytest.approx(np.percentile(values, q))
+    assert percentile([], q) is None
+
+
+def test_skip_and_summary_counts(tmp_path):
+    events_file = tmp_path / "events.jsonl"
+    with Telemetry(str(events_file)) as telemetry:
+        telemetry.record("duplicate", 0.1, "xqaab")
+        telemetry.record("patch", 0.3, "xqaab")
+        telemetry.record("duplicate", 0.2, "xqaac")
+        telemetry.skip("xqaad")
+        telemetry.skip("xqaae")
+        with telemetry.span("verify"):
+            pass
+
+    summary = telemetry.close()
+    assert (summary["members"], summary["skipped"]) == (2, 2)
+    assert summary["stages"]["duplicate"]["count"] == 2
+    assert summary["stages"]["duplicate"]["total_s"] == pytest.approx(0.3)
+    assert summary["stages"]["verify"]["count"] == 1
+    assert summary["slowest_members"] == [["xqaab", 0.4], ["xqaac", 0.2]]
+
+    with open(events_file) as f:
+        events = [json.loads(line) for line in f]
+    assert [event["event"] for event in events] == ["span"] * 3 + ["skip"] * 2 + [
+        "span",
+        "summary",
+    ]
+    assert events[3] == {"event": "skip", "member": "xqaad"}
+    assert events[-1]["skipped"] == 2
+
+
+def test_format_summary():
+    telemetry = Telemetry()
+    telemetry.record("duplicate", 0.004, "xqaab")
+    telemetry.skip("xqaac")
+    lines = format_summary(telemetry.close())
+    assert lines[0].startswith("1 ensemble members built and 1 skipped in ")
+    assert lines[1] == (
+        "Stage duplicate: 1 spans, total 0.004 s, p50 4.00 ms, p95 4.00 ms"
+    )
+    assert lines[2] == "Slowest members: xqaab (4.0 ms)"
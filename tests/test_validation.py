@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+
+from validation import (
+    LAND_CC_SCHEMA,
+    ParamSpec,
+    validate_design,
+    validate_records,
+    validate_table,
+)
+
+DEFAULT_PARAMS = {
+    "ensemble_id": "xqaba",
+    "ALPHA": [0.08, 0.08, 0.08, 0.04, 0.08],
+    "F0": [0.875, 0.875, 0.9, 0.8, 0.9],
+    "TLOW": [0.0, -5.0, 0.0, 13.0, 0.0],
+    "TUPP": [36.0, 31.0, 36.0, 45.0, 36.0],
+    "Q10": [2.0],
+    "V_CRIT_ALPHA": [0.343],
+}
+
+
+def record(**values):
+    return dict(DEFAULT_PARAMS, **values)
+
+
+def test_valid_records():
+    assert validate_records([record(), record(Q10=[3])]) == ({}, {})
+
+
+def test_ranges():
+    violations, _ = validate_records(
+        [record(), record(ALPHA=[0.0, 0.1, 0.1, 0.1, 0.1]), record(Q10=[float("nan")])]
+    )
+    assert sorted(violations) == [1, 2]
+    assert "below the minimum 0.0 (exclusive)" in violations[1][0]
+    assert "not a finite number" in violations[2][0]
+
+
+def test_structure():
+    violations, _ = validate_records(
+        [record(ALPHA=[0.1, 0.1]), record(Q10="2.0"), record(F0=[1, 1, "a", 1, 1])]
+    )
+    assert violations == {
+        0: ["ALPHA needs 5 values, got [0.1, 0.1]"],
+        1: ["Q10 needs 1 values, got 2.0"],
+        2: ["F0 has non-numeric values [1, 1, 'a', 1, 1]"],
+    }
+
+
+def test_orderings():
+    violations, _ = validate_records(
+        [record(), record(TLOW=[40.0, -5.0, 0.0, 13.0, 0.0]), record(TUPP=None)],
+        offset=10,
+    )
+    assert sorted(violations) == [11, 12]
+    assert "is not below TUPP" in violations[11][0]
+
+
+def test_unknown_parameters_are_not_errors():
+    violations, unknown = validate_records(
+        [record(), record(NOT_A_PARAMETER=[1.0]), record(NOT_A_PARAMETER="x", Q10=[0])]
+    )
+    assert list(violations) == [2]
+    assert unknown == {"NOT_A_PARAMETER": 2}
+
+
+def test_extended_schema():
+    schema = dict(LAND_CC_SCHEMA, NEW_PARAMETER=ParamSpec(1, 0.0, None, False))
+    violations, unknown = validate_records(
+        [record(NEW_PARAMETER=[1.0]), record(NEW_PARAMETER=[-1.0])], schema
+    )
+    assert list(violations) == [1]
+    assert unknown == {}
+
+
+def test_validate_design_matches_records():
+    records = [record(), record(F0=[-1.0, 1, 1, 1, 1]), record(Q10=[0])]
+    design = {
+        key: np.array([r[key] for r in records], dtype=float)
+        for key in LAND_CC_SCHEMA
+        if key in DEFAULT_PARAMS
+    }
+    assert validate_design(design) == validate_records(records)[0]
+
+
+def test_validate_table_chunks(tmp_path):
+    records = [record(ensemble_id=f"xqa{i:02d}") for i in range(25)]
+    records[13] = record(Q10=[-1.0])
+    records[20]["NOT_A_PARAMETER"] = 1
+    parameter_file = tmp_path / "params.json"
+    parameter_file.write_text(json.dumps(records))
+    violations, unknown = validate_table(str(parameter_file), chunk_size=10)
+    assert list(violations) == [13]
+    assert unknown == {"NOT_A_PARAMETER": 1}
@@ -0,0 +1,45 @@
+import re
+import collections
+
+# UM output file names, e.g. "xqapaa#da000001850c1+" (atmosphere dump of job xqapa at
+# year 1850) or "xqapao#pf000001850c1+" (ocean pp stream f). Older jobs use "@" instead
+# of "#" as separator. Job IDs are usually 5 characters long, but longer IDs (like the
+# "xqbbA1a" jobs of the benchmarking suite) are allowed as well.
+_UM_FILENAME = re.compile(
+    r"^(?P<runid>\w+?)(?P<component>[ao])[#@](?P<file_type>[dp])"
+    r"(?P<stream>[a-z0-9])(?P<year>\d+)(?P<suffix>.*)$"
+)
+
+UMOutputFile = collections.namedtuple(
+    "UMOutputFile", ["runid", "component", "file_type", "stream", "year", "suffix"]
+)
+
+
+def parse_um_filename(name):
+    """
+    Parse the name of a UM output file in a `datam` directory.
+
+    Args:
+        name (str): File name (without directory).
+
+    Returns:
+        UMOutputFile: Job ID, component ("a" atmosphere, "o" ocean), file type ("d"
+            dump, "p" pp file), stream letter, model year and the remaining suffix, or
+            None if the name is not a UM output file.
+    """
+    match = _UM_FILENAME.match(name)
+    if match is None:
+        return None
+    return UMOutputFile(
+        match["runid"],
+        match["component"],
+        match["file_type"],
+        match["stream"],
+        int(match["year"]),
+        match["suffix"],
+    )
+
+
+def is_dump(output_file):
+    """Whether a parsed output file is a restart dump ("da" files)."""
+    return output_file.file_type == "d" and output_file.stream == "a"
@@ -0,0 +1,255 @@
+import math
+import argparse
+import collections
+import itertools
+
+from param_io import iter_records
+
+ParamSpec = collections.namedtuple(
+    "ParamSpec", ["width", "minimum", "maximum", "exclusive_minimum"]
+)
+ParamSpec.__doc__ = """
+Valid values of a namelist parameter.
+
+Args:
+    width (int): Number of values (one per PFT, or a single value for all PFTs).
+    minimum (float): Smallest valid value, None for no lower bound.
+    maximum (float): Largest valid value, None for no upper bound.
+    exclusive_minimum (bool): Whether the minimum itself is invalid (e.g. for
+        parameters that must be positive).
+"""
+
+# parameters of the &LAND_CC group with their number of values and physically valid
+# range; the ranges are limits of the model physics (e.g. positive rates), not of
+# plausible values
+LAND_CC_SCHEMA = {
+    "ALPHA": ParamSpec(5, 0.0, 1.0, True),
+    "F0": ParamSpec(5, 0.0, None, True),
+    "G_AREA": ParamSpec(5, 0.0, 1.0, False),
+    "LAI_MIN": ParamSpec(5, 0.0, None, True),
+    "NL0": ParamSpec(5, 0.0, None, True),
+    "R_GROW": ParamSpec(5, 0.0, 1.0, False),
+    "TLOW": ParamSpec(5, -50.0, 60.0, False),
+    "TUPP": ParamSpec(5, -50.0, 60.0, False),
+    "Q10": ParamSpec(1, 0.0, None, True),
+    "V_CRIT_ALPHA": ParamSpec(1, 0.0, 1.0, False),
+    "KAPS": ParamSpec(1, 0.0, None, True),
+}
+
+# pairs of parameters whose values must be strictly increasing for every PFT
+ORDERINGS = [("TLOW", "TUPP")]
+
+# keys of a parameter set that are not namelist parameters
+METADATA_KEYS = ["ensemble_id"]
+
+# JSON number types of valid values (bool is a subclass of int, but not a number here)
+_NUMBER_TYPES = {int, float}
+_MISSING = object()
+
+
+def validate_design(design, schema=LAND_CC_SCHEMA, orderings=ORDERINGS):
+    """
+    Check the values of a design against the schema, vectorised over all members.
+
+    Args:
+        design (dict): Parameter names mapped to N x width arrays of values (see
+            `sampling.perturb_design`).
+        schema (dict, optional): Parameter names mapped to their `ParamSpec`.
+            Defaults to `LAND_CC_SCHEMA`.
+        orderings (list, optional): (lower, upper) pairs of parameters whose values
+            must be strictly increasing. Defaults to `ORDERINGS`.
+
+    Returns:
+        dict: Index of every invalid member mapped to a list of its violations.
+    """
+    import numpy as np
+
+    violations = collections.defaultdict(list)
+
+    def report(mask, message):
+        for index in np.flatnonzero(mask):
+            violations[int(index)].append(message(index))
+
+    for key, values in design.items():
+        spec = schema.get(key)
+        if spec is None:
+            continue
+        values = np.asarray(values, dtype=float)
+        # namelist values must be finite numbers in Fortran
+        report(
+            ~np.isfinite(values).all(axis=1),
+            lambda i: f"{key} is not a finite number: {values[i].tolist()}",
+        )
+        if spec.minimum is not None:
+            if spec.exclusive_minimum:
+                too_small = values <= spec.minimum
+            else:
+                too_small = values < spec.minimum
+            report(
+                too_small.any(axis=1),
+                lambda i: f"{key}={values[i].tolist()} is below the minimum "
+                f"{spec.minimum}" + (" (exclusive)" if spec.exclusive_minimum else ""),
+            )
+        if spec.maximum is not None:
+            report(
+                (values > spec.maximum).any(axis=1),
+                lambda i: f"{key}={values[i].tolist()} is above the maximum "
+                f"{spec.maximum}",
+            )
+
+    for lower, upper in orderings:
+        if lower not in design or upper not in design:
+            continue
+        lower_values = np.asarray(design[lower], dtype=float)
+        upper_values = np.asarray(design[upper], dtype=float)
+        report(
+            (lower_values >= upper_values).any(axis=1),
+            lambda i: f"{lower}={lower_values[i].tolist()} is not below "
+            f"{upper}={upper_values[i].tolist()}",
+        )
+    return dict(violations)
+
+
+def _value_violations(key, values, spec):
+    # same checks and messages as `validate_design` for the values of a single set;
+    # the sum is only finite if all values are, then min and max are well defined
+    messages = []
+    if math.isfinite(sum(values)):
+        lowest, highest = min(values), max(values)
+    else:
+        if not all(math.isfinite(v) for v in values):
+            messages.append(f"{key} is not a finite number: {values}")
+        # NaN never violates a bound, like in `validate_design`
+        lowest = min((v for v in values if v == v), default=math.nan)
+        highest = max((v for v in values if v == v), default=math.nan)
+    if spec.minimum is not None and (
+        lowest <= spec.minimum if spec.exclusive_minimum else lowest < spec.minimum
+    ):
+        messages.append(
+            f"{key}={values} is below the minimum {spec.minimum}"
+            + (" (exclusive)" if spec.exclusive_minimum else "")
+        )
+    if spec.maximum is not None and highest > spec.maximum:
+        messages.append(f"{key}={values} is above the maximum {spec.maximum}")
+    return messages
+
+
+def validate_records(records, schema=LAND_CC_SCHEMA, orderings=ORDERINGS, offset=0):
+    """
+    Check parameter sets against the schema.
+
+    Values of the wrong width or type are reported for every set, then the values and
+    orderings are checked with the same rules and messages as `validate_design`. This
+    runs in pure Python, so that `generate` and `validate` don't import NumPy. Keys
+    without a schema (e.g. parameters of other namelist groups) are not checked and
+    only counted, so they can be reported as warnings.
+
+    Args:
+        records (list): Parameter sets.
+        schema (dict, optional): Parameter names mapped to their `ParamSpec`.
+        orderings (list, optional): (lower, upper) pairs of parameters whose values
+            must be strictly increasing.
+        offset (int, optional): Index of the first set, added to the reported indices.
+
+    Returns:
+        tuple: (index of every invalid set mapped to a list of its violations, keys
+            without a schema mapped to the number of sets with them)
+    """
+    violations = {}
+    unknown = collections.Counter()
+    checked = []
+    for key in dict.fromkeys(key for record in records for key in record):
+        if key in METADATA_KEYS:
+            continue
+        spec = schema.get(key)
+        if spec is None:
+            unknown[key] = sum(key in record for record in records)
+            continue
+        minimum = -math.inf if spec.minimum is None else spec.minimum
+        maximum = math.inf if spec.maximum is None else spec.maximum
+        checked.append((key, spec, minimum, maximum))
+
+    for index, record in enumerate(records):
+        # structure first, then the values and orderings (same order as the messages
+        # of `validate_design`)
+        structure, messages, values = [], [], {}
+        for key, spec, minimum, maximum in checked:
+            value = record.get(key, _MISSING)
+            if value is _MISSING:
+                continue
+            if not isinstance(value, list) or len(value) != spec.width:
+                structure.append(f"{key} needs {spec.width} values, got {value}")
+                continue
+            if not _NUMBER_TYPES.issuperset(map(type, value)):
+                structure.append(f"{key} has non-numeric values {value}")
+                continue
+            values[key] = value = list(map(float, value))
+            # fast path for finite values within the bounds, the sum is only finite if
+            # all values are
+            if math.isfinite(sum(value)):
+                lowest = min(value)
+                if (
+                    lowest > minimum
+                    or (lowest == minimum and not spec.exclusive_minimum)
+                ) and max(value) <= maximum:
+                    continue
+            messages.extend(_value_violations(key, value, spec))
+        for lower, upper in orderings:
+            if lower in values and upper in values:
+                if any(l >= u for l, u in zip(values[lower], values[upper])):
+                    messages.append(
+                        f"{lower}={values[lower]} is not below {upper}={values[upper]}"
+                    )
+        if structure or messages:
+            violations[offset + index] = structure + messages
+    return violations, dict(unknown)
+
+
+def validate_table(parameter_file, schema=LAND_CC_SCHEMA, chunk_size=10000):
+    """
+    Check all parameter sets of a parameter table against the schema, reading the
+    table in chunks to keep the memory use flat.
+
+    Returns:
+        tuple: (index of every invalid set mapped to a list of its violations, keys
+            without a schema mapped to the number of sets with them)
+    """
+    violations, unknown = {}, collections.Counter()
+    records = iter_records(parameter_file)
+    for offset in itertools.count(0, chunk_size):
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        chunk_violations, chunk_unknown = validate_records(chunk, schema, offset=offset)
+        violations.update(chunk_violations)
+        unknown.update(chunk_unknown)
+    return violations, dict(unknown)
+
+
+def cli(argv=None, prog=None):
+    """
+    Command line interface of the validation, also used by
+    `python -m ensemble validate`.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Check the parameter sets of a parameter table."
+    )
+    parser.add_argument(
+        "--parameter_file", type=str, required=True, help="Path to the parameter table"
+    )
+    args = parser.parse_args(argv)
+
+    violations, unknown = validate_table(args.parameter_file)
+    for key, n_sets in unknown.items():
+        print(
+            f"Warning: {key} ({n_sets} parameter sets) is not in the schema, not checked"
+        )
+    for index in sorted(violations):
+        print(f"Parameter set {index}: {'; '.join(violations[index])}")
+    print(f"{len(violations)} invalid parameter sets in {args.parameter_file}.")
+    if violations:
+        parser.exit(1)
+
+
+if __name__ == "__main__":
+    cli()